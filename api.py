@@ -0,0 +1,234 @@
+# api.py
+"""
+Service layer shared by every front-end (server.py over HTTP, main.py on the
+console).
+
+Each operation takes plain values (strings are accepted for numbers, as they
+arrive from query strings), checks the session token where one is needed and
+returns a JSON-serializable dict. Failures raise ApiError carrying an HTTP
+status and a message for the user. No operation reads from the console or
+writes files.
+"""
+import datetime
+import decimal
+
+import pymysql
+
+from db_config import PoolTimeout, replica_status
+import features
+import fleet
+import login_register as auth
+import metrics
+
+
+class ApiError(Exception):
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ------------- helpers -------------
+def _int(value, name: str, required: bool = True):
+    if value is None or value == "":
+        if required:
+            raise ApiError(400, f"{name} is required.")
+        return None
+    if isinstance(value, bool):   # JSON true/false, which int() would take as 1/0
+        raise ApiError(400, f"{name} must be a whole number.")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} must be a whole number.")
+
+def _bool(value, default: bool = False) -> bool:
+    if value is None or value == "":
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+def _session(token: str, admin: bool = False) -> dict:
+    s = auth.authenticate(token)
+    if not s:
+        raise ApiError(401, "Not logged in or session expired.")
+    if admin and s["role"] != "admin":
+        raise ApiError(403, "Admin only.")
+    return s
+
+def _result(ok: bool, msg: str, **extra) -> dict:
+    if not ok:
+        raise ApiError(400, msg)
+    return {"message": msg, **extra}
+
+def jsonable(value):
+    """json.dumps default= hook for the types pymysql returns."""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    if isinstance(value, datetime.timedelta):   # TIME columns
+        secs = int(value.total_seconds())
+        return f"{secs // 3600:02d}:{secs % 3600 // 60:02d}:{secs % 60:02d}"
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _ticket_cursor(cursor):
+    # (booked_at, id) <-> "YYYY-MM-DD HH:MM:SS|id", so it survives a query string
+    if cursor is None or isinstance(cursor, tuple):
+        return cursor
+    booked_at, _, last_id = str(cursor).rpartition("|")
+    if not booked_at:
+        raise ApiError(400, "Invalid cursor.")
+    return booked_at, _int(last_id, "cursor")
+
+
+# ------------- accounts -------------
+def register(username: str, password: str):
+    return _result(*auth.register_user((username or "").strip(), password or ""))
+
+def login(username: str, password: str):
+    ok, token, role, msg = auth.login((username or "").strip(), password or "")
+    if not ok:
+        raise ApiError(401, msg)
+    return {"message": msg, "token": token, "role": role, "user_id": auth.authenticate(token)["user_id"]}
+
+def logout(token: str):
+    auth.logout(token)
+    return {"message": "Logged out."}
+
+def change_password(token: str, old_password: str, new_password: str):
+    s = _session(token)
+    return _result(*auth.change_password(s["user_id"], old_password, new_password, keep_session=token))
+
+def get_wallet(token: str):
+    return {"balance": auth.get_wallet(_session(token)["user_id"])}
+
+def add_funds(token: str, amount):
+    s = _session(token)
+    ok, msg = auth.add_funds(s["user_id"], _int(amount, "amount"))
+    return _result(ok, msg, balance=auth.get_wallet(s["user_id"]))
+
+
+# ------------- catalogue -------------
+def list_buses(travel_date: str = None):
+    return {"buses": features.list_buses(travel_date or None)}
+
+def search(origin: str = None, destination: str = None, depart_after: str = None, depart_before: str = None,
+           price_min=None, price_max=None, min_seats=None, travel_date: str = None, limit=100):
+    buses = features.search_buses(origin or None, destination or None, depart_after or None, depart_before or None,
+                                  _int(price_min, "price_min", False), _int(price_max, "price_max", False),
+                                  _int(min_seats, "min_seats", False), travel_date or None,
+                                  min(_int(limit, "limit", False) or 100, 500))
+    return {"buses": buses}
+
+def suggest_cities(prefix: str):
+    return {"cities": features.suggest_cities(prefix or "")}
+
+def seat_map(bus_id, travel_date: str = None):
+    bus_id = _int(bus_id, "bus_id")
+    bus = features.get_bus(bus_id, travel_date or None)
+    if not bus:
+        raise ApiError(404, "Bus not found.")
+    return {"bus_id": bus_id, "total_seats": bus['total_seats'], "seats_available": bus['seats_available'],
+            "booked": features.booked_seats(bus_id, travel_date or None)}
+
+
+# ------------- tickets -------------
+def book(token: str, bus_id, seats=None, travel_date: str = None, pay_from_wallet=True):
+    """seats: a seat number (0 = any), a list of seat numbers, or {"count": n} for n seats together."""
+    s = _session(token)
+    bus_id = _int(bus_id, "bus_id")
+    pay = _bool(pay_from_wallet, True)
+    if isinstance(seats, dict):
+        seats = _int(seats.get("count"), "count")
+        ok, msg, infos = features.create_tickets_bulk(s["user_id"], bus_id, seats, travel_date or None, pay)
+    elif isinstance(seats, (list, tuple)):
+        ok, msg, infos = features.create_tickets_bulk(s["user_id"], bus_id, [_int(x, "seats") for x in seats],
+                                                      travel_date or None, pay)
+    else:
+        ok, msg, info = features.create_ticket(s["user_id"], bus_id, _int(seats, "seats", False) or 0, travel_date or None, pay)
+        infos = [info] if info else []
+    return _result(ok, msg, tickets=infos or [])
+
+def my_tickets(token: str, include_archived=False):
+    """The user's tickets; include_archived adds trips moved to the archive."""
+    return {"tickets": features.get_user_tickets(_session(token)["user_id"], _bool(include_archived))}
+
+def find_ticket(token: str, ticket_no: str):
+    """A ticket by number, live or archived. Users only see their own; admins see any."""
+    s = _session(token)
+    if not ticket_no:
+        raise ApiError(400, "ticket_no is required.")
+    t = features.find_ticket(ticket_no)
+    if not t or (s["role"] != "admin" and t["user_id"] != s["user_id"]):
+        raise ApiError(404, "Ticket not found.")
+    return {"ticket": t}
+
+def cancel(token: str, ticket_id):
+    s = _session(token)
+    return _result(*features.cancel_user_ticket(s["user_id"], _int(ticket_id, "ticket_id")))
+
+
+# ------------- admin -------------
+def admin_stats(token: str):
+    _session(token, admin=True)
+    return features.admin_stats()
+
+def admin_metrics(token: str):
+    """Per-operation latency and SQL counts of this process (see metrics.summary)."""
+    _session(token, admin=True)
+    return {**metrics.summary(), "replicas": replica_status()}
+
+def add_bus(token: str, route: str, total_seats, price=100, departure_time: str = None, arrival_time: str = None,
+            description: str = None, bus_code: str = None):
+    _session(token, admin=True)
+    if not route:
+        raise ApiError(400, "route is required.")
+    return _result(*features.add_bus(route, _int(total_seats, "total_seats"), _int(price, "price"),
+                                     departure_time or None, arrival_time or None, description or None, bus_code or None))
+
+def update_bus(token: str, bus_id, route: str = None, price=None, total_seats=None, departure_time: str = None,
+               arrival_time: str = None):
+    _session(token, admin=True)
+    return _result(*features.update_bus(_int(bus_id, "bus_id"), route or None, _int(price, "price", False),
+                                        _int(total_seats, "total_seats", False), departure_time or None, arrival_time or None))
+
+def delete_bus(token: str, bus_id):
+    _session(token, admin=True)
+    return _result(*features.delete_bus(_int(bus_id, "bus_id")))
+
+def import_fleet(token: str, rows, dry_run=False):
+    """Bulk create/update buses keyed by bus_code (see fleet.py); per-row errors are in the report."""
+    _session(token, admin=True)
+    if not isinstance(rows, list):
+        raise ApiError(400, "rows must be a list of bus objects.")
+    return fleet.import_fleet(rows, dry_run=_bool(dry_run))
+
+def admin_manifest(token: str, bus_id, travel_date: str = None):
+    """Active tickets of one service (bus + travel date) in seat order."""
+    _session(token, admin=True)
+    return {"tickets": features.manifest_tickets(_int(bus_id, "bus_id"), travel_date or None)}
+
+def admin_tickets(token: str, cursor=None, limit=50, status: str = None, bus_id=None, date_from: str = None, date_to: str = None):
+    """A page of tickets; pass back next_cursor for the following page (None on the last)."""
+    _session(token, admin=True)
+    rows, nxt = features.view_tickets_page(_ticket_cursor(cursor), min(_int(limit, "limit", False) or 50, 500),
+                                           (status or "").upper() or None, _int(bus_id, "bus_id", False),
+                                           date_from or None, date_to or None)
+    return {"tickets": rows, "next_cursor": f"{jsonable(nxt[0])}|{nxt[1]}" if nxt else None}
+
+def admin_users(token: str, cursor=None, limit=50):
+    _session(token, admin=True)
+    rows, nxt = features.view_users_page(_int(cursor, "cursor", False), min(_int(limit, "limit", False) or 50, 500))
+    return {"users": rows, "next_cursor": nxt}
+
+
+def call(fn, *args, **kwargs):
+    """Runs an operation, mapping an exhausted or unreachable database to 503 (retry later)."""
+    try:
+        return fn(*args, **kwargs)
+    except PoolTimeout:
+        raise ApiError(503, "Server busy, please retry.")
+    except pymysql.err.OperationalError:
+        raise ApiError(503, "Database unavailable, please retry.")
@@ -0,0 +1,176 @@
+# archive.py
+"""
+Hot/cold split of tickets.
+
+Tickets whose travel date is more than ARCHIVE_AFTER_DAYS in the past move,
+with their ticket_history rows, to tickets_archive / ticket_history_archive,
+so the live tables (and every index, join and lock range on them) only hold
+recent and upcoming trips. Archived rows keep their ids and ticket numbers
+plus the bus route at archiving time, and are dropped RETENTION_DAYS after
+travel.
+
+archive_tickets() works in chunks of ARCHIVE_BATCH tickets, one transaction
+each: a chunk is copied and deleted together or not at all, so the job can be
+stopped at any point and simply run again. Afterwards it drops the
+seat_inventory rows of the archived dates, which nothing reads any more.
+
+Archiving doesn't change what the stats counters count: archived tickets
+still count as sold (stats.reconcile() adds them in) until purged.
+
+    python archive.py [--days N] [--batch N] [--purge]
+"""
+import argparse
+import datetime
+import time
+
+from db_config import get_conn, run_transaction
+import seat_bitmap
+import stats
+
+ARCHIVE_AFTER_DAYS = 30        # keep a month of past trips hot for refunds and complaints
+ARCHIVE_BATCH = 500            # tickets per transaction
+ARCHIVE_PAUSE = 0.05           # seconds between chunks, to let bookings through
+RETENTION_DAYS = 7 * 366       # audit retention after travel
+
+TICKET_COLUMNS = "id, ticket_no, user_id, bus_id, seat_no, price_paid, status, booked_at, travel_date"
+
+
+# ------------- archiving -------------
+def _archive_chunk_txn(cur, cutoff, batch_size: int):
+    # tickets first (lock order); bus routes from a plain read, which locks nothing
+    cur.execute(f"""SELECT {TICKET_COLUMNS} FROM tickets
+                    WHERE travel_date < %s ORDER BY travel_date, id LIMIT %s FOR UPDATE""", (cutoff, batch_size))
+    tickets = cur.fetchall()
+    if not tickets:
+        return True, 0, 0
+    ids = [t['id'] for t in tickets]
+    marks = ",".join(["%s"] * len(ids))
+    bus_ids = sorted({t['bus_id'] for t in tickets})
+    cur.execute(f"SELECT id, route FROM buses WHERE id IN ({','.join(['%s'] * len(bus_ids))})", bus_ids)
+    routes = {r['id']: r['route'] for r in cur.fetchall()}
+    cur.executemany(f"INSERT INTO tickets_archive ({TICKET_COLUMNS}, route) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)",
+                    [(t['id'], t['ticket_no'], t['user_id'], t['bus_id'], t['seat_no'], t['price_paid'], t['status'],
+                      t['booked_at'], t['travel_date'], routes.get(t['bus_id'], "")) for t in tickets])
+    cur.execute(f"""INSERT INTO ticket_history_archive (id, ticket_id, action, note, performed_at)
+                    SELECT id, ticket_id, action, note, performed_at FROM ticket_history WHERE ticket_id IN ({marks})""", ids)
+    history = cur.rowcount
+    cur.execute(f"DELETE FROM ticket_history WHERE ticket_id IN ({marks})", ids)
+    cur.execute(f"DELETE FROM tickets WHERE id IN ({marks})", ids)
+    return True, len(tickets), history
+
+def _drop_inventory_txn(cur, cutoff, batch_size: int):
+    # only dates without live tickets left (one may have been booked since the archiving)
+    cur.execute("""SELECT bus_id, travel_date FROM seat_inventory s
+                   WHERE travel_date < %s AND travel_date <> %s
+                     AND NOT EXISTS (SELECT 1 FROM tickets t WHERE t.bus_id = s.bus_id AND t.travel_date = s.travel_date)
+                   LIMIT %s FOR UPDATE""", (cutoff, seat_bitmap.UNDATED, batch_size))
+    keys = [(r['bus_id'], r['travel_date']) for r in cur.fetchall()]
+    if keys:
+        cur.executemany("DELETE FROM seat_inventory WHERE bus_id=%s AND travel_date=%s", keys)
+    return True, len(keys)
+
+def archive_tickets(days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH, pause: float = ARCHIVE_PAUSE,
+                    progress=None) -> dict:
+    """
+    Moves tickets that travelled more than `days` days ago to the archive.
+    Returns {"tickets", "history", "inventory_rows"} moved/dropped by this run.
+    progress(done_so_far) is called after each chunk.
+    """
+    cutoff = datetime.date.today() - datetime.timedelta(days=days)
+    done = {"tickets": 0, "history": 0, "inventory_rows": 0}
+    while True:
+        _, n, history = run_transaction(lambda cur: _archive_chunk_txn(cur, cutoff, batch_size))
+        done["tickets"] += n
+        done["history"] += history
+        if n and progress:
+            progress(dict(done))
+        if n < batch_size:
+            break
+        time.sleep(pause)
+    while True:
+        _, n = run_transaction(lambda cur: _drop_inventory_txn(cur, cutoff, batch_size))
+        done["inventory_rows"] += n
+        if n < batch_size:
+            break
+        time.sleep(pause)
+    return done
+
+
+# ------------- retention -------------
+def _purge_chunk_txn(cur, cutoff, batch_size: int):
+    cur.execute("""SELECT id, route, price_paid, status FROM tickets_archive
+                   WHERE travel_date < %s ORDER BY travel_date LIMIT %s FOR UPDATE""", (cutoff, batch_size))
+    rows = cur.fetchall()
+    if rows:
+        ids = [r['id'] for r in rows]
+        marks = ",".join(["%s"] * len(ids))
+        cur.execute(f"DELETE FROM ticket_history_archive WHERE ticket_id IN ({marks})", ids)
+        cur.execute(f"DELETE FROM tickets_archive WHERE id IN ({marks})", ids)
+        # gone for good: take them out of the counters too
+        active = [r for r in rows if r['status'] == 'ACTIVE']
+        stats.bump(cur, active_tickets=-len(active), revenue=-sum(r['price_paid'] for r in active))
+        per_route = {}
+        for r in active:
+            per_route[r['route']] = per_route.get(r['route'], 0) + 1
+        for route in sorted(per_route):
+            stats.bump_route(cur, route, -per_route[route])
+    return True, len(rows)
+
+def purge_expired(retention_days: int = RETENTION_DAYS, batch_size: int = ARCHIVE_BATCH) -> int:
+    """Deletes archived tickets (and history) that travelled more than retention_days ago."""
+    cutoff = datetime.date.today() - datetime.timedelta(days=retention_days)
+    purged = 0
+    while True:
+        _, n = run_transaction(lambda cur: _purge_chunk_txn(cur, cutoff, batch_size))
+        purged += n
+        if n < batch_size:
+            return purged
+        time.sleep(ARCHIVE_PAUSE)
+
+
+# ------------- reads -------------
+def find_ticket(cur, ticket_no: str):
+    cur.execute(f"SELECT {TICKET_COLUMNS}, route, archived_at FROM tickets_archive WHERE ticket_no=%s", (ticket_no,))
+    return cur.fetchone()
+
+def user_tickets(cur, user_id: int):
+    """A user's archived tickets, newest booking first (same columns as features.get_user_tickets)."""
+    cur.execute("""
+        SELECT id, ticket_no, route, seat_no, price_paid AS price, status, booked_at, travel_date
+        FROM tickets_archive WHERE user_id=%s ORDER BY booked_at DESC
+    """, (user_id,))
+    return cur.fetchall()
+
+def counts(cur):
+    """Active tickets and revenue in the archive, in total and per route (for stats.reconcile)."""
+    cur.execute("SELECT COUNT(*) AS n, IFNULL(SUM(price_paid), 0) AS revenue FROM tickets_archive WHERE status='ACTIVE'")
+    r = cur.fetchone()
+    cur.execute("SELECT route, COUNT(*) AS cnt FROM tickets_archive WHERE status='ACTIVE' GROUP BY route")
+    return r['n'], int(r['revenue']), {x['route']: x['cnt'] for x in cur.fetchall()}
+
+def sizes() -> dict:
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            out = {}
+            for table in ("tickets", "tickets_archive", "ticket_history", "ticket_history_archive"):
+                cur.execute(f"SELECT COUNT(*) AS n FROM {table}")
+                out[table] = cur.fetchone()['n']
+            return out
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Move tickets past their travel date to the archive tables")
+    ap.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive trips older than this many days")
+    ap.add_argument("--batch", type=int, default=ARCHIVE_BATCH, help="tickets per transaction")
+    ap.add_argument("--purge", action="store_true", help=f"also delete archived trips older than {RETENTION_DAYS} days")
+    a = ap.parse_args()
+    started = time.perf_counter()
+    done = archive_tickets(a.days, a.batch, progress=lambda d: print(f"archived {d['tickets']} tickets...", end="\r"))
+    print(f"Archived {done['tickets']} tickets, {done['history']} history rows; "
+          f"dropped {done['inventory_rows']} seat inventory rows in {time.perf_counter() - started:.1f}s")
+    if a.purge:
+        print(f"Purged {purge_expired(batch_size=a.batch)} archived tickets past retention")
+    print(sizes())
@@ -0,0 +1,152 @@
+# batch.py
+"""
+Non-interactive batch mode: JSON-lines commands in, JSON-lines results out.
+
+    python main.py --batch commands.jsonl [--workers 8] [--output results.jsonl]
+    python main.py --batch - < commands.jsonl
+
+One command per line:
+
+    {"op": "login", "args": {"username": "alice", "password": "pw"}, "session": "alice"}
+    {"op": "book", "session": "alice", "args": {"bus_id": 3, "seats": 0, "travel_date": "2030-01-01"}}
+    {"op": "add_bus", "token": "<admin token>", "args": {"route": "A → B", "total_seats": 40}}
+
+`op` is any operation in api.py (see OPS). Operations that need a session take
+either a literal "token" or a "session" name given to an earlier login in the
+same batch; such commands wait for that login to finish. The name is resolved
+when the line is read: a session not logged in on an earlier line is an
+error, and so is a second login with a name already in use. Otherwise commands
+run concurrently on `workers` threads, so results arrive in completion order;
+each carries the input line number and the command's optional "id":
+
+    {"line": 2, "id": null, "op": "book", "ok": true, "status": 200, "result": {...}, "ms": 12.3}
+
+A summary (counts, elapsed time, throughput) is printed to stderr.
+"""
+import inspect
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import api
+
+BATCH_WORKERS = 8
+
+OPS = {name: getattr(api, name) for name in (
+    "register", "login", "logout", "change_password", "get_wallet", "add_funds",
+    "list_buses", "search", "suggest_cities", "seat_map",
+    "book", "my_tickets", "find_ticket", "cancel",
+    "admin_stats", "admin_metrics", "add_bus", "update_bus", "delete_bus", "import_fleet", "admin_manifest", "admin_tickets", "admin_users",
+)}
+_NEEDS_TOKEN = {name for name, fn in OPS.items() if next(iter(inspect.signature(fn).parameters)) == "token"}
+
+
+def _execute(lineno: int, cmd: dict, session: Future = None):
+    started = time.perf_counter()
+    out = {"line": lineno, "id": cmd.get("id"), "op": cmd.get("op")}
+    try:
+        fn = OPS.get(cmd.get("op"))
+        if fn is None:
+            raise api.ApiError(400, f"Unknown op {cmd.get('op')!r}.")
+        args = cmd.get("args") or {}
+        if not isinstance(args, dict):
+            raise api.ApiError(400, "args must be an object.")
+        if cmd.get("op") in _NEEDS_TOKEN:
+            token = cmd.get("token")
+            if token is None and session is not None:
+                token = session.result()
+            args = {**args, "token": token}
+        try:
+            inspect.signature(fn).bind(**args)
+        except TypeError as e:
+            raise api.ApiError(400, f"Bad args for {cmd['op']}: {e}")
+        result = api.call(fn, **args)
+        out.update(ok=True, status=200, result=result)
+    except api.ApiError as e:
+        out.update(ok=False, status=e.status, error=e.message)
+    except Exception as e:
+        out.update(ok=False, status=500, error=f"{type(e).__name__}: {e}")
+    out["ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return out
+
+
+def run_batch(lines, output=sys.stdout, workers: int = BATCH_WORKERS) -> dict:
+    """Runs every command in `lines` (an iterable of JSON strings). Returns the summary."""
+    sessions = {}                              # session name -> (login line, Future of its token)
+    write_lock = threading.Lock()
+    window = threading.BoundedSemaphore(workers * 4)   # bounds commands read ahead of execution
+    summary = {"commands": 0, "ok": 0, "failed": 0}
+
+    def emit(out):
+        with write_lock:
+            output.write(json.dumps(out, default=api.jsonable, ensure_ascii=False) + "\n")
+            output.flush()
+            summary["ok" if out["ok"] else "failed"] += 1
+
+    def work(lineno, cmd, login: Future = None, session: Future = None):
+        try:
+            out = _execute(lineno, cmd, session)
+            if login is not None:
+                if out["ok"]:
+                    login.set_result(out["result"]["token"])
+                else:
+                    login.set_exception(api.ApiError(401, f"Login for session {cmd['session']!r} failed."))
+            emit(out)
+        finally:
+            window.release()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        for lineno, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            summary["commands"] += 1
+            try:
+                cmd = json.loads(line)
+                if not isinstance(cmd, dict):
+                    raise ValueError("not an object")
+            except ValueError as e:
+                emit({"line": lineno, "id": None, "op": None, "ok": False, "status": 400,
+                      "error": f"Invalid JSON: {e}", "ms": 0.0})
+                continue
+            login = session = None
+            name = cmd.get("session")
+            if name is not None:
+                # bound here, in input order, never to whichever login happens to finish first
+                error = None
+                if cmd.get("op") == "login":
+                    if name in sessions:
+                        error = f"Session {name!r} is already logged in on line {sessions[name][0]}."
+                    else:
+                        login = Future()
+                        sessions[name] = (lineno, login)
+                elif cmd.get("op") in _NEEDS_TOKEN and cmd.get("token") is None:
+                    if name in sessions:
+                        session = sessions[name][1]
+                    else:
+                        error = f"Unknown session {name!r}: no earlier login line names it."
+                if error:
+                    emit({"line": lineno, "id": cmd.get("id"), "op": cmd.get("op"), "ok": False, "status": 400,
+                          "error": error, "ms": 0.0})
+                    continue
+            window.acquire()
+            pool.submit(work, lineno, cmd, login, session)
+    elapsed = time.perf_counter() - started
+    summary.update(elapsed_s=round(elapsed, 3), ops_per_s=round(summary["commands"] / elapsed, 1) if elapsed else None)
+    return summary
+
+
+def main(source: str, workers: int = BATCH_WORKERS, output_path: str = None) -> int:
+    infile = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    outfile = sys.stdout if output_path is None else open(output_path, "w", encoding="utf-8")
+    try:
+        summary = run_batch(infile, outfile, workers)
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if summary["failed"] else 0
@@ -0,0 +1,253 @@
+# bench.py
+"""
+Benchmark harness for the hot paths.
+
+    BUS_DB_NAME=bus_bench python bench.py [--quick] [--output run.json] [--compare base.json]
+
+Scenarios:
+- single.*      one caller, one operation at a time: create_ticket, cancel_user_ticket,
+                get_bus, search_buses_advanced, search_buses (cached and cold), login_user, admin_stats
+- contention    N threads booking auto-assigned seats on one popular bus
+- search.fleetN search_buses against a fleet of N buses (catalogue cache cleared per call)
+- login         login_user throughput from N threads
+
+Each result reports n, errors, mean/p50/p95/p99/max latency (ms) and ops/s.
+Output is JSON (meta + results) so runs can be diffed; --compare prints the
+change of p50/p95/p99 and ops/s against an earlier run.
+
+It creates its own buses (bus_code BENCH-*) and users (bench_*) and removes them
+afterwards unless --keep is given. Point it at a scratch database via the
+BUS_DB_* environment variables; never at production.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db_config import get_conn, init_db, DB_BACKEND, DB_HOST, DB_NAME, DB_PATH
+import catalogue
+import features
+import fleet
+import login_register as auth
+import stats
+import wallet
+
+BENCH_PASSWORD = "bench-password"
+FULL = {"iterations": 200, "threads": 32, "contention_ops": 1500, "fleet_sizes": (100, 1000, 10000), "login_ops": 400}
+QUICK = {"iterations": 30, "threads": 8, "contention_ops": 200, "fleet_sizes": (100, 1000), "login_ops": 40}
+
+
+# ------------- measurement -------------
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = math.ceil(p / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(len(sorted_values) - 1, k))]
+
+def summarize(latencies, errors: int, elapsed: float) -> dict:
+    ms = sorted(x * 1000 for x in latencies)
+    n = len(ms)
+    return {"n": n, "errors": errors,
+            "mean_ms": round(sum(ms) / n, 3) if n else 0.0,
+            "p50_ms": round(percentile(ms, 50), 3), "p95_ms": round(percentile(ms, 95), 3),
+            "p99_ms": round(percentile(ms, 99), 3), "max_ms": round(ms[-1], 3) if n else 0.0,
+            "ops_per_s": round(n / elapsed, 1) if elapsed else 0.0}
+
+def measure(op, iterations: int, threads: int = 1, warmup: int = 3) -> dict:
+    """Runs op(i) `iterations` times on `threads` threads; op returns truthy on success."""
+    for i in range(warmup):
+        op(-1 - i)
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    counter = iter(range(iterations))
+
+    def worker():
+        local = []
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            t0 = time.perf_counter()
+            try:
+                ok = op(i)
+            except Exception:
+                ok = False
+            local.append(time.perf_counter() - t0)
+            if not ok:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    if threads == 1:
+        worker()
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for _ in range(threads):
+                pool.submit(worker)
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+# ------------- fixtures -------------
+def _make_users(count: int, tag: str):
+    ids = []
+    for i in range(count):
+        username = f"bench_{tag}_{i}"
+        auth.register_user(username, BENCH_PASSWORD)
+        conn = get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id FROM users WHERE username=%s", (username,))
+                user_id = cur.fetchone()['id']
+                wallet.credit(cur, user_id, 10 ** 9, wallet.TOPUP, note="bench")
+            conn.commit()
+        finally:
+            conn.close()
+        ids.append((user_id, username))
+    return ids
+
+def _make_fleet(tag: str, size: int, seats: int = 40):
+    # spread over 50 city pairs so a search matches ~size/50 buses
+    rows = [{"bus_code": f"BENCH-{tag}-{i}", "route": f"Bench{i % 10} → Bench{10 + i // 10 % 5}",
+             "total_seats": seats, "price": 100 + i % 500,
+             "departure_time": f"{i % 24:02d}:{i % 60:02d}", "arrival_time": f"{(i + 5) % 24:02d}:{i % 60:02d}"}
+            for i in range(size)]
+    report = fleet.import_fleet(rows)
+    if report["errors"]:
+        raise RuntimeError(f"fleet setup failed: {report['errors'][:3]}")
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM buses WHERE bus_code LIKE %s", (f"BENCH-{tag}-%",))
+            return [r['id'] for r in cur.fetchall()]
+    finally:
+        conn.close()
+
+def _cleanup():
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM buses WHERE bus_code LIKE 'BENCH-%'")
+            bus_ids = [r['id'] for r in cur.fetchall()]
+    finally:
+        conn.close()
+    for bus_id in bus_ids:
+        features.delete_bus(bus_id)   # keeps the stats counters right
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE username LIKE 'bench\\_%'")
+            stats.bump(cur, users=-cur.rowcount)
+        conn.commit()
+    finally:
+        conn.close()
+    catalogue.invalidate_all()
+
+
+# ------------- scenarios -------------
+def run(cfg: dict) -> dict:
+    results = {}
+    run_tag = str(int(time.time()))
+    users = _make_users(max(cfg["threads"], 4), run_tag)
+    user_id, username = users[0]
+    travel_date = "2031-01-01"
+
+    # single-user latency
+    (bus_id,) = _make_fleet(run_tag + "-single", 1, seats=cfg["iterations"] + 100)
+    results["single.create_ticket"] = measure(
+        lambda i: features.create_ticket(user_id, bus_id, 0, travel_date, pay_from_wallet=True)[0], cfg["iterations"])
+    # warm-up calls get negative i, i.e. the last tickets of the list
+    booked = [t['id'] for t in features.get_user_tickets(user_id) if t['status'] == 'ACTIVE']
+    results["single.cancel_user_ticket"] = measure(lambda i: features.cancel_user_ticket(user_id, booked[i])[0],
+                                                   min(cfg["iterations"], len(booked) - 3))
+    results["single.get_bus"] = measure(lambda i: features.get_bus(bus_id, travel_date) is not None, cfg["iterations"])
+    results["single.search_buses_advanced"] = measure(
+        lambda i: features.search_buses_advanced("Bench0", None, None, None, travel_date) is not None, cfg["iterations"])
+    results["single.search_buses.cached"] = measure(
+        lambda i: features.search_buses("Bench0", "Bench10", travel_date=travel_date) is not None, cfg["iterations"])
+
+    def cold_search(i):
+        catalogue.invalidate_all()
+        return features.search_buses("Bench0", "Bench10", travel_date=travel_date) is not None
+    results["single.search_buses.cold"] = measure(cold_search, cfg["iterations"])
+    results["single.login_user"] = measure(lambda i: auth.login_user(username, BENCH_PASSWORD)[0],
+                                           max(10, cfg["iterations"] // 10))
+    results["single.admin_stats"] = measure(lambda i: features.admin_stats() is not None, cfg["iterations"])
+
+    # contention: everyone books the same popular bus and date
+    (hot_bus,) = _make_fleet(run_tag + "-hot", 1, seats=max(cfg["contention_ops"] + 100, 100))
+    results["contention.create_ticket"] = measure(
+        lambda i: features.create_ticket(users[i % len(users)][0], hot_bus, 0, travel_date, pay_from_wallet=True)[0],
+        cfg["contention_ops"], threads=cfg["threads"])
+    results["contention.create_ticket"]["threads"] = cfg["threads"]
+
+    # search vs fleet size (cache cleared, so the database does the work)
+    for size in cfg["fleet_sizes"]:
+        _make_fleet(f"{run_tag}-f{size}", size)
+        results[f"search.fleet{size}"] = measure(cold_search, cfg["iterations"])
+        results[f"search.fleet{size}"]["fleet"] = size
+
+    # login throughput
+    results["login.throughput"] = measure(lambda i: auth.login_user(users[i % len(users)][1], BENCH_PASSWORD)[0],
+                                          cfg["login_ops"], threads=cfg["threads"])
+    results["login.throughput"]["threads"] = cfg["threads"]
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(base: dict, current: dict) -> str:
+    lines = [f"{'scenario':34} {'p50 ms':>16} {'p95 ms':>16} {'p99 ms':>16} {'ops/s':>18}"]
+    for name, cur in current["results"].items():
+        old = base.get("results", {}).get(name)
+        if not old:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "ops_per_s"):
+            change = (cur[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f"{cur[key]:>9.2f} {change:+6.1f}%")
+        lines.append(f"{name:34} " + " ".join(cells))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Booking system benchmarks")
+    parser.add_argument("--quick", action="store_true", help="smaller runs for a smoke test")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", metavar="BASE_JSON", help="print changes against an earlier report")
+    parser.add_argument("--keep", action="store_true", help="keep the bench buses and users")
+    args = parser.parse_args()
+    cfg = QUICK if args.quick else FULL
+    init_db()
+    try:
+        results = run(cfg)
+    finally:
+        if not args.keep:
+            _cleanup()
+    report = {"meta": {"started": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": _git_commit(),
+                       "python": platform.python_version(), "host": platform.node(),
+                       "db": f"sqlite:{DB_PATH}" if DB_BACKEND == "sqlite" else f"{DB_HOST}/{DB_NAME}", "config": {k: list(v) if isinstance(v, tuple) else v for k, v in cfg.items()}},
+              "results": results}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(json.load(f), report), file=sys.stderr)
@@ -0,0 +1,111 @@
+# cache.py
+"""
+Small in-process caches.
+
+TTLCache is a thread-safe LRU map with a per-entry time-to-live. Entries are
+evicted least-recently-used first once `maxsize` is reached, and expire
+`ttl` seconds after they were stored. Hit/miss/eviction counts are kept for
+monitoring.
+
+get_or_load() does not store a value whose key was invalidated (or the cache
+cleared) while loader() ran: the load may have read the data before the change
+that prompted the invalidation, and would otherwise be served for a full ttl.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value); most recently used last
+        self._lock = threading.Lock()
+        self._loading = {}           # key -> loads in progress
+        self._generations = {}       # key -> invalidations seen during its loads in progress
+        self._epoch = 0              # bumped by clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                expires_at, value = item
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _store(self, key, value, ttl: float = None):
+        # caller holds the lock
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value, or calls loader() and caches its result (None is not cached)."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            self._loading[key] = self._loading.get(key, 0) + 1
+            seen = self._generations.get(key, 0), self._epoch
+        value = None
+        try:
+            value = loader()
+        finally:
+            with self._lock:
+                if value is not None and (self._generations.get(key, 0), self._epoch) == seen:
+                    self._store(key, value)
+                if self._loading[key] > 1:
+                    self._loading[key] -= 1
+                else:
+                    del self._loading[key]
+                    self._generations.pop(key, None)
+        return value
+
+    def _invalidated(self, key):
+        # caller holds the lock
+        if key in self._loading:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            self._invalidated(key)
+        return item[1] if item else None
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._invalidated(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._epoch += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "hit_ratio": (self.hits / total) if total else 0.0}
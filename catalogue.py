@@ -0,0 +1,131 @@
+# catalogue.py
+"""
+Read-through cache for bus metadata.
+
+Route, cities, times, price and total seats change only through the bus CRUD
+functions in features.py, so they are cached here: one entry per bus, plus the
+id lists returned by listing/search queries. Availability is never cached; it
+is read fresh from seat_inventory (primary-key lookups) and merged into the
+rows on every call.
+
+Bus CRUD must call invalidate() after committing. A generation counter stops a
+load that raced with an invalidation from storing what it read; CATALOGUE_TTL
+bounds staleness when another process changed the fleet.
+
+Reads go to a read replica (db_config.get_read_conn). Loads after an
+invalidation only use a replica that has caught up with it, so a change is
+never cached in its old form; availability may lag by DB_REPLICA_MAX_LAG,
+which is fine for listings (booking checks seats on the primary).
+"""
+import threading
+import time
+
+from cache import TTLCache
+from db_config import get_read_conn
+import seat_bitmap
+
+CATALOGUE_SIZE = 10_000      # buses
+CATALOGUE_QUERIES = 1_024    # distinct listing/search queries
+CATALOGUE_TTL = 300          # seconds
+
+META_COLUMNS = ("b.id, b.route, b.origin, b.destination, b.total_seats, b.price, "
+                "b.departure_time, b.arrival_time")
+
+_buses = TTLCache(maxsize=CATALOGUE_SIZE, ttl=CATALOGUE_TTL)        # bus_id -> metadata row
+_queries = TTLCache(maxsize=CATALOGUE_QUERIES, ttl=CATALOGUE_TTL)   # query key -> [bus_id, ...]
+_generation = 0
+_invalidated_at = None   # time.time() of the last invalidation in this process
+_lock = threading.Lock()
+
+
+def invalidate(bus_id: int = None):
+    """Drops one bus (and every cached query, whose results it may join or leave)."""
+    global _generation, _invalidated_at
+    with _lock:
+        _generation += 1
+        _invalidated_at = time.time()
+    if bus_id is not None:
+        _buses.invalidate(bus_id)
+    _queries.clear()
+
+def invalidate_all():
+    global _generation, _invalidated_at
+    with _lock:
+        _generation += 1
+        _invalidated_at = time.time()
+    _buses.clear()
+    _queries.clear()
+
+def _store(gen: int, rows):
+    if gen == _generation:
+        for r in rows:
+            _buses.set(r['id'], r)
+
+
+def get_many(bus_ids) -> dict:
+    """bus_id -> metadata row (copies) for the buses that exist."""
+    found, missing = {}, []
+    for bus_id in bus_ids:
+        r = _buses.get(bus_id)
+        if r is None:
+            missing.append(bus_id)
+        else:
+            found[bus_id] = r
+    if missing:
+        gen = _generation
+        marks = ",".join(["%s"] * len(missing))
+        conn = get_read_conn(_invalidated_at)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {META_COLUMNS} FROM buses b WHERE b.id IN ({marks})", missing)
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        _store(gen, rows)
+        found.update((r['id'], r) for r in rows)
+    return {bus_id: dict(r) for bus_id, r in found.items()}
+
+def query(key, where: str = "", params=(), order: str = "b.id"):
+    """
+    Metadata rows of the buses matching `where` (metadata columns only), in
+    `order`. The id list is cached under `key`, the rows per bus.
+    """
+    ids = _queries.get(key)
+    if ids is None:
+        gen = _generation
+        conn = get_read_conn(_invalidated_at)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {META_COLUMNS} FROM buses b {where} ORDER BY {order}", params)
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        _store(gen, rows)
+        if gen == _generation:
+            _queries.set(key, [r['id'] for r in rows])
+        return [dict(r) for r in rows]
+    buses = get_many(ids)
+    return [buses[i] for i in ids if i in buses]
+
+
+def with_availability(rows, travel_date: str = None):
+    """Adds a fresh seats_available to each row for the travel date."""
+    if not rows:
+        return rows
+    ids = [r['id'] for r in rows]
+    marks = ",".join(["%s"] * len(ids))
+    conn = get_read_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT bus_id, seats_booked FROM seat_inventory WHERE travel_date=%s AND bus_id IN ({marks})",
+                        [travel_date or seat_bitmap.UNDATED] + ids)
+            booked = {r['bus_id']: r['seats_booked'] for r in cur.fetchall()}
+    finally:
+        conn.close()
+    for r in rows:
+        r['seats_available'] = r['total_seats'] - booked.get(r['id'], 0)
+    return rows
+
+
+def stats() -> dict:
+    return {"buses": _buses.stats(), "queries": _queries.stats()}
@@ -0,0 +1,274 @@
+# datagen.py
+"""
+Synthetic data at production scale, for query plans and memory behaviour.
+
+    BUS_DB_NAME=bus_scale python datagen.py --users 100000 --buses 20000 --tickets 20000000 --workers 8
+
+Generates users (gen_<n>, all with password DATAGEN_PASSWORD), buses
+(bus_code GEN-<n>) between cities of Zipf-like popularity, and tickets over a
+window of past and future travel dates. Demand follows route popularity,
+weekends and the festival season, with log-normal noise per service.
+A share of the tickets is cancelled, with a ticket_history row and a wallet refund;
+a share is paid from the wallet. Every invariant the application relies on
+holds afterwards: at most one active ticket per seat, matching seat_inventory
+bitmaps and counts, wallet snapshots equal to the ledger, stats counters
+reconciled.
+
+Rows are generated in independent chunks (a range of buses each) by a process
+pool; every chunk streams its rows in multi-row INSERTs of --batch rows with
+explicit, pre-allocated ids, so chunks never contend. Intended for an empty
+scratch database; never run it against production.
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+from db_config import get_conn, init_db, hash_password, PBKDF2_ALGO, PBKDF2_ITERATIONS
+import seat_bitmap
+import stats
+import wallet
+
+DATAGEN_PASSWORD = "datagen"
+CITIES = [
+    "Mumbai", "Delhi", "Bangalore", "Hyderabad", "Chennai", "Kolkata", "Pune", "Ahmedabad", "Jaipur", "Lucknow",
+    "Indore", "Bhopal", "Nagpur", "Surat", "Kanpur", "Patna", "Vadodara", "Ludhiana", "Agra", "Nashik",
+    "Coimbatore", "Madurai", "Varanasi", "Amritsar", "Rajkot", "Visakhapatnam", "Mysore", "Udaipur", "Goa", "Dehradun",
+    "Jodhpur", "Raipur", "Ranchi", "Guwahati", "Kochi", "Mangalore", "Gwalior", "Jabalpur", "Aurangabad", "Shimla",
+]
+SEAT_LAYOUTS = (30, 36, 40, 45, 50)
+OPENING_BALANCE = 10 ** 7
+FESTIVAL = ((10, 20), (11, 15))   # (month, day) window with doubled demand
+
+
+# ------------- distributions -------------
+def _city_weights():
+    return [1 / (rank + 1) ** 0.9 for rank in range(len(CITIES))]
+
+def _day_factor(d: date) -> float:
+    f = 1.4 if d.weekday() >= 4 else 1.0
+    if FESTIVAL[0] <= (d.month, d.day) <= FESTIVAL[1]:
+        f *= 2.0
+    return f
+
+def _dates(past_days: int, future_days: int):
+    today = date.today()
+    return [today + timedelta(days=k) for k in range(-past_days, future_days + 1)]
+
+
+# ------------- loaders -------------
+def _flush(cur, sql: str, rows: list):
+    if rows:
+        cur.executemany(sql, rows)
+        rows.clear()
+
+def _next_id(cur, table: str) -> int:
+    cur.execute(f"SELECT IFNULL(MAX(id), 0) + 1 AS n FROM {table}")
+    return cur.fetchone()['n']
+
+def _load_users(first_id: int, count: int, batch: int, seed: int):
+    rng = random.Random(seed)
+    pwd_hash, salt = hash_password(DATAGEN_PASSWORD)   # one hash for all: generation must not be CPU-bound
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+            users, ledger, balances = [], [], []
+            for uid in range(first_id, first_id + count):
+                created = datetime.now() - timedelta(days=rng.randint(0, 1000))
+                users.append((uid, f"gen_{uid}", pwd_hash, salt, PBKDF2_ALGO, PBKDF2_ITERATIONS, created))
+                ledger.append((uid, OPENING_BALANCE, wallet.OPENING, "datagen opening balance", created))
+                balances.append((uid, OPENING_BALANCE))
+                if len(users) >= batch:
+                    _write_users(cur, users, ledger, balances)
+                    conn.commit()
+            _write_users(cur, users, ledger, balances)
+            conn.commit()
+            cur.execute("SET SESSION foreign_key_checks = 1, unique_checks = 1")
+    finally:
+        conn.close()
+    return count
+
+def _write_users(cur, users, ledger, balances):
+    _flush(cur, """INSERT INTO users (id, username, password_hash, salt, hash_algo, hash_iterations, created_at)
+                   VALUES (%s,%s,%s,%s,%s,%s,%s)""", users)
+    _flush(cur, """INSERT INTO wallet_ledger (user_id, amount, kind, note, created_at, compacted)
+                   VALUES (%s,%s,%s,%s,%s,1)""", ledger)
+    _flush(cur, "INSERT INTO wallet_balances (user_id, balance) VALUES (%s,%s)", balances)
+
+def _load_buses(first_id: int, count: int, batch: int, seed: int):
+    """Returns [(bus_id, total_seats, price, demand_weight)]."""
+    rng = random.Random(seed)
+    weights = _city_weights()
+    fleet = []
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            rows = []
+            for bus_id in range(first_id, first_id + count):
+                a, b = rng.choices(range(len(CITIES)), weights, k=2)
+                while b == a:
+                    b = rng.choices(range(len(CITIES)), weights)[0]
+                seats = rng.choice(SEAT_LAYOUTS)
+                hours = 2 + abs(a - b) % 12
+                price = 100 + 90 * hours + rng.randrange(0, 200, 10)
+                dep = rng.randrange(0, 24 * 4) * 15
+                arr = (dep + hours * 60) % (24 * 60)
+                route = f"{CITIES[a]} → {CITIES[b]}"
+                rows.append((bus_id, f"GEN-{bus_id}", route, CITIES[a], CITIES[b], seats, price,
+                             f"{dep // 60:02d}:{dep % 60:02d}:00", f"{arr // 60:02d}:{arr % 60:02d}:00"))
+                fleet.append((bus_id, seats, price, weights[a] * weights[b]))
+                if len(rows) >= batch:
+                    _write_buses(cur, rows)
+                    conn.commit()
+            _write_buses(cur, rows)
+            conn.commit()
+    finally:
+        conn.close()
+    mean = sum(f[3] for f in fleet) / len(fleet) if fleet else 1
+    return [(bus_id, seats, price, w / mean) for bus_id, seats, price, w in fleet]
+
+def _write_buses(cur, rows):
+    _flush(cur, """INSERT INTO buses (id, bus_code, route, origin, destination, total_seats, price, departure_time, arrival_time)
+                   VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)""", rows)
+
+
+_TICKET_SQL = """INSERT INTO tickets (id, ticket_no, user_id, bus_id, seat_no, price_paid, status, booked_at, travel_date)
+                 VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)"""
+_INVENTORY_SQL = "INSERT INTO seat_inventory (bus_id, travel_date, occupancy, seats_booked) VALUES (%s,%s,%s,%s)"
+_HISTORY_SQL = "INSERT INTO ticket_history (ticket_id, action, note, performed_at) VALUES (%s,%s,%s,%s)"
+_LEDGER_SQL = """INSERT INTO wallet_ledger (user_id, amount, kind, ref_type, ref_id, created_at, compacted)
+                 VALUES (%s,%s,%s,%s,%s,%s,1)"""
+
+def _load_ticket_chunk(job: dict) -> int:
+    """Tickets for a range of buses; ids come from [id_start, id_start + id_cap). Returns tickets written."""
+    rng = random.Random(job["seed"])
+    days = [(d, _day_factor(d)) for d in job["dates"]]
+    mean_day = sum(f for _, f in days) / len(days)
+    u0, un = job["users"]
+    next_id, id_end = job["id_start"], job["id_start"] + job["id_cap"]
+    tickets, inventory, history, ledger = [], [], [], []
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+
+            def flush():
+                _flush(cur, _TICKET_SQL, tickets)
+                _flush(cur, _INVENTORY_SQL, inventory)
+                _flush(cur, _HISTORY_SQL, history)
+                _flush(cur, _LEDGER_SQL, ledger)
+                conn.commit()
+
+            for bus_id, seats, price, weight in job["buses"]:
+                for d, factor in days:
+                    expected = job["per_service"] * weight * factor / mean_day
+                    booked = min(seats, int(rng.lognormvariate(math.log(expected + 0.5), 0.5)) if expected > 0 else 0)
+                    cancelled = sum(1 for _ in range(booked) if rng.random() < job["cancel_ratio"])
+                    if booked + cancelled == 0 or next_id + booked + cancelled > id_end:
+                        continue
+                    active_seats = rng.sample(range(1, seats + 1), booked)
+                    for k in range(booked + cancelled):
+                        is_active = k < booked
+                        seat = active_seats[k] if is_active else rng.randint(1, seats)
+                        tid = next_id
+                        next_id += 1
+                        user_id = u0 + min(un - 1, int(rng.paretovariate(1.2)) - 1) if rng.random() < 0.3 else rng.randrange(u0, u0 + un)
+                        booked_at = datetime.combine(d, datetime.min.time()) - timedelta(
+                            days=min(60, rng.expovariate(1 / 7)), seconds=rng.randrange(86400))
+                        tickets.append((tid, f"G{tid:011d}", user_id, bus_id, seat, price,
+                                        "ACTIVE" if is_active else "CANCELLED", booked_at, d))
+                        if rng.random() < job["wallet_ratio"]:
+                            ledger.append((user_id, -price, wallet.TICKET, "ticket", tid, booked_at))
+                        if not is_active:
+                            cancelled_at = booked_at + timedelta(hours=rng.randrange(1, 48))
+                            history.append((tid, "CANCELLED", "User cancelled — refunded to wallet", cancelled_at))
+                            ledger.append((user_id, price, wallet.REFUND, "ticket", tid, cancelled_at))
+                    if booked:
+                        inventory.append((bus_id, d, seat_bitmap.from_seats(active_seats, seats), booked))
+                    if len(tickets) >= job["batch"]:
+                        flush()
+            flush()
+            cur.execute("SET SESSION foreign_key_checks = 1, unique_checks = 1")
+    finally:
+        conn.close()
+    return next_id - job["id_start"]
+
+
+def _finish(first_user: int):
+    """Wallet snapshots of the generated users from their ledger, then stats counters from the base tables."""
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO wallet_balances (user_id, balance)
+                SELECT user_id, SUM(amount) FROM wallet_ledger WHERE user_id >= %s AND compacted = 1 GROUP BY user_id
+                ON DUPLICATE KEY UPDATE balance = VALUES(balance)
+            """, (first_user,))
+        conn.commit()
+    finally:
+        conn.close()
+    return stats.reconcile(fix=True)
+
+
+def generate(users: int, buses: int, tickets: int, past_days: int = 180, future_days: int = 60,
+             cancel_ratio: float = 0.08, wallet_ratio: float = 0.6, workers: int = 4, batch: int = 5000,
+             seed: int = 42, log=print) -> dict:
+    started = time.perf_counter()
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            first_user, first_bus, first_ticket = (_next_id(cur, t) for t in ("users", "buses", "tickets"))
+    finally:
+        conn.close()
+
+    dates = _dates(past_days, future_days)
+    per_service = tickets * (1 - cancel_ratio) / max(1, buses * len(dates))
+    chunk = max(1, math.ceil(buses / (workers * 4)))
+    id_cap = math.ceil(tickets / max(1, buses) * chunk * 3) + 10_000   # head-room for noise; generous gaps are harmless
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        user_chunk = max(1, math.ceil(users / workers))
+        done = [pool.submit(_load_users, first_user + i, min(user_chunk, users - i), batch, seed + i)
+                for i in range(0, users, user_chunk)]
+        log(f"users: {sum(f.result() for f in done)}")
+        fleet = _load_buses(first_bus, buses, batch, seed)
+        log(f"buses: {len(fleet)}")
+        jobs = [{"seed": seed * 1_000_003 + i, "buses": fleet[i:i + chunk], "dates": dates,
+                 "users": (first_user, users), "id_start": first_ticket + (i // chunk) * id_cap, "id_cap": id_cap,
+                 "per_service": per_service, "cancel_ratio": cancel_ratio, "wallet_ratio": wallet_ratio,
+                 "batch": batch}
+                for i in range(0, len(fleet), chunk)]
+        written = 0
+        for n, count in enumerate(pool.map(_load_ticket_chunk, jobs), 1):
+            written += count
+            log(f"tickets: {written} ({n}/{len(jobs)} chunks)")
+
+    drift = _finish(first_user)
+    elapsed = time.perf_counter() - started
+    report = {"users": users, "buses": buses, "tickets": written, "travel_dates": len(dates),
+              "elapsed_s": round(elapsed, 1), "tickets_per_s": round(written / elapsed) if elapsed else None,
+              "stats_corrected": len(drift)}
+    log(report)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic users, buses and tickets")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--buses", type=int, default=20_000)
+    parser.add_argument("--tickets", type=int, default=1_000_000, help="approximate; cancelled tickets included")
+    parser.add_argument("--past-days", type=int, default=180)
+    parser.add_argument("--future-days", type=int, default=60)
+    parser.add_argument("--cancel-ratio", type=float, default=0.08)
+    parser.add_argument("--wallet-ratio", type=float, default=0.6, help="share of tickets paid from the wallet")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=5000, help="rows per multi-row INSERT")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(sys.argv[1:])
+    init_db()
+    generate(args.users, args.buses, args.tickets, args.past_days, args.future_days, args.cancel_ratio,
+             args.wallet_ratio, args.workers, args.batch, args.seed)
@@ -1,149 +1,551 @@
 
 import pymysql
+from pymysql.constants import SERVER_STATUS
 import hashlib
+import hmac
 import binascii
-import uuid
+import threading
+import random
+import atexit
+import time
+import weakref
+import itertools
+from collections import deque
+from contextlib import contextmanager
 
 import os
 from datetime import datetime
 
+import metrics
 
 
-DB_HOST = "localhost"
-DB_PORT = 3306
-DB_USER = "root"       
-DB_PASS = "1234"       
-DB_NAME = "bus_system" 
 
+# BUS_DB_* environment variables override these (e.g. to point a benchmark at a scratch database)
+DB_HOST = os.environ.get("BUS_DB_HOST", "localhost")
+DB_PORT = int(os.environ.get("BUS_DB_PORT", 3306))
+DB_USER = os.environ.get("BUS_DB_USER", "root")
+DB_PASS = os.environ.get("BUS_DB_PASS", "1234")
+DB_NAME = os.environ.get("BUS_DB_NAME", "bus_system")
 
+# Storage backend: "mysql" (the server above) or "sqlite" (one local file, see sqlite_backend.py)
+DB_BACKEND = os.environ.get("BUS_DB_BACKEND", "mysql").lower()
+DB_PATH = os.environ.get("BUS_DB_PATH", f"{DB_NAME}.sqlite3")
+if DB_BACKEND not in ("mysql", "sqlite"):
+    raise ValueError(f"BUS_DB_BACKEND must be 'mysql' or 'sqlite', not {DB_BACKEND!r}")
 
+# Read replicas for get_read_conn(): comma-separated host[:port] (MySQL, same
+# credentials and database name as the primary) or file paths (SQLite)
+DB_REPLICAS = [r.strip() for r in os.environ.get("BUS_DB_REPLICAS", "").split(",") if r.strip()]
+DB_REPLICA_MAX_LAG = float(os.environ.get("BUS_DB_REPLICA_MAX_LAG", 5))   # seconds behind the primary
+DB_REPLICA_HEARTBEAT = 1.0   # seconds between heartbeat writes on the primary
+DB_REPLICA_CHECK = 1.0       # seconds between lag checks of a replica
+DB_REPLICA_RETRY = 10.0      # seconds an unreachable replica is skipped
 
 
-def get_conn(use_db=True):
+
+
+
+# Connection pool settings (per process)
+DB_POOL_SIZE = 10          # max open connections
+DB_POOL_TIMEOUT = 10       # seconds to wait for a free connection
+DB_POOL_MAX_IDLE = 300     # idle connections older than this are closed
+DB_POOL_PING_AFTER = 30    # idle connections older than this are pinged before reuse
+
+
+# Password hashing: new hashes (and upgrades on login) use these parameters;
+# users.hash_iterations records what each stored hash was made with.
+PBKDF2_ALGO = "pbkdf2_sha256"
+PBKDF2_ITERATIONS = 150_000
+
+
+# Transaction retry settings
+TXN_RETRIES = 3              # extra attempts after a deadlock or lock wait timeout
+TXN_RETRY_BACKOFF = 0.02     # seconds; doubled per attempt, plus jitter
+
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_DUP_ENTRY = 1062
+ER_LOCK_DEADLOCK = 1213
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _connect(use_db=True, target=None):
+    """A new connection to the primary, or to `target` (a DB_REPLICAS entry)."""
+    if DB_BACKEND == "sqlite":
+        import sqlite_backend   # only needed (and only imported) for SQLite deployments
+        conn = sqlite_backend.connect(target or DB_PATH)
+        metrics.inc("bus_db_connections_opened_total")
+        return conn
+    host, port = DB_HOST, DB_PORT
+    if target:
+        host, _, port = target.partition(":")
+        port = int(port or 3306)
     kwargs = dict(
-        host=DB_HOST,
-        port=DB_PORT,
+        host=host,
+        port=port,
         user=DB_USER,
         password=DB_PASS,
         charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor,
+        cursorclass=metrics.InstrumentedCursor,
         autocommit=False
     )
     if use_db:
         kwargs['database'] = DB_NAME
-    return pymysql.connect(**kwargs)
+    conn = pymysql.connect(**kwargs)
+    metrics.inc("bus_db_connections_opened_total")
+    return conn
 
 
-def init_db():
+class PooledConnection:
+    """
+    Proxy around a connection handed out by ConnectionPool or ThreadLocalPool.
+    close() (or leaving a `with` block) returns it to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise pymysql.err.InterfaceError("connection already returned to pool")
+        return getattr(raw, name)
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.release(raw)
+
+    def discard(self):
+        """Closes the underlying connection instead of pooling it (e.g. an abandoned streaming read)."""
+        raw, self._raw = self.__dict__.get('_raw'), None
+        if raw is not None:
+            self._pool.release(raw, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
     """
-    Resets/creates the database schema and inserts sample data.
-    This drops old tables and recreates clean schema (Option A).
+    Bounded, thread-safe pool of pymysql connections.
+    - at most `maxsize` connections are open at once; callers wait up to `timeout` seconds
+    - connections idle longer than `max_idle` are closed
+    - connections idle longer than `ping_after` are health-checked before reuse
+    """
+
+    def __init__(self, factory, maxsize=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 max_idle=DB_POOL_MAX_IDLE, ping_after=DB_POOL_PING_AFTER):
+        self.factory = factory
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self._idle = deque()   # (raw_conn, last_used); newest on the right
+        self._open = 0
+        self._cond = threading.Condition()
+
+    def _evict_idle_locked(self, now):
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            raw, _ = self._idle.popleft()
+            self._open -= 1
+            _close_quietly(raw)
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._evict_idle_locked(now)
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                    break
+                if self._open < self.maxsize:
+                    self._open += 1
+                    raw, last_used = None, None
+                    break
+                if now >= deadline:
+                    metrics.inc("bus_db_pool_timeouts_total")
+                    raise PoolTimeout(f"no free DB connection after {self.timeout}s (pool size {self.maxsize})")
+                self._cond.wait(deadline - now)
+
+        try:
+            if raw is None:
+                raw = self.factory()
+            elif time.monotonic() - last_used > self.ping_after:
+                try:
+                    raw.ping(reconnect=False)
+                except Exception:
+                    _close_quietly(raw)
+                    raw = self.factory()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        metrics.inc("bus_db_pool_checkouts_total")
+        metrics.observe("bus_db_pool_acquire_seconds", time.monotonic() - started)
+        return PooledConnection(self, raw)
+
+    def release(self, raw, discard: bool = False):
+        healthy = False
+        try:
+            # end any transaction left open (including read snapshots) before reuse;
+            # not on discard: with an unread result pending, rollback() would read it all first
+            if not discard:
+                if raw.open and raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    raw.rollback()
+                healthy = raw.open
+        except Exception:
+            healthy = False
+        with self._cond:
+            if healthy:
+                self._idle.append((raw, time.monotonic()))
+            else:
+                self._open -= 1
+                _close_quietly(raw)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                raw, _ = self._idle.popleft()
+                self._open -= 1
+                _close_quietly(raw)
+
+
+class ThreadLocalPool:
     """
-    # Create database if doesn't exist
-    conn0 = get_conn(use_db=False)
+    One connection per thread, for SQLite: connections are cheap to keep, and
+    SQLite's own locking (not a pool limit) decides who waits. A thread that
+    holds several connections at once (e.g. a streaming read while it books)
+    gets extra ones. Same interface as ConnectionPool.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._local = threading.local()
+        self._all = weakref.WeakSet()   # for close_all; connections of finished threads are collected
+        self._lock = threading.Lock()
+
+    def _idle(self):
+        idle = getattr(self._local, "idle", None)
+        if idle is None:
+            idle = self._local.idle = []
+        return idle
+
+    def acquire(self):
+        idle = self._idle()
+        while idle:
+            raw = idle.pop()
+            if raw.open:
+                break
+        else:
+            raw = self.factory()
+            with self._lock:
+                self._all.add(raw)
+        metrics.inc("bus_db_pool_checkouts_total")
+        return PooledConnection(self, raw)
+
+    def release(self, raw, discard: bool = False):
+        healthy = False
+        try:
+            if not discard:
+                raw.rollback()   # end any transaction (and read snapshot) left open
+                healthy = raw.open
+        except Exception:
+            healthy = False
+        if healthy:
+            self._idle().append(raw)
+        else:
+            _close_quietly(raw)
+
+    def close_all(self):
+        with self._lock:
+            conns = list(self._all)
+            self._all = weakref.WeakSet()
+        for raw in conns:
+            _close_quietly(raw)
+
+    def open_count(self) -> int:
+        return len(self._all)
+
+
+def _close_quietly(raw):
+    metrics.inc("bus_db_connections_closed_total")
     try:
-        with conn0.cursor() as cur:
-            cur.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME} DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;")
-        conn0.commit()
-    finally:
-        conn0.close()
+        raw.close()
+    except Exception:
+        pass
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                # a forked child must never reuse the parent's sockets
+                if DB_BACKEND == "sqlite":
+                    pool = ThreadLocalPool(_connect)
+                    metrics.gauge("bus_db_pool_open", pool.open_count, "Connections currently open in the pool.")
+                else:
+                    pool = ConnectionPool(_connect)
+                    metrics.gauge("bus_db_pool_open", lambda: pool._open, "Connections currently open in the pool.")
+                    metrics.gauge("bus_db_pool_idle", lambda: len(pool._idle), "Open connections waiting in the pool.")
+                _pool, _pool_pid = pool, pid
+    return _pool
+
 
-    # Connect to DB and recreate schema (dropping old tables)
+def close_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close_all()
+    if _replicas is not None and _replicas_pid == os.getpid():
+        for replica in _replicas:
+            replica.pool.close_all()
+
+
+atexit.register(close_pool)
+
+
+def get_conn(use_db=True):
+    """
+    Returns a pooled connection; call close() (or use `with get_conn() as conn:`)
+    to hand it back. use_db=False opens a one-off connection without selecting
+    the database (only needed to create it on MySQL).
+    """
+    if not use_db:
+        return _connect(use_db=False)
+    return get_pool().acquire()
+
+
+@contextmanager
+def connection():
     conn = get_conn()
     try:
-        with conn.cursor() as cur:
-            # drop tables if exist (reset)
-            cur.execute("SET FOREIGN_KEY_CHECKS=0;")
-            cur.execute("DROP TABLE IF EXISTS ticket_history;")
-            cur.execute("DROP TABLE IF EXISTS tickets;")
-            cur.execute("DROP TABLE IF EXISTS buses;")
-            cur.execute("DROP TABLE IF EXISTS users;")
-            cur.execute("SET FOREIGN_KEY_CHECKS=1;")
-
-            # users
-
-            cur.execute("""
-                CREATE TABLE users (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    username VARCHAR(150) NOT NULL UNIQUE,
-                    password_hash VARCHAR(256) NOT NULL,
-                    salt VARCHAR(64) NOT NULL,
-                    is_admin TINYINT DEFAULT 0,
-                    wallet BIGINT DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                ) ENGINE=InnoDB;
-            """)
-
-            # buses
-            cur.execute("""
-                CREATE TABLE buses (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    route VARCHAR(255) NOT NULL,
-                    route_description TEXT NULL,
-                    total_seats INT NOT NULL,
-                    seats_available INT NOT NULL,
-                    price INT DEFAULT 100,
-                    departure_time TIME NULL,
-                    arrival_time TIME NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                ) ENGINE=InnoDB;
-            """)
-
-           
-            cur.execute("""
-                CREATE TABLE tickets (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    ticket_no VARCHAR(64) NOT NULL UNIQUE,
-                    user_id INT NOT NULL,
-                    bus_id INT NOT NULL,
-                    seat_no INT NOT NULL,
-                    price_paid INT NOT NULL,
-                    status ENUM('ACTIVE','CANCELLED') DEFAULT 'ACTIVE',
-                    booked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    travel_date DATE NULL,
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                    FOREIGN KEY (bus_id) REFERENCES buses(id) ON DELETE CASCADE
-                ) ENGINE=InnoDB;
-            """)
+        yield conn
+    finally:
+        conn.close()
 
-           
-            cur.execute("""
-                CREATE TABLE ticket_history (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    ticket_id INT NOT NULL,
-                    action VARCHAR(50) NOT NULL,
-                    note TEXT,
-                    performed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (ticket_id) REFERENCES tickets(id) ON DELETE CASCADE
-                ) ENGINE=InnoDB;
-            """)
 
-        conn.commit()
+# ------------- read replicas -------------
+# Writes, and reads that must see the caller's own writes (seat maps, a
+# user's tickets, anything inside a transaction), use get_conn(). Catalogue,
+# search and report reads use get_read_conn(), which spreads them over
+# DB_REPLICAS so they never queue behind bookings on the primary.
+#
+# Lag: while replicas are configured, each process writes its clock to
+# replication_heartbeat on the primary every DB_REPLICA_HEARTBEAT seconds.
+# The newest heartbeat a replica has tells how far behind it is, and that
+# everything committed on the primary before that moment is there.
+
+class Replica:
+    """One read replica: its pool and what its last heartbeat check found."""
+
+    def __init__(self, target: str):
+        self.target = target
+        factory = lambda: _connect(target=target)
+        self.pool = ThreadLocalPool(factory) if DB_BACKEND == "sqlite" else ConnectionPool(factory)
+        self.beat = None          # primary clock (epoch seconds) of the newest heartbeat seen here
+        self.checked_at = 0.0
+        self.down_until = 0.0
+        self.error = None
+        self._lock = threading.Lock()
+
+    def mark_down(self, now: float, error):
+        self.beat, self.error, self.down_until = None, str(error), now + DB_REPLICA_RETRY
+
+    def _refresh(self, now: float):
+        # one thread checks; the others use the previous result meanwhile
+        if now - self.checked_at < DB_REPLICA_CHECK or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.checked_at = now
+            conn = self.pool.acquire()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT beat_ms FROM replication_heartbeat WHERE id=1")
+                    r = cur.fetchone()
+            finally:
+                conn.close()
+            self.beat, self.error = (r['beat_ms'] / 1000 if r and r['beat_ms'] else None), None
+        except Exception as e:
+            self.mark_down(now, e)
+        finally:
+            self._lock.release()
+
+    def usable(self, now: float, fresh_since: float = None) -> bool:
+        if now < self.down_until:
+            return False
+        self._refresh(now)
+        return (self.beat is not None and now - self.beat <= DB_REPLICA_MAX_LAG
+                and (fresh_since is None or self.beat >= fresh_since))
+
+    def status(self, now: float) -> dict:
+        return {"replica": self.target, "up": now >= self.down_until and self.error is None,
+                "lag_s": round(now - self.beat, 3) if self.beat is not None else None, "error": self.error}
+
+
+def _heartbeat_loop():
+    while True:
+        try:
+            conn = get_conn()
+            try:
+                with conn.cursor() as cur:
+                    now_ms = int(time.time() * 1000)
+                    cur.execute("UPDATE replication_heartbeat SET beat_ms=%s WHERE id=1 AND beat_ms < %s", (now_ms, now_ms))
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            pass   # primary unreachable or not migrated yet: replicas look stale and reads stay on the primary
+        time.sleep(DB_REPLICA_HEARTBEAT)
+
+
+_replicas = None
+_replicas_pid = None
+_replica_turn = itertools.count()
+
+
+def get_replicas():
+    global _replicas, _replicas_pid
+    pid = os.getpid()
+    if _replicas is None or _replicas_pid != pid:
+        with _pool_lock:
+            if _replicas is None or _replicas_pid != pid:
+                _replicas = [Replica(target) for target in DB_REPLICAS]
+                _replicas_pid = pid
+                if _replicas:
+                    threading.Thread(target=_heartbeat_loop, name="db-heartbeat", daemon=True).start()
+    return _replicas
+
+
+def get_read_conn(fresh_since: float = None):
+    """
+    A pooled connection for reads that may lag the primary by up to
+    DB_REPLICA_MAX_LAG seconds. With fresh_since (a time.time() value) the
+    replica must also have everything the primary committed before then.
+    Replicas take turns; the primary serves the read when none qualifies,
+    none is reachable or none is configured.
+    """
+    replicas = get_replicas()
+    if not replicas:
+        return get_conn()
+    now = time.time()
+    turn = next(_replica_turn)
+    for i in range(len(replicas)):
+        replica = replicas[(turn + i) % len(replicas)]
+        if replica.usable(now, fresh_since):
+            try:
+                conn = replica.pool.acquire()
+            except Exception as e:
+                replica.mark_down(now, e)
+                continue
+            metrics.inc("bus_db_reads_total", target="replica")
+            return conn
+    metrics.inc("bus_db_reads_total", target="primary")
+    return get_conn()
+
+
+@contextmanager
+def read_connection(fresh_since: float = None):
+    conn = get_read_conn(fresh_since)
+    try:
+        yield conn
     finally:
         conn.close()
 
-    
-    create_default_admin_if_missing()
-    insert_sample_buses_if_missing()
+
+def replica_status() -> list:
+    """[{replica, up, lag_s, error}] for each replica (checked now unless checked recently)."""
+    now = time.time()
+    for r in get_replicas():
+        if now >= r.down_until:
+            r._refresh(now)
+    return [r.status(now) for r in get_replicas()]
 
 
+def is_retryable(exc) -> bool:
+    return isinstance(exc, pymysql.err.OperationalError) and exc.args and exc.args[0] in (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT)
 
-def hash_password(password: str, salt: bytes = None):
+
+def run_transaction(fn, retries=TXN_RETRIES):
+    """
+    Runs fn(cur) as one transaction on a single pooled connection.
+    fn returns a tuple whose first item is ok: the transaction is committed when
+    ok is true and rolled back otherwise. On deadlock or lock wait timeout the
+    whole transaction is rolled back and retried up to `retries` times.
+    """
+    attempt = 0
+    while True:
+        conn = get_conn()
+        try:
+            with conn.cursor() as cur:
+                result = fn(cur)
+            if result[0]:
+                conn.commit()
+            else:
+                conn.rollback()
+            return result
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            if attempt >= retries or not is_retryable(e):
+                raise
+        finally:
+            conn.close()
+        attempt += 1
+        metrics.inc("bus_txn_retries_total")
+        time.sleep(TXN_RETRY_BACKOFF * (2 ** (attempt - 1)) * (1 + random.random()))
+
+
+def init_db():
+    """
+    Brings the schema up to date by applying pending migrations (see migrations.py)
+    and seeds the default admin and sample buses after a fresh install.
+    Existing data is never dropped; when the schema is current this costs a
+    single version check.
+    """
+    from migrations import migrate   # migrations imports get_conn from here
+    applied = migrate()
+    if 1 in applied:   # fresh install (or first run on a pre-migrations database)
+        create_default_admin_if_missing()
+        insert_sample_buses_if_missing()
+
+
+
+# CPU-heavy; request paths should go through hashing.py instead of calling these directly.
+def hash_password(password: str, salt: bytes = None, iterations: int = PBKDF2_ITERATIONS):
     if salt is None:
         salt = os.urandom(16)
-    pwdhash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 150_000)
+    pwdhash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
     return binascii.hexlify(pwdhash).decode('ascii'), binascii.hexlify(salt).decode('ascii')
 
 
-def verify_password(stored_hash_hex: str, stored_salt_hex: str, provided_password: str) -> bool:
+def verify_password(stored_hash_hex: str, stored_salt_hex: str, provided_password: str, iterations: int = PBKDF2_ITERATIONS) -> bool:
     salt = binascii.unhexlify(stored_salt_hex.encode('ascii'))
-    new_hash, _ = hash_password(provided_password, salt)
-    return new_hash == stored_hash_hex
+    new_hash, _ = hash_password(provided_password, salt, iterations)
+    return hmac.compare_digest(new_hash, stored_hash_hex)
 
 
 
 
 def create_default_admin_if_missing():
+    import stats   # stats imports get_conn from here
     conn = get_conn()
     try:
         with conn.cursor() as cur:
@@ -152,8 +554,9 @@ def create_default_admin_if_missing():
                 return
            
             pwd_hash, salt = hash_password("admin123")
-            cur.execute("INSERT INTO users (username, password_hash, salt, is_admin, wallet) VALUES (%s,%s,%s,1,%s)",
-                        ("admin", pwd_hash, salt, 0))
+            cur.execute("INSERT INTO users (username, password_hash, salt, hash_iterations, is_admin) VALUES (%s,%s,%s,%s,1)",
+                        ("admin", pwd_hash, salt, PBKDF2_ITERATIONS))
+            stats.bump(cur, users=1)
         conn.commit()
         print("Default admin created -> username: admin password: admin123")
     finally:
@@ -162,12 +565,14 @@ def create_default_admin_if_missing():
 
 def insert_sample_buses_if_missing():
     samples = [
-        ("Bhopal → Indore", "Express via NH46", 40, 40, 250, "06:00:00", "09:00:00"),
-        ("Bhopal → Mumbai", "Overnight Volvo", 50, 50, 1200, "22:00:00", "08:00:00"),
-        ("Delhi → Jaipur", "AC Deluxe", 35, 35, 350, "07:00:00", "11:00:00"),
-        ("Mumbai → Pune", "Frequent", 45, 45, 300, "09:00:00", "11:30:00"),
-        ("Hyderabad → Bangalore", "Comfort Coach", 40, 40, 700, "06:30:00", "11:00:00")
+        ("BUS1", "Bhopal → Indore", "Express via NH46", 40, 250, "06:00:00", "09:00:00"),
+        ("BUS2", "Bhopal → Mumbai", "Overnight Volvo", 50, 1200, "22:00:00", "08:00:00"),
+        ("BUS3", "Delhi → Jaipur", "AC Deluxe", 35, 350, "07:00:00", "11:00:00"),
+        ("BUS4", "Mumbai → Pune", "Frequent", 45, 300, "09:00:00", "11:30:00"),
+        ("BUS5", "Hyderabad → Bangalore", "Comfort Coach", 40, 700, "06:30:00", "11:00:00")
     ]
+    import stats
+    import routes
     conn = get_conn()
     try:
         with conn.cursor() as cur:
@@ -175,17 +580,12 @@ def insert_sample_buses_if_missing():
             r = cur.fetchone()
             if r and r.get('cnt', 0) > 0:
                 return
-            for route, desc, total, avail, price, dep, arr in samples:
-                cur.execute("""
-                    INSERT INTO buses (route, route_description, total_seats, seats_available, price, departure_time, arrival_time)
-                    VALUES (%s,%s,%s,%s,%s,%s,%s)
-                """, (route, desc, total, avail, price, dep, arr))
+            cur.executemany("""
+                INSERT INTO buses (bus_code, route, origin, destination, route_description, total_seats, price, departure_time, arrival_time)
+                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+            """, [(code, route) + routes.parse_route(route) + tuple(rest) for code, route, *rest in samples])
+            stats.bump(cur, buses=len(samples))
         conn.commit()
         print("Sample buses inserted.")
     finally:
         conn.close()
-
-
-
-def generate_ticket_no():
-    return "T" + uuid.uuid4().hex[:10].upper()
\ No newline at end of file
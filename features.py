@@ -1,79 +1,150 @@
 # features.py
-from db_config import get_conn, generate_ticket_no
-from datetime import datetime
-import os
+from db_config import get_conn, get_read_conn, run_transaction, ER_DUP_ENTRY
+import pymysql
+import archive
+import catalogue
+import routes
+import seat_bitmap
+import sessions
+import wallet
+import stats
+import ticket_docs
+import ticket_ids
+import metrics
+
+# Availability lives in seat_inventory, one row per (bus, travel date); a bus with
+# no row for the date has every seat free. Undated tickets use seat_bitmap.UNDATED.
+# Reads outside transactions take bus metadata from catalogue.py (cached) and
+# only the availability from the database.
+_BUS_COLUMNS = ("b.id, b.route, b.total_seats, b.total_seats - IFNULL(si.seats_booked, 0) AS seats_available, "
+                "b.price, b.departure_time, b.arrival_time")
+_BUS_FROM = "buses b LEFT JOIN seat_inventory si ON si.bus_id = b.id AND si.travel_date = %s"
 
 # -------------- BUS CRUD ----------------
-def add_bus(route: str, total_seats: int, price: int = 100, departure_time: str = None, arrival_time: str = None, description: str = None):
+@metrics.timed("add_bus")
+def add_bus(route: str, total_seats: int, price: int = 100, departure_time: str = None, arrival_time: str = None, description: str = None, bus_code: str = None):
+    try:
+        seat_bitmap.check_total_seats(total_seats)
+    except ValueError as e:
+        return False, f"Error adding bus: {e}"
     conn = get_conn()
     try:
         with conn.cursor() as cur:
+            origin, destination = routes.parse_route(route)
             cur.execute("""
-                INSERT INTO buses (route, route_description, total_seats, seats_available, price, departure_time, arrival_time)
-                VALUES (%s,%s,%s,%s,%s,%s,%s)
-            """, (route, description, total_seats, total_seats, price, departure_time, arrival_time))
+                INSERT INTO buses (bus_code, route, origin, destination, route_description, total_seats, price, departure_time, arrival_time)
+                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+            """, (bus_code, route, origin, destination, description, total_seats, price, departure_time, arrival_time))
+            stats.bump(cur, buses=1)
         conn.commit()
+        catalogue.invalidate()
         return True, "Bus added."
     except Exception as e:
         return False, f"Error adding bus: {e}"
     finally:
         conn.close()
 
-def list_buses():
-    conn = get_conn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, route, total_seats, seats_available, price, departure_time, arrival_time FROM buses")
-            return cur.fetchall()
-    finally:
-        conn.close()
+@metrics.timed("list_buses")
+def list_buses(travel_date: str = None):
+    return catalogue.with_availability(catalogue.query(("all",)), travel_date)
 
-def get_bus(bus_id: int):
-    conn = get_conn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, route, total_seats, seats_available, price, departure_time, arrival_time FROM buses WHERE id=%s", (bus_id,))
-            return cur.fetchone()
-    finally:
-        conn.close()
+def _get_bus(cur, bus_id: int, travel_date: str = None):
+    cur.execute(f"SELECT {_BUS_COLUMNS} FROM {_BUS_FROM} WHERE b.id=%s", (travel_date or seat_bitmap.UNDATED, bus_id))
+    return cur.fetchone()
 
+@metrics.timed("get_bus")
+def get_bus(bus_id: int, travel_date: str = None):
+    bus = catalogue.get_many([bus_id]).get(bus_id)
+    return catalogue.with_availability([bus], travel_date)[0] if bus else None
+
+def highest_booked_seats(cur, bus_ids) -> dict:
+    """
+    bus_id -> highest seat number booked on an upcoming (or undated) service.
+    Locks those seat_inventory rows, so no booking can take a higher seat meanwhile.
+    """
+    if not bus_ids:
+        return {}
+    marks = ",".join(["%s"] * len(bus_ids))
+    cur.execute(f"""
+        SELECT bus_id, occupancy FROM seat_inventory
+        WHERE bus_id IN ({marks}) AND (travel_date >= CURDATE() OR travel_date = %s) AND seats_booked > 0
+        FOR UPDATE
+    """, list(bus_ids) + [seat_bitmap.UNDATED])
+    highest = {}
+    for r in cur.fetchall():
+        seats = seat_bitmap.booked_list(r['occupancy'])
+        if seats:
+            highest[r['bus_id']] = max(highest.get(r['bus_id'], 0), max(seats))
+    return highest
+
+def move_route_stats(cur, moves):
+    """Moves the active tickets of each (bus_id, old_route, new_route) to the new route in route_stats."""
+    moves = [m for m in moves if m[1] != m[2]]
+    if not moves:
+        return
+    marks = ",".join(["%s"] * len(moves))
+    cur.execute(f"SELECT bus_id, COUNT(*) AS n FROM tickets WHERE bus_id IN ({marks}) AND status='ACTIVE' GROUP BY bus_id",
+                [m[0] for m in moves])
+    counts = {r['bus_id']: r['n'] for r in cur.fetchall()}
+    for bus_id, old_route, new_route in moves:
+        n = counts.get(bus_id, 0)
+        stats.bump_route(cur, old_route, -n)
+        stats.bump_route(cur, new_route, n)
+
+@metrics.timed("update_bus")
 def update_bus(bus_id: int, route: str = None, price: int = None, total_seats: int = None, departure_time: str = None, arrival_time: str = None):
+    fields = {"price": price, "total_seats": total_seats, "departure_time": departure_time, "arrival_time": arrival_time}
+    if route is not None:
+        fields["route"] = route
+        fields["origin"], fields["destination"] = routes.parse_route(route)
+    fields = {k: v for k, v in fields.items() if v is not None or k in ("origin", "destination")}
+    if not fields:
+        return True, "Nothing to update."
+    if total_seats is not None:
+        try:
+            seat_bitmap.check_total_seats(total_seats)
+        except ValueError as e:
+            return False, f"Error updating: {e}"
     conn = get_conn()
     try:
         with conn.cursor() as cur:
+            old = None
+            if route is not None or total_seats is not None:
+                cur.execute("SELECT route FROM buses WHERE id=%s FOR UPDATE", (bus_id,))
+                old = cur.fetchone()
+                if not old:
+                    return False, "Bus not found."
+            # refuse to drop seats that are still booked on an upcoming (or undated) service
+            if total_seats is not None and highest_booked_seats(cur, [bus_id]).get(bus_id, 0) > total_seats:
+                return False, "Cannot reduce seats below already booked seats."
+            cur.execute(f"UPDATE buses SET {', '.join(k + '=%s' for k in fields)} WHERE id=%s", list(fields.values()) + [bus_id])
             if route is not None:
-                cur.execute("UPDATE buses SET route=%s WHERE id=%s", (route, bus_id))
-            if price is not None:
-                cur.execute("UPDATE buses SET price=%s WHERE id=%s", (price, bus_id))
-            if total_seats is not None:
-                # Update total seats and recalc seats_available carefully
-                cur.execute("SELECT total_seats, seats_available FROM buses WHERE id=%s", (bus_id,))
-                r = cur.fetchone()
-                if r:
-                    old_total = r['total_seats']
-                    old_avail = r['seats_available']
-                    delta = total_seats - old_total
-                    new_avail = old_avail + delta
-                    if new_avail < 0:
-                        return False, "Cannot reduce seats below already booked seats."
-                    cur.execute("UPDATE buses SET total_seats=%s, seats_available=%s WHERE id=%s", (total_seats, new_avail, bus_id))
-            if departure_time is not None:
-                cur.execute("UPDATE buses SET departure_time=%s WHERE id=%s", (departure_time, bus_id))
-            if arrival_time is not None:
-                cur.execute("UPDATE buses SET arrival_time=%s WHERE id=%s", (arrival_time, bus_id))
+                move_route_stats(cur, [(bus_id, old['route'], route)])
         conn.commit()
+        catalogue.invalidate(bus_id)
         return True, "Bus updated."
     except Exception as e:
         return False, f"Error updating: {e}"
     finally:
         conn.close()
 
+@metrics.timed("delete_bus")
 def delete_bus(bus_id: int):
     conn = get_conn()
     try:
         with conn.cursor() as cur:
+            cur.execute("SELECT route FROM buses WHERE id=%s FOR UPDATE", (bus_id,))
+            b = cur.fetchone()
+            if not b:
+                return False, "Bus not found."
+            # tickets go with the bus (ON DELETE CASCADE); take their counts out of the stats
+            cur.execute("SELECT COUNT(*) AS n, IFNULL(SUM(price_paid), 0) AS revenue FROM tickets WHERE bus_id=%s AND status='ACTIVE'", (bus_id,))
+            t = cur.fetchone()
             cur.execute("DELETE FROM buses WHERE id=%s", (bus_id,))
+            stats.bump(cur, buses=-1, active_tickets=-t['n'], revenue=-int(t['revenue']))
+            stats.bump_route(cur, b['route'], -t['n'])
         conn.commit()
+        catalogue.invalidate(bus_id)
         return True, "Bus deleted."
     except Exception as e:
         return False, f"Error deleting bus: {e}"
@@ -82,73 +153,178 @@ def delete_bus(bus_id: int):
 
 
 # ------------- SEARCH -------------------
-def search_buses_by_route(term: str):
-    conn = get_conn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, route, total_seats, seats_available, price, departure_time, arrival_time FROM buses WHERE route LIKE %s", ('%' + term + '%',))
-            return cur.fetchall()
-    finally:
-        conn.close()
+# Every search starts from an index on buses: (origin, destination, departure_time)
+# or (destination, departure_time), with equality on the cities and a range on the
+# departure time. Matches are cached per filter set (catalogue.py); seat filters
+# are applied afterwards to the fresh availability.
+def _seat_filter(rows, min_seats_available, limit=None):
+    if min_seats_available is not None:
+        rows = [r for r in rows if r['seats_available'] >= min_seats_available]
+    return rows if limit is None else rows[:limit]
 
-def search_buses_advanced(route_term: str = None, min_seats_available: int = None, price_min: int = None, price_max: int = None):
-    conn = get_conn()
+@metrics.timed("search_buses")
+def search_buses(origin: str = None, destination: str = None, depart_after: str = None, depart_before: str = None,
+                 price_min: int = None, price_max: int = None, min_seats_available: int = None,
+                 travel_date: str = None, limit: int = 100):
+    """Buses between two cities (either may be omitted), ordered by departure time."""
+    origin, destination = routes.normalize_city(origin), routes.normalize_city(destination)
+    where, params = "WHERE 1=1", []
+    if origin:
+        where += " AND b.origin = %s"; params.append(origin)
+    if destination:
+        where += " AND b.destination = %s"; params.append(destination)
+    if depart_after:
+        where += " AND b.departure_time >= %s"; params.append(depart_after)
+    if depart_before:
+        where += " AND b.departure_time <= %s"; params.append(depart_before)
+    if price_min is not None:
+        where += " AND b.price >= %s"; params.append(price_min)
+    if price_max is not None:
+        where += " AND b.price <= %s"; params.append(price_max)
+    key = ("search", origin and origin.lower(), destination and destination.lower(), depart_after, depart_before, price_min, price_max)
+    rows = catalogue.query(key, where, params, order="b.departure_time, b.id")
+    return _seat_filter(catalogue.with_availability(rows, travel_date), min_seats_available, limit)
+
+def _search_by_term(term: str, travel_date: str = None, min_seats_available: int = None, price_min: int = None, price_max: int = None):
+    # "A → B" searches that pair; a bare term is a city prefix on either end (index merge)
+    origin, destination = routes.parse_route(term)
+    if origin or destination:
+        return search_buses(origin, destination, price_min=price_min, price_max=price_max,
+                            min_seats_available=min_seats_available, travel_date=travel_date, limit=None)
+    prefix = routes.escape_like(routes.normalize_city(term) or "") + "%"
+    where, params = "WHERE (b.origin LIKE %s OR b.destination LIKE %s)", [prefix, prefix]
+    if price_min is not None:
+        where += " AND b.price >= %s"; params.append(price_min)
+    if price_max is not None:
+        where += " AND b.price <= %s"; params.append(price_max)
+    key = ("term", prefix.lower(), price_min, price_max)
+    rows = catalogue.query(key, where, params, order="b.departure_time, b.id")
+    return _seat_filter(catalogue.with_availability(rows, travel_date), min_seats_available)
+
+@metrics.timed("search_buses_by_route")
+def search_buses_by_route(term: str, travel_date: str = None):
+    return _search_by_term(term, travel_date)
+
+@metrics.timed("search_buses_advanced")
+def search_buses_advanced(route_term: str = None, min_seats_available: int = None, price_min: int = None, price_max: int = None, travel_date: str = None):
+    if route_term:
+        return _search_by_term(route_term, travel_date, min_seats_available=min_seats_available,
+                               price_min=price_min, price_max=price_max)
+    return search_buses(price_min=price_min, price_max=price_max, min_seats_available=min_seats_available,
+                        travel_date=travel_date, limit=None)
+
+@metrics.timed("suggest_cities")
+def suggest_cities(prefix: str, limit: int = 10):
+    """Autocomplete: city names starting with `prefix`, from the origin/destination indexes."""
+    prefix = routes.normalize_city(prefix)
+    if not prefix:
+        return []
+    pattern = routes.escape_like(prefix) + "%"
+    conn = get_read_conn()
     try:
         with conn.cursor() as cur:
-            sql = "SELECT id, route, total_seats, seats_available, price, departure_time, arrival_time FROM buses WHERE 1=1"
-            params = []
-            if route_term:
-                sql += " AND route LIKE %s"; params.append('%' + route_term + '%')
-            if min_seats_available is not None:
-                sql += " AND seats_available >= %s"; params.append(min_seats_available)
-            if price_min is not None:
-                sql += " AND price >= %s"; params.append(price_min)
-            if price_max is not None:
-                sql += " AND price <= %s"; params.append(price_max)
-            cur.execute(sql, params)
-            return cur.fetchall()
+            # derived tables rather than parenthesised SELECTs, which SQLite does not accept
+            cur.execute("""
+                SELECT city FROM (SELECT DISTINCT origin AS city FROM buses WHERE origin LIKE %s ORDER BY origin LIMIT %s) o
+                UNION
+                SELECT city FROM (SELECT DISTINCT destination AS city FROM buses WHERE destination LIKE %s ORDER BY destination LIMIT %s) d
+                ORDER BY city LIMIT %s
+            """, (pattern, limit, pattern, limit, limit))
+            return [r['city'] for r in cur.fetchall()]
     finally:
         conn.close()
 
 
 # ------------- SEAT MAP ------------------
-def booked_seats(bus_id: int):
-    conn = get_conn()
-    try:
+def _read_occupancy(cur, bus_id: int, travel_date: str = None):
+    cur.execute("SELECT occupancy FROM seat_inventory WHERE bus_id=%s AND travel_date=%s",
+                (bus_id, travel_date or seat_bitmap.UNDATED))
+    r = cur.fetchone()
+    return r['occupancy'] if r else b""
+
+def _lock_occupancy(cur, bus_id: int, travel_date: str, total_seats: int):
+    """Reads the bus/date occupancy bitmap FOR UPDATE, creating the row on first booking."""
+    key = travel_date or seat_bitmap.UNDATED
+    cur.execute("SELECT occupancy FROM seat_inventory WHERE bus_id=%s AND travel_date=%s FOR UPDATE", (bus_id, key))
+    r = cur.fetchone()
+    if r:
+        return r['occupancy']
+    cur.execute("INSERT IGNORE INTO seat_inventory (bus_id, travel_date, occupancy) VALUES (%s,%s,%s)",
+                (bus_id, key, seat_bitmap.empty(total_seats)))
+    cur.execute("SELECT occupancy FROM seat_inventory WHERE bus_id=%s AND travel_date=%s FOR UPDATE", (bus_id, key))
+    return cur.fetchone()['occupancy']
+
+def _write_occupancy(cur, bus_id: int, travel_date: str, occupancy: bytes):
+    cur.execute("UPDATE seat_inventory SET occupancy=%s, seats_booked=%s WHERE bus_id=%s AND travel_date=%s",
+                (occupancy, seat_bitmap.booked_count(occupancy), bus_id, travel_date or seat_bitmap.UNDATED))
+
+@metrics.timed("booked_seats")
+def booked_seats(bus_id: int, travel_date: str = None):
+    with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("SELECT seat_no FROM tickets WHERE bus_id=%s AND status='ACTIVE'", (bus_id,))
-            rows = cur.fetchall()
-            return [r['seat_no'] for r in rows]
-    finally:
-        conn.close()
+            return seat_bitmap.booked_list(_read_occupancy(cur, bus_id, travel_date))
 
-def pretty_print_seat_map(bus_id: int, per_row: int = 4):
-    bus = get_bus(bus_id)
-    if not bus:
-        return False, "Bus not found."
-    total = bus['total_seats']
-    booked = set(booked_seats(bus_id))
+def pretty_print_seat_map(bus_id: int, per_row: int = 4, travel_date: str = None):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            bus = _get_bus(cur, bus_id, travel_date)
+            if not bus:
+                return False, "Bus not found."
+            occupancy = _read_occupancy(cur, bus_id, travel_date)
+    return True, format_seat_map(bus['total_seats'], seat_bitmap.booked_list(occupancy), per_row)
+
+def format_seat_map(total_seats: int, booked, per_row: int = 4) -> str:
+    booked = set(booked)
     lines = []
-    for i in range(1, total + 1):
+    for i in range(1, total_seats + 1):
         mark = "X" if i in booked else str(i)
         lines.append(f"[{mark}]")
         if i % per_row == 0:
             lines.append("\n")
-    return True, "".join(lines)
+    return "".join(lines)
 
 
 # ------------- TICKETING -----------------
-def _find_next_free_seat(bus_id: int):
-    bus = get_bus(bus_id)
-    if not bus:
-        return None
-    total = bus['total_seats']
-    booked = set(booked_seats(bus_id))
-    for s in range(1, total + 1):
-        if s not in booked:
-            return s
-    return None
+# Every booking/cancellation path takes row locks in the same order to avoid
+# deadlocks: buses -> seat_inventory -> tickets -> wallet_balances. The locked
+# bitmap row is the authority on availability for its (bus, travel date).
+# Ticket numbers are taken before the transaction starts (see ticket_ids).
+def _create_ticket_txn(cur, ticket_no, user_id, bus_id, seat_no, travel_date, pay_from_wallet):
+    # shared lock: concurrent bookings don't block each other, update_bus(total_seats) waits
+    cur.execute("SELECT route, total_seats, price FROM buses WHERE id=%s LOCK IN SHARE MODE", (bus_id,))
+    b = cur.fetchone()
+    if not b:
+        return False, "Bus not found.", None
+    total_seats = b['total_seats']; price = b['price']
+    occupancy = _lock_occupancy(cur, bus_id, travel_date, total_seats)
+    if seat_bitmap.booked_count(occupancy) >= total_seats:
+        return False, "No seats available.", None
+    if seat_no == 0:
+        seat_no = seat_bitmap.first_free(occupancy, total_seats)
+        if seat_no is None:
+            return False, "No free seat available.", None
+    if seat_no < 1 or seat_no > total_seats:
+        return False, "Invalid seat number.", None
+    if seat_bitmap.is_booked(occupancy, seat_no):
+        return False, "Seat already taken.", None
+
+    cur.execute("INSERT INTO tickets (ticket_no, user_id, bus_id, seat_no, price_paid, travel_date) VALUES (%s,%s,%s,%s,%s,%s)",
+                (ticket_no, user_id, bus_id, seat_no, price, travel_date))
+    ticket_id = cur.lastrowid
+    _write_occupancy(cur, bus_id, travel_date, seat_bitmap.book(occupancy, seat_no, total_seats))
+
+    # payment via wallet ledger
+    if pay_from_wallet:
+        ok, balance = wallet.debit(cur, user_id, [(ticket_id, price)])
+        if not ok:
+            return False, f"Insufficient wallet balance (₹{balance}). Please add funds or set pay_from_wallet=False.", None
+    stats.bump(cur, active_tickets=1, revenue=price)
+    stats.bump_route(cur, b['route'], 1)
 
+    ticket_info = {"ticket_no": ticket_no, "user_id": user_id, "bus_id": bus_id, "seat_no": seat_no, "price": price, "travel_date": travel_date}
+    return True, "Ticket booked successfully.", ticket_info
+
+@metrics.timed("create_ticket")
 def create_ticket(user_id: int, bus_id: int, seat_no: int, travel_date: str = None, pay_from_wallet: bool = True):
     """
     seat_no == 0 => auto assign next free seat
@@ -156,50 +332,94 @@ def create_ticket(user_id: int, bus_id: int, seat_no: int, travel_date: str = No
     pay_from_wallet -> deduct from user wallet if True
     Returns (ok, msg, ticket_info)
     """
-    conn = get_conn()
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT total_seats, seats_available, price FROM buses WHERE id=%s", (bus_id,))
-            b = cur.fetchone()
-            if not b:
-                return False, "Bus not found.", None
-            total_seats = b['total_seats']; seats_available = b['seats_available']; price = b['price']
-            if seats_available <= 0:
-                return False, "No seats available.", None
-            if seat_no == 0:
-                seat_no = _find_next_free_seat(bus_id)
-                if seat_no is None:
-                    return False, "No free seat available.", None
-            if seat_no < 1 or seat_no > total_seats:
-                return False, "Invalid seat number.", None
-            # check already booked
-            cur.execute("SELECT id FROM tickets WHERE bus_id=%s AND seat_no=%s AND status='ACTIVE'", (bus_id, seat_no))
-            if cur.fetchone():
-                return False, "Seat already taken.", None
-
-            # payment via wallet
-            if pay_from_wallet:
-                cur.execute("SELECT wallet FROM users WHERE id=%s", (user_id,))
-                r = cur.fetchone()
-                wallet = r['wallet'] if r else 0
-                if wallet < price:
-                    return False, f"Insufficient wallet balance (₹{wallet}). Please add funds or set pay_from_wallet=False.", None
-                # deduct
-                cur.execute("UPDATE users SET wallet = wallet - %s WHERE id=%s", (price, user_id))
-
-            ticket_no = generate_ticket_no()
-            cur.execute("INSERT INTO tickets (ticket_no, user_id, bus_id, seat_no, price_paid, travel_date) VALUES (%s,%s,%s,%s,%s,%s)",
-                        (ticket_no, user_id, bus_id, seat_no, price, travel_date))
-            cur.execute("UPDATE buses SET seats_available = seats_available - 1 WHERE id=%s", (bus_id,))
-        conn.commit()
-        ticket_info = {"ticket_no": ticket_no, "user_id": user_id, "bus_id": bus_id, "seat_no": seat_no, "price": price, "travel_date": travel_date}
-        return True, "Ticket booked successfully.", ticket_info
+        ticket_no = ticket_ids.next_ticket_no()
+        result = run_transaction(lambda cur: _create_ticket_txn(cur, ticket_no, user_id, bus_id, seat_no, travel_date, pay_from_wallet))
+        if result[0] and pay_from_wallet:
+            sessions.invalidate_user(user_id)
+        return result
+    except pymysql.err.IntegrityError as e:
+        if e.args[0] == ER_DUP_ENTRY and "uq_tickets_active_seat" in str(e):
+            return False, "Seat already taken.", None
+        return False, f"Error creating ticket: {e}", None
     except Exception as e:
         return False, f"Error creating ticket: {e}", None
-    finally:
-        conn.close()
 
-def get_user_tickets(user_id: int):
+def _create_tickets_bulk_txn(cur, ticket_nos, user_id, bus_id, seats_or_count, travel_date, pay_from_wallet):
+    cur.execute("SELECT route, total_seats, price FROM buses WHERE id=%s LOCK IN SHARE MODE", (bus_id,))
+    b = cur.fetchone()
+    if not b:
+        return False, "Bus not found.", None
+    total_seats = b['total_seats']; price = b['price']
+    occupancy = _lock_occupancy(cur, bus_id, travel_date, total_seats)
+    if isinstance(seats_or_count, int):
+        if seats_or_count < 1:
+            return False, "Seat count must be positive.", None
+        seats = seat_bitmap.free_seats(occupancy, total_seats, seats_or_count)
+        if seats is None:
+            return False, f"Only {total_seats - seat_bitmap.booked_count(occupancy)} seats available.", None
+    else:
+        seats = sorted(set(seats_or_count))
+        if not seats:
+            return False, "No seats requested.", None
+        if seats[0] < 1 or seats[-1] > total_seats:
+            return False, "Invalid seat number.", None
+        taken = [s for s in seats if seat_bitmap.is_booked(occupancy, s)]
+        if taken:
+            return False, f"Seats already taken: {', '.join(map(str, taken))}.", None
+
+    rows = [(tno, user_id, bus_id, s, price, travel_date) for tno, s in zip(ticket_nos, seats)]
+    # pymysql folds executemany() of a plain INSERT ... VALUES into one multi-row statement
+    cur.executemany("INSERT INTO tickets (ticket_no, user_id, bus_id, seat_no, price_paid, travel_date) VALUES (%s,%s,%s,%s,%s,%s)", rows)
+    _write_occupancy(cur, bus_id, travel_date, seat_bitmap.book_many(occupancy, seats, total_seats))
+
+    total_price = price * len(seats)
+    if pay_from_wallet:
+        # one balance check for the group, one ledger entry per ticket
+        # locking read (our own rows, unique-key lookups): wallet.debit must make the first plain read
+        cur.execute("SELECT id FROM tickets WHERE ticket_no IN (" + ",".join(["%s"] * len(rows)) + ") FOR UPDATE",
+                    [r[0] for r in rows])
+        ok, balance = wallet.debit(cur, user_id, [(r['id'], price) for r in cur.fetchall()])
+        if not ok:
+            return False, f"Insufficient wallet balance (₹{balance}) for ₹{total_price}. Please add funds or set pay_from_wallet=False.", None
+    stats.bump(cur, active_tickets=len(seats), revenue=total_price)
+    stats.bump_route(cur, b['route'], len(seats))
+
+    tickets = [{"ticket_no": tno, "user_id": user_id, "bus_id": bus_id, "seat_no": s, "price": price, "travel_date": travel_date}
+               for tno, _, _, s, _, _ in rows]
+    return True, f"{len(tickets)} tickets booked successfully.", tickets
+
+@metrics.timed("create_tickets_bulk")
+def create_tickets_bulk(user_id: int, bus_id: int, seats_or_count, travel_date: str = None, pay_from_wallet: bool = True):
+    """
+    Group booking in one transaction: all seats are booked or none are.
+    seats_or_count -> list of seat numbers, or a count to auto-assign (adjacent seats when possible)
+    The wallet is charged once for the whole group.
+    Returns (ok, msg, [ticket_info, ...])
+    """
+    # bool is an int subclass: True would otherwise book one seat
+    if isinstance(seats_or_count, bool) or (not isinstance(seats_or_count, int)
+                                            and any(isinstance(s, bool) for s in seats_or_count)):
+        return False, "Seats must be seat numbers or a seat count.", None
+    try:
+        wanted = seats_or_count if isinstance(seats_or_count, int) else len(set(seats_or_count))
+        # more than a bus can hold fails inside the transaction without using them
+        ticket_nos = ticket_ids.next_ticket_nos(min(wanted, seat_bitmap.MAX_SEATS))
+        result = run_transaction(lambda cur: _create_tickets_bulk_txn(cur, ticket_nos, user_id, bus_id, seats_or_count, travel_date, pay_from_wallet))
+        if result[0] and pay_from_wallet:
+            sessions.invalidate_user(user_id)
+        return result
+    except pymysql.err.IntegrityError as e:
+        if e.args[0] == ER_DUP_ENTRY and "uq_tickets_active_seat" in str(e):
+            return False, "Seat already taken.", None
+        return False, f"Error creating tickets: {e}", None
+    except Exception as e:
+        return False, f"Error creating tickets: {e}", None
+
+@metrics.timed("get_user_tickets")
+def get_user_tickets(user_id: int, include_archived: bool = False):
+    """A user's tickets, newest booking first; past trips moved by archive.py only with include_archived."""
+    # primary, not a replica: users look here right after booking or cancelling
     conn = get_conn()
     try:
         with conn.cursor() as cur:
@@ -209,141 +429,228 @@ def get_user_tickets(user_id: int):
                 WHERE t.user_id=%s
                 ORDER BY t.booked_at DESC
             """, (user_id,))
-            return cur.fetchall()
+            rows = list(cur.fetchall())   # MySQL returns () when there are none
+            if include_archived:
+                # same snapshot: a ticket archived meanwhile shows up exactly once
+                rows += archive.user_tickets(cur, user_id)
+                rows.sort(key=lambda r: r['booked_at'], reverse=True)
+            return rows
     finally:
         conn.close()
 
-def cancel_user_ticket(user_id: int, ticket_id: int):
+@metrics.timed("find_ticket")
+def find_ticket(ticket_no: str):
+    """
+    A ticket by its number, live or archived (then with archived_at set);
+    None if there is no such ticket. Accepts numbers as people type them.
+    """
+    key = ticket_ids.normalize(ticket_no) or ticket_no.strip()
     conn = get_conn()
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT bus_id, price_paid, status FROM tickets WHERE id=%s AND user_id=%s", (ticket_id, user_id))
-            r = cur.fetchone()
-            if not r:
-                return False, "Ticket not found.", None
-            if r['status'] == 'CANCELLED':
-                return False, "Ticket already cancelled.", None
-            bus_id = r['bus_id']; price_paid = r['price_paid']
-            # perform cancellation: mark ticket cancelled
-            cur.execute("UPDATE tickets SET status='CANCELLED' WHERE id=%s", (ticket_id,))
-            # refund policy: full refund to wallet (for simplicity)
-            cur.execute("UPDATE users SET wallet = wallet + %s WHERE id=%s", (price_paid, user_id))
-            # update seats_available
-            cur.execute("UPDATE buses SET seats_available = seats_available + 1 WHERE id=%s", (bus_id,))
-            # log history
-            cur.execute("INSERT INTO ticket_history (ticket_id, action, note) VALUES (%s,%s,%s)", (ticket_id, "CANCELLED", "User cancelled — refunded to wallet"))
-        conn.commit()
-        return True, "Ticket cancelled and refunded to wallet."
-    except Exception as e:
-        return False, f"Error cancelling: {e}"
+            cur.execute("""
+                SELECT t.id, t.ticket_no, t.user_id, t.bus_id, b.route, t.seat_no, t.price_paid, t.status,
+                       t.booked_at, t.travel_date, NULL AS archived_at
+                FROM tickets t JOIN buses b ON t.bus_id=b.id
+                WHERE t.ticket_no=%s
+            """, (key,))
+            # not found live: it may have been archived (the same snapshot, so it isn't missed in transit)
+            return cur.fetchone() or archive.find_ticket(cur, key)
     finally:
         conn.close()
 
+def _cancel_ticket_txn(cur, user_id, ticket_id):
+    cur.execute("""
+        SELECT t.bus_id, t.seat_no, t.travel_date, b.route
+        FROM tickets t JOIN buses b ON b.id = t.bus_id
+        WHERE t.id=%s AND t.user_id=%s
+    """, (ticket_id, user_id))
+    r = cur.fetchone()
+    if not r:
+        return False, "Ticket not found."
+    bus_id = r['bus_id']; seat_no = r['seat_no']
+    travel_date = str(r['travel_date']) if r['travel_date'] else None
+    occupancy = _lock_occupancy(cur, bus_id, travel_date, seat_no)   # row exists since booking
+    cur.execute("SELECT price_paid, status FROM tickets WHERE id=%s FOR UPDATE", (ticket_id,))
+    t = cur.fetchone()
+    if t['status'] == 'CANCELLED':
+        return False, "Ticket already cancelled."
+    price_paid = t['price_paid']
+    # perform cancellation: mark ticket cancelled and free the seat
+    cur.execute("UPDATE tickets SET status='CANCELLED' WHERE id=%s", (ticket_id,))
+    _write_occupancy(cur, bus_id, travel_date, seat_bitmap.release(occupancy, seat_no, len(occupancy) * 8))
+    # refund policy: full refund to wallet (for simplicity)
+    wallet.credit(cur, user_id, price_paid, wallet.REFUND, "ticket", ticket_id)
+    # log history
+    cur.execute("INSERT INTO ticket_history (ticket_id, action, note) VALUES (%s,%s,%s)", (ticket_id, "CANCELLED", "User cancelled — refunded to wallet"))
+    stats.bump(cur, active_tickets=-1, revenue=-price_paid)
+    stats.bump_route(cur, r['route'], -1)
+    return True, "Ticket cancelled and refunded to wallet."
+
+@metrics.timed("cancel_user_ticket")
+def cancel_user_ticket(user_id: int, ticket_id: int):
+    try:
+        result = run_transaction(lambda cur: _cancel_ticket_txn(cur, user_id, ticket_id))
+        if result[0]:
+            sessions.invalidate_user(user_id)   # refunded to wallet
+        return result
+    except Exception as e:
+        return False, f"Error cancelling: {e}"
+
 
 # ------------- ADMIN VIEWS & STATS --------------
-def view_all_tickets():
-    conn = get_conn()
+# Listings are keyset-paginated on (booked_at, id) / users.id, newest first for
+# tickets, so each page is an index range scan no matter how deep it is.
+# A cursor is the (booked_at, id) of the last row of the previous page.
+_TICKET_LIST_SQL = """
+    SELECT t.id, t.ticket_no, u.username, b.route, t.bus_id, t.seat_no, t.price_paid, t.status, t.booked_at, t.travel_date
+    FROM tickets t
+    JOIN users u ON t.user_id = u.id
+    JOIN buses b ON t.bus_id = b.id
+"""
+
+def _ticket_filters(status=None, bus_id=None, date_from=None, date_to=None, after=None):
+    where, params = [], []
+    if status:
+        where.append("t.status = %s"); params.append(status)
+    if bus_id is not None:
+        where.append("t.bus_id = %s"); params.append(bus_id)
+    if date_from:
+        where.append("t.booked_at >= %s"); params.append(date_from)
+    if date_to:
+        where.append("t.booked_at < %s"); params.append(date_to)
+    if after:
+        booked_at, last_id = after
+        where.append("(t.booked_at < %s OR (t.booked_at = %s AND t.id < %s))"); params += [booked_at, booked_at, last_id]
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+@metrics.timed("view_tickets_page")
+def view_tickets_page(after=None, limit: int = 50, status: str = None, bus_id: int = None, date_from: str = None, date_to: str = None):
+    """
+    One page of tickets, newest first. date_from/date_to filter booked_at (to is exclusive).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    where, params = _ticket_filters(status, bus_id, date_from, date_to, after)
+    conn = get_read_conn()
     try:
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT t.id, t.ticket_no, u.username, b.route, t.seat_no, t.price_paid, t.status, t.booked_at
-                FROM tickets t
-                JOIN users u ON t.user_id = u.id
-                JOIN buses b ON t.bus_id = b.id
-                ORDER BY t.booked_at DESC
-            """)
-            return cur.fetchall()
+            cur.execute(_TICKET_LIST_SQL + where + " ORDER BY t.booked_at DESC, t.id DESC LIMIT %s", params + [limit + 1])
+            rows = cur.fetchall()
     finally:
         conn.close()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1]['booked_at'], rows[-1]['id'])
+    return rows, None
 
-def view_all_users():
-    conn = get_conn()
+def iter_all_tickets(status: str = None, bus_id: int = None, date_from: str = None, date_to: str = None, batch_size: int = 1000):
+    """
+    Streams every matching ticket, newest first, through a server-side cursor:
+    memory use is one batch regardless of table size. Holds one connection until exhausted.
+    """
+    where, params = _ticket_filters(status, bus_id, date_from, date_to)
+    conn = get_read_conn()
+    exhausted = False
+    cur = conn.cursor(metrics.InstrumentedSSCursor)
+    try:
+        cur.execute(_TICKET_LIST_SQL + where + " ORDER BY t.booked_at DESC, t.id DESC", params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                exhausted = True
+                break
+            yield from rows
+    finally:
+        if exhausted:
+            cur.close()
+            conn.close()
+        else:
+            # abandoned (or failed) mid-stream: close the socket without touching the cursor,
+            # whose close() would read the rest of the result set from the server first
+            conn.discard()
+
+def view_all_tickets():
+    """Every ticket, streamed (see iter_all_tickets); memory use stays at one batch."""
+    return iter_all_tickets()
+
+def _attach_wallets(cur, users):
+    if not users:
+        return users
+    ids = [u['id'] for u in users]
+    marks = ",".join(["%s"] * len(ids))
+    cur.execute(f"SELECT user_id, balance FROM wallet_balances WHERE user_id IN ({marks})", ids)
+    balances = {r['user_id']: int(r['balance']) for r in cur.fetchall()}
+    cur.execute(f"""
+        SELECT user_id, SUM(amount) AS pending FROM wallet_ledger
+        WHERE user_id IN ({marks}) AND compacted=0 GROUP BY user_id
+    """, ids)
+    for r in cur.fetchall():
+        balances[r['user_id']] = balances.get(r['user_id'], 0) + int(r['pending'])
+    for u in users:
+        u['wallet'] = balances.get(u['id'], 0)
+    return users
+
+@metrics.timed("view_users_page")
+def view_users_page(after_id: int = None, limit: int = 50):
+    """One page of users ordered by id. Returns (rows, next_cursor)."""
+    conn = get_read_conn()
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT id, username, is_admin, wallet, created_at FROM users")
-            return cur.fetchall()
+            cur.execute("SELECT id, username, is_admin, created_at FROM users WHERE id > %s ORDER BY id LIMIT %s",
+                        (after_id or 0, limit + 1))
+            rows = cur.fetchall()
+            more = len(rows) > limit
+            rows = _attach_wallets(cur, rows[:limit])
     finally:
         conn.close()
+    return rows, (rows[-1]['id'] if more else None)
 
-def admin_stats():
+def iter_all_users(batch_size: int = 1000):
+    after = None
+    while True:
+        rows, after = view_users_page(after, batch_size)
+        yield from rows
+        if after is None:
+            return
+
+def view_all_users():
+    """Every user, a page at a time (see iter_all_users); memory use stays at one page."""
+    return iter_all_users()
+
+@metrics.timed("manifest_tickets")
+def manifest_tickets(bus_id: int, travel_date: str = None):
+    """Active tickets of one service in seat order, as ticket_info dicts (uq_tickets_active_seat range)."""
     conn = get_conn()
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) AS total_users FROM users")
-            total_users = cur.fetchone().get('total_users', 0)
-            cur.execute("SELECT COUNT(*) AS total_buses FROM buses")
-            total_buses = cur.fetchone().get('total_buses', 0)
-            cur.execute("SELECT COUNT(*) AS total_tickets FROM tickets WHERE status='ACTIVE'")
-            total_tickets = cur.fetchone().get('total_tickets', 0)
-            cur.execute("SELECT IFNULL(SUM(price_paid),0) AS revenue FROM tickets WHERE status='ACTIVE'")
-            revenue = cur.fetchone().get('revenue', 0)
             cur.execute("""
-                SELECT b.route, COUNT(*) AS cnt
-                FROM tickets t JOIN buses b ON t.bus_id=b.id
-                WHERE t.status='ACTIVE'
-                GROUP BY b.route ORDER BY cnt DESC LIMIT 1
-            """)
-            top = cur.fetchone()
-            top_route = top['route'] if top else None
-        return {"total_users": total_users, "total_buses": total_buses, "total_tickets": total_tickets, "revenue": revenue, "top_route": top_route}
+                SELECT ticket_no, user_id, bus_id, seat_no, price_paid AS price, travel_date FROM tickets
+                WHERE bus_id=%s AND active_travel_date=%s ORDER BY seat_no
+            """, (bus_id, travel_date or seat_bitmap.UNDATED))
+            return cur.fetchall()
     finally:
         conn.close()
 
+@metrics.timed("admin_stats")
+def admin_stats():
+    # maintained incrementally by the write paths (see stats.py); run `python stats.py` to reconcile
+    s = stats.read()
+    return {"total_users": s['users'], "total_buses": s['buses'], "total_tickets": s['active_tickets'],
+            "revenue": s['revenue'], "top_route": s['top_route'], "cache": cache_stats()}
+
+def cache_stats() -> dict:
+    """Hit/miss counters of this process's caches (bus catalogue, sessions, users)."""
+    return {**{"catalogue_" + k: v for k, v in catalogue.stats().items()}, **sessions.cache_stats()}
+
 
 # ------------- EXPORT TICKET (TEXT & PDF) --------------
+# Rendering lives in ticket_docs.py; batches should use ticket_docs.render()
+# so documents are produced off the request path.
 def save_ticket_text(ticket_info: dict, folder: str = None):
-    if folder is None:
-        folder = os.path.join(os.getcwd(), "saved_tickets")
-    os.makedirs(folder, exist_ok=True)
-    tno = ticket_info.get("ticket_no")
-    filename = f"ticket_{tno}.txt"
-    path = os.path.join(folder, filename)
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    lines = [
-        "------ BUS TICKET ------",
-        f"Ticket No: {tno}",
-        f"User ID: {ticket_info.get('user_id')}",
-        f"Bus ID: {ticket_info.get('bus_id')}",
-        f"Seat No: {ticket_info.get('seat_no')}",
-        f"Price: ₹{ticket_info.get('price')}",
-        f"Travel Date: {ticket_info.get('travel_date')}",
-        f"Issued At: {now}",
-        "------------------------"
-    ]
-    with open(path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-    return path
+    return ticket_docs.render_now([ticket_info], folder, fmt="text")["files"][0]
 
 def save_ticket_pdf(ticket_info: dict, folder: str = None):
     try:
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import A5
-    except Exception as e:
-        return False, f"reportlab not installed: {e}"
-    if folder is None:
-        folder = os.path.join(os.getcwd(), "saved_tickets")
-    os.makedirs(folder, exist_ok=True)
-    tno = ticket_info.get("ticket_no")
-    filename = f"ticket_{tno}.pdf"
-    path = os.path.join(folder, filename)
-    c = canvas.Canvas(path, pagesize=A5)
-    width, height = A5
-    c.setFont("Helvetica-Bold", 14)
-    c.drawCentredString(width/2, height - 40, "BUS TICKET")
-    c.setFont("Helvetica", 10)
-    y = height - 70
-    lines = [
-        f"Ticket No: {ticket_info.get('ticket_no')}",
-        f"User ID: {ticket_info.get('user_id')}",
-        f"Bus ID: {ticket_info.get('bus_id')}",
-        f"Seat No: {ticket_info.get('seat_no')}",
-        f"Price: ₹{ticket_info.get('price')}",
-        f"Travel Date: {ticket_info.get('travel_date')}",
-        f"Issued At: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    ]
-    for line in lines:
-        c.drawString(40, y, line)
-        y -= 16
-    c.line(30, y-6, width-30, y-6)
-    c.save()
-    return True, path
\ No newline at end of file
+        return True, ticket_docs.render_now([ticket_info], folder)["files"][0]
+    except RuntimeError as e:
+        return False, str(e)
@@ -0,0 +1,185 @@
+# fleet.py
+"""
+Bulk fleet import: create or update many buses from a CSV or JSON file.
+
+    python fleet.py timetable.csv [--dry-run] [--chunk 500]
+
+Each row is the full record of one bus, keyed by bus_code:
+
+    bus_code, route, total_seats, price, departure_time, arrival_time, description
+
+(JSON: a list of objects or one object per line with the same keys.) A code
+that exists is updated, a new one is inserted. Rows are validated first; valid
+rows are written in chunks of FLEET_CHUNK, one transaction and one multi-row
+INSERT ... ON DUPLICATE KEY UPDATE per chunk. Like update_bus, an update may
+not shrink total_seats below a seat booked on an upcoming service. Rows that
+fail are reported with their row number and reason; the others still go in.
+"""
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+
+from db_config import run_transaction
+import catalogue
+import features
+import routes
+import seat_bitmap
+import stats
+
+FLEET_CHUNK = 500
+
+_UPSERT = """
+    INSERT INTO buses (bus_code, route, origin, destination, total_seats, price, departure_time, arrival_time, route_description)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+    ON DUPLICATE KEY UPDATE route=VALUES(route), origin=VALUES(origin), destination=VALUES(destination),
+        total_seats=VALUES(total_seats), price=VALUES(price), departure_time=VALUES(departure_time),
+        arrival_time=VALUES(arrival_time), route_description=VALUES(route_description)
+"""
+
+
+# ------------- reading & validation -------------
+def load_rows(path: str):
+    """Rows of a .csv, .json (list of objects) or .jsonl file, as dicts."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if ext == ".csv":
+            return list(csv.DictReader(f))
+        if ext == ".jsonl":
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+        return data if isinstance(data, list) else data.get("buses", [])
+
+def _time(value, name: str):
+    if value in (None, ""):
+        return None
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.strptime(str(value).strip(), fmt).strftime("%H:%M:%S")
+        except ValueError:
+            pass
+    raise ValueError(f"{name} must be HH:MM or HH:MM:SS")
+
+def _positive_int(value, name: str, minimum: int):
+    try:
+        n = int(str(value).strip())
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a whole number")
+    if n < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return n
+
+def validate_row(raw: dict) -> tuple:
+    """Returns the row as a tuple in _UPSERT order; raises ValueError naming the problem."""
+    if not isinstance(raw, dict):
+        raise ValueError("row must be an object")
+    code = str(raw.get("bus_code") or "").strip()
+    if not code or len(code) > 32:
+        raise ValueError("bus_code is required (at most 32 characters)")
+    route = str(raw.get("route") or "").strip()
+    origin, destination = routes.parse_route(route)
+    if not origin or not destination:
+        raise ValueError("route must look like 'Origin → Destination'")
+    if origin.lower() == destination.lower():
+        raise ValueError("origin and destination must differ")
+    total_seats = seat_bitmap.check_total_seats(_positive_int(raw.get("total_seats"), "total_seats", 1))
+    price = _positive_int(raw.get("price"), "price", 0)
+    departure = _time(raw.get("departure_time"), "departure_time")
+    arrival = _time(raw.get("arrival_time"), "arrival_time")
+    if departure and arrival and departure == arrival:
+        raise ValueError("arrival_time must differ from departure_time")
+    description = (raw.get("description") or "").strip() or None
+    return (code, route, origin, destination, total_seats, price, departure, arrival, description)
+
+
+# ------------- writing -------------
+def _code_key(bus_code: str) -> str:
+    # bus_code compares case-insensitively (MySQL collation, COLLATE NOCASE on SQLite)
+    return bus_code.upper()
+
+def _upsert_chunk(cur, rows):
+    """rows: [(row_no, tuple)]. Returns (True, (inserted, updated, [(row_no, error)]))."""
+    marks = ",".join(["%s"] * len(rows))
+    # lock existing buses first (same order as every other writer: buses -> seat_inventory -> ...)
+    cur.execute(f"SELECT id, bus_code, route FROM buses WHERE bus_code IN ({marks}) ORDER BY id FOR UPDATE",
+                [r[0] for _, r in rows])
+    existing = {_code_key(r['bus_code']): r for r in cur.fetchall()}
+    highest = features.highest_booked_seats(cur, [e['id'] for e in existing.values()])
+    errors, valid = [], []
+    for row_no, r in rows:
+        old = existing.get(_code_key(r[0]))
+        if old and highest.get(old['id'], 0) > r[4]:
+            errors.append((row_no, f"total_seats {r[4]} is below booked seat {highest[old['id']]}"))
+        else:
+            valid.append(r)
+    if valid:
+        cur.executemany(_UPSERT, valid)
+    updated = [(existing[_code_key(r[0])], r) for r in valid if _code_key(r[0]) in existing]
+    stats.bump(cur, buses=len(valid) - len(updated))
+    features.move_route_stats(cur, [(old['id'], old['route'], r[1]) for old, r in updated])
+    return True, (len(valid) - len(updated), len(updated), errors)
+
+def import_fleet(raw_rows, chunk_size: int = FLEET_CHUNK, dry_run: bool = False) -> dict:
+    """
+    Validates and upserts `raw_rows` (dicts). Returns
+    {"rows", "inserted", "updated", "errors": [{"row", "bus_code", "error"}]}; rows are numbered from 1.
+    """
+    report = {"rows": 0, "inserted": 0, "updated": 0, "errors": []}
+    seen = set()
+    good = []
+    for row_no, raw in enumerate(raw_rows, 1):
+        report["rows"] += 1
+        try:
+            row = validate_row(raw)
+            if _code_key(row[0]) in seen:
+                raise ValueError("duplicate bus_code in this file")
+            seen.add(_code_key(row[0]))
+            good.append((row_no, row))
+        except ValueError as e:
+            code = raw.get("bus_code") if isinstance(raw, dict) else None
+            report["errors"].append({"row": row_no, "bus_code": code, "error": str(e)})
+    if dry_run:
+        report["valid"] = len(good)
+        return report
+
+    codes = {row_no: row[0] for row_no, row in good}
+    try:
+        for i in range(0, len(good), chunk_size):
+            chunk = good[i:i + chunk_size]
+            try:
+                results = [run_transaction(lambda cur: _upsert_chunk(cur, chunk))[1]]
+            except Exception:
+                # a row the database rejects fails its whole chunk: redo it row by row to find it
+                results = []
+                for row_no, row in chunk:
+                    try:
+                        results.append(run_transaction(lambda cur: _upsert_chunk(cur, [(row_no, row)]))[1])
+                    except Exception as e:
+                        results.append((0, 0, [(row_no, str(e))]))
+            for inserted, updated, errors in results:
+                report["inserted"] += inserted
+                report["updated"] += updated
+                report["errors"] += [{"row": n, "bus_code": codes[n], "error": err} for n, err in errors]
+    finally:
+        catalogue.invalidate_all()
+    report["errors"].sort(key=lambda e: e["row"])
+    return report
+
+def import_file(path: str, chunk_size: int = FLEET_CHUNK, dry_run: bool = False) -> dict:
+    return import_fleet(load_rows(path), chunk_size, dry_run)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Bulk create/update buses from CSV or JSON")
+    parser.add_argument("file")
+    parser.add_argument("--dry-run", action="store_true", help="validate only")
+    parser.add_argument("--chunk", type=int, default=FLEET_CHUNK, help="rows per transaction")
+    args = parser.parse_args(sys.argv[1:])
+    report = import_file(args.file, args.chunk, args.dry_run)
+    for e in report["errors"]:
+        print(f"row {e['row']} ({e['bus_code']}): {e['error']}")
+    summary = f"valid: {report['valid']}" if args.dry_run else f"inserted: {report['inserted']}, updated: {report['updated']}"
+    print(f"{report['rows']} rows, {summary}, errors: {len(report['errors'])}")
+    sys.exit(1 if report["errors"] else 0)
@@ -0,0 +1,57 @@
+# hashing.py
+"""
+Password hashing off the request path.
+
+PBKDF2 at 150k iterations costs tens of milliseconds of CPU per call. The
+functions here run it in a shared process pool and return futures, so callers
+can release their DB connection first, overlap independent hashes and keep the
+main process responsive during login storms. If a process pool cannot be
+started (restricted sandboxes), a thread pool is used instead; hashlib releases
+the GIL while hashing, so threads still run in parallel.
+"""
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from db_config import hash_password, verify_password, PBKDF2_ALGO, PBKDF2_ITERATIONS
+
+HASH_WORKERS = os.cpu_count() or 2
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _lock:
+            if _executor is None or _executor_pid != pid:
+                try:
+                    _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+                except (OSError, NotImplementedError):
+                    _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hash")
+                _executor_pid = pid
+    return _executor
+
+
+def shutdown():
+    if _executor is not None and _executor_pid == os.getpid():
+        _executor.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown)
+
+
+def hash_password_async(password: str, iterations: int = PBKDF2_ITERATIONS):
+    """Future resolving to (hash_hex, salt_hex) with a fresh random salt."""
+    return _get_executor().submit(hash_password, password, None, iterations)
+
+def verify_password_async(stored_hash_hex: str, stored_salt_hex: str, provided_password: str, iterations: int = PBKDF2_ITERATIONS):
+    """Future resolving to True/False."""
+    return _get_executor().submit(verify_password, stored_hash_hex, stored_salt_hex, provided_password, iterations)
+
+def needs_rehash(algo: str, iterations: int) -> bool:
+    return algo != PBKDF2_ALGO or iterations != PBKDF2_ITERATIONS
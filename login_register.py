@@ -1,8 +1,14 @@
 # login_register.py
-from db_config import get_conn, hash_password, verify_password
+from db_config import get_conn, PBKDF2_ALGO, PBKDF2_ITERATIONS
+import wallet
+import stats
+from hashing import hash_password_async, verify_password_async, needs_rehash
+import sessions
+import metrics
 from typing import Tuple
 
 
+@metrics.timed("register_user")
 def register_user(username: str, password: str) -> Tuple[bool, str]:
     """
     Creates a new user.
@@ -11,14 +17,16 @@ def register_user(username: str, password: str) -> Tuple[bool, str]:
     if not username or not password:
         return False, "Username and password required."
 
+    # hash before taking a connection so the pool isn't held during PBKDF2
+    pwd_hash, salt = hash_password_async(password).result()
     conn = get_conn()
     try:
-        pwd_hash, salt = hash_password(password)
         with conn.cursor() as cur:
             cur.execute(
-                "INSERT INTO users (username, password_hash, salt, wallet) VALUES (%s, %s, %s, %s)",
-                (username, pwd_hash, salt, 0)
+                "INSERT INTO users (username, password_hash, salt, hash_algo, hash_iterations) VALUES (%s, %s, %s, %s, %s)",
+                (username, pwd_hash, salt, PBKDF2_ALGO, PBKDF2_ITERATIONS)
             )
+            stats.bump(cur, users=1)
         conn.commit()
         return True, "Registration successful!"
     except Exception as e:
@@ -31,6 +39,7 @@ def register_user(username: str, password: str) -> Tuple[bool, str]:
 
 
 
+@metrics.timed("login_user")
 def login_user(username: str, password: str):
     """
     Attempts login.
@@ -39,76 +48,135 @@ def login_user(username: str, password: str):
     if not username or not password:
         return False, None, None, "Username and password required."
 
-    conn = get_conn()
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id, password_hash, salt, is_admin FROM users WHERE username=%s LIMIT 1",
-                (username,)
-            )
-            row = cur.fetchone()
-            if not row:
-                return False, None, None, "User not found."
-
-            user_id = row['id']
-            stored_hash = row['password_hash']
-            stored_salt = row['salt']
-            is_admin = bool(row.get('is_admin', 0))
-
-            if verify_password(stored_hash, stored_salt, password):
-                role = "admin" if is_admin else "user"
-                return True, user_id, role, "Login successful!"
-            else:
-                return False, None, None, "Incorrect password."
+        conn = get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT id, password_hash, salt, hash_algo, hash_iterations, is_admin FROM users WHERE username=%s LIMIT 1",
+                    (username,)
+                )
+                row = cur.fetchone()
+        finally:
+            conn.close()   # don't hold a pooled connection while hashing
+        if not row:
+            return False, None, None, "User not found."
+
+        user_id = row['id']
+        is_admin = bool(row.get('is_admin', 0))
+
+        if not verify_password_async(row['password_hash'], row['salt'], password, row['hash_iterations']).result():
+            return False, None, None, "Incorrect password."
+        if needs_rehash(row['hash_algo'], row['hash_iterations']):
+            _upgrade_hash(user_id, row['password_hash'], password)
+        role = "admin" if is_admin else "user"
+        return True, user_id, role, "Login successful!"
     except Exception as e:
         return False, None, None, f"Login error: {e}"
-    finally:
-        conn.close()
 
 
+def _upgrade_hash(user_id: int, old_hash: str, password: str):
+    """Re-hashes with the current parameters in the background; login doesn't wait for it."""
+    def store(fut):
+        try:
+            new_hash, new_salt = fut.result()
+            conn = get_conn()
+            try:
+                with conn.cursor() as cur:
+                    # skip if the password changed in the meantime
+                    cur.execute("""
+                        UPDATE users SET password_hash=%s, salt=%s, hash_algo=%s, hash_iterations=%s
+                        WHERE id=%s AND password_hash=%s
+                    """, (new_hash, new_salt, PBKDF2_ALGO, PBKDF2_ITERATIONS, user_id, old_hash))
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            pass   # best effort; the old hash keeps working and is retried on next login
+    hash_password_async(password).add_done_callback(store)
+
+
+def login(username: str, password: str):
+    """
+    Like login_user, but opens a session.
+    Returns: (ok: bool, token: str|None, role: "admin"|"user"|None, message: str)
+    """
+    ok, user_id, role, msg = login_user(username, password)
+    if not ok:
+        return False, None, None, msg
+    return True, sessions.create_session(user_id, role), role, msg
+
+@metrics.timed("authenticate")
+def authenticate(token: str):
+    """Returns {"user_id", "role"} for a live session token, else None. No DB access."""
+    return sessions.get_session(token)
 
+@metrics.timed("logout")
+def logout(token: str):
+    sessions.end_session(token)
 
+
+
+
+@metrics.timed("add_funds")
 def add_funds(user_id: int, amount: int) -> Tuple[bool, str]:
     if amount <= 0:
         return False, "Amount must be positive."
     conn = get_conn()
     try:
         with conn.cursor() as cur:
-            cur.execute("UPDATE users SET wallet = wallet + %s WHERE id=%s", (amount, user_id))
+            # append-only: no lock on the users row or the balance snapshot
+            wallet.credit(cur, user_id, amount, wallet.TOPUP, "topup")
         conn.commit()
+        sessions.invalidate_user(user_id)
         return True, f"Added ₹{amount} to wallet."
     except Exception as e:
         return False, f"Add funds failed: {e}"
     finally:
         conn.close()
 
+@metrics.timed("get_wallet")
 def get_wallet(user_id: int) -> int:
-    conn = get_conn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT wallet FROM users WHERE id=%s", (user_id,))
-            r = cur.fetchone()
-            return r['wallet'] if r and r.get('wallet') is not None else 0
-    finally:
-        conn.close()
+    # served from the user cache; every wallet change in this process invalidates it
+    u = sessions.get_user(user_id)
+    return u['wallet'] if u and u.get('wallet') is not None else 0
 
-def change_password(user_id: int, old_password: str, new_password: str):
+@metrics.timed("change_password")
+def change_password(user_id: int, old_password: str, new_password: str, keep_session: str = None):
+    """Changes the password and revokes the user's other sessions (all but keep_session)."""
     if not old_password or not new_password:
         return False, "Old and new passwords required."
-    conn = get_conn()
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT password_hash, salt FROM users WHERE id=%s", (user_id,))
-            r = cur.fetchone()
-            if not r:
-                return False, "User not found."
-            if not verify_password(r['password_hash'], r['salt'], old_password):
-                return False, "Old password incorrect."
-            new_hash, new_salt = hash_password(new_password)
-            cur.execute("UPDATE users SET password_hash=%s, salt=%s WHERE id=%s", (new_hash, new_salt, user_id))
-        conn.commit()
+        conn = get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT password_hash, salt, hash_iterations FROM users WHERE id=%s", (user_id,))
+                r = cur.fetchone()
+        finally:
+            conn.close()
+        if not r:
+            return False, "User not found."
+        # verify the old password and hash the new one in parallel
+        old_ok = verify_password_async(r['password_hash'], r['salt'], old_password, r['hash_iterations'])
+        new = hash_password_async(new_password)
+        if not old_ok.result():
+            new.cancel()
+            return False, "Old password incorrect."
+        new_hash, new_salt = new.result()
+        conn = get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE users SET password_hash=%s, salt=%s, hash_algo=%s, hash_iterations=%s
+                    WHERE id=%s AND password_hash=%s
+                """, (new_hash, new_salt, PBKDF2_ALGO, PBKDF2_ITERATIONS, user_id, r['password_hash']))
+                if cur.rowcount == 0:
+                    return False, "Password was changed concurrently; please retry."
+            conn.commit()
+        finally:
+            conn.close()
+        sessions.invalidate_user(user_id)
+        sessions.end_user_sessions(user_id, keep=keep_session)
         return True, "Password changed."
     except Exception as e:
         return False, f"Password change failed: {e}"
-    finally:
-        conn.close()
\ No newline at end of file
@@ -1,12 +1,24 @@
 # main.py
+# Console front-end: every operation goes through the api service layer, the
+# same one server.py exposes over HTTP.
 from db_config import init_db
-import login_register as auth
+import api
 import features
+import fleet
+import metrics
+import ticket_docs
 import os, sys
 
+PAGE_SIZE = 20
 
 
-init_db()
+def call(fn, *args, **kwargs):
+    """Runs an api operation; prints and returns None when it is refused."""
+    try:
+        return api.call(fn, *args, **kwargs)
+    except api.ApiError as e:
+        print(e.message)
+        return None
 
 def clear():
     os.system('cls' if os.name=='nt' else 'clear')
@@ -32,25 +44,44 @@ def do_register():
     print("\n--- Register ---")
     username = input("Enter username: ").strip()
     password = input("Enter password: ").strip()
-    ok, msg = auth.register_user(username, password)
-    print(msg)
+    r = call(api.register, username, password)
+    if r:
+        print(r['message'])
 
 def do_login():
     print("\n--- Login ---")
     username = input("Enter username: ").strip()
     password = input("Enter password: ").strip()
-    ok, user_id, role, msg = auth.login_user(username, password)
-    print(msg)
-    if ok:
-        if role == "admin":
-            admin_dashboard(user_id)
-        else:
-            user_dashboard(user_id)
+    r = call(api.login, username, password)
+    if r:
+        print(r['message'])
+        token = r['token']
+        try:
+            if r['role'] == "admin":
+                admin_dashboard(token)
+            else:
+                user_dashboard(token)
+        finally:
+            api.logout(token)
 
 
 
 
-def user_dashboard(user_id: int):
+def pick_city(label: str):
+    """Prompts for a city; a partial name lists matching cities to choose from."""
+    term = input(f"{label} city (blank skip): ").strip()
+    if not term:
+        return None
+    r = call(api.suggest_cities, term)
+    matches = r['cities'] if r else []
+    if not matches or term.lower() in (m.lower() for m in matches):
+        return term
+    for i, city in enumerate(matches, 1):
+        print(f"  {i}. {city}")
+    pick = input("Choose number (blank keeps what you typed): ").strip()
+    return matches[int(pick) - 1] if pick.isdigit() and 0 < int(pick) <= len(matches) else term
+
+def user_dashboard(token: str):
     while True:
         print("\n===== USER DASHBOARD =====")
         print("1. View Buses")
@@ -64,16 +95,22 @@ def user_dashboard(user_id: int):
         print("9. Logout")
         choice = input("Enter choice: ").strip()
         if choice == "1":
-            show_buses()
+            tdate = input("Travel date (YYYY-MM-DD) leave blank for none: ").strip() or None
+            show_buses(tdate)
         elif choice == "2":
-            route_term = input("Route search term (blank skip): ").strip() or None
+            origin = pick_city("From")
+            destination = pick_city("To")
+            dep_after = input("Departing after HH:MM (blank skip): ").strip() or None
+            dep_before = input("Departing before HH:MM (blank skip): ").strip() or None
             min_seats = input("Min seats available (blank skip): ").strip()
             min_seats = int(min_seats) if min_seats else None
             pmin = input("Min price (blank skip): ").strip()
             pmin = int(pmin) if pmin else None
             pmax = input("Max price (blank skip): ").strip()
             pmax = int(pmax) if pmax else None
-            results = features.search_buses_advanced(route_term, min_seats, pmin, pmax)
+            tdate = input("Travel date (YYYY-MM-DD) leave blank for none: ").strip() or None
+            r = call(api.search, origin, destination, dep_after, dep_before, pmin, pmax, min_seats, tdate)
+            results = r['buses'] if r else []
             if not results:
                 print("No buses found.")
             else:
@@ -81,57 +118,69 @@ def user_dashboard(user_id: int):
                     print(f"ID:{b['id']} | {b['route']} | Seats:{b['total_seats']} | Avail:{b['seats_available']} | Price:₹{b['price']} | Dep:{b['departure_time']} Arr:{b['arrival_time']}")
         elif choice == "3":
             bid = int(input("Enter Bus ID: "))
-            ok, out = features.pretty_print_seat_map(bid)
-            print(out if ok else out)
+            tdate = input("Travel date (YYYY-MM-DD) leave blank for none: ").strip() or None
+            r = call(api.seat_map, bid, tdate)
+            if r:
+                print(features.format_seat_map(r['total_seats'], r['booked']))
         elif choice == "4":
-            show_buses()
-            bid = int(input("Enter Bus ID to book: "))
-            seat = int(input("Enter seat number (0 for auto-assign): "))
             tdate = input("Travel date (YYYY-MM-DD) leave blank for none: ").strip() or None
+            show_buses(tdate)
+            bid = int(input("Enter Bus ID to book: "))
+            count_raw = input("Number of seats (blank for 1): ").strip()
+            count = int(count_raw) if count_raw else 1
+            if count > 1:
+                seats_raw = input("Seat numbers, comma separated (blank to auto-assign together): ").strip()
+                seats = [int(x) for x in seats_raw.split(",")] if seats_raw else {"count": count}
+            else:
+                seats = int(input("Enter seat number (0 for auto-assign): "))
             # check wallet
-            wallet = auth.get_wallet(user_id)
-            print(f"Your wallet balance: ₹{wallet}")
+            w = call(api.get_wallet, token)
+            if w:
+                print(f"Your wallet balance: ₹{w['balance']}")
             pay_choice = input("Pay from wallet? (y/n): ").strip().lower()
             pay_from_wallet = (pay_choice == 'y')
-            ok, msg, info = features.create_ticket(user_id, bid, seat, travel_date=tdate, pay_from_wallet=pay_from_wallet)
-            print(msg)
-            if ok and info:
-                path_txt = features.save_ticket_text(info)
-                print(f"Saved ticket text: {path_txt}")
-                pdf_ok, pdf_res = features.save_ticket_pdf(info)
-                if pdf_ok:
-                    print(f"Saved ticket pdf: {pdf_res}")
-                else:
-                    print(f"PDF not created: {pdf_res}")
+            r = call(api.book, token, bid, seats, tdate, pay_from_wallet)
+            if r:
+                print(r['message'])
+                if r['tickets']:
+                    save_tickets(r['tickets'])
         elif choice == "5":
-            tickets = features.get_user_tickets(user_id)
+            past = input("Include archived past trips? (y/n): ").strip().lower() == 'y'
+            r = call(api.my_tickets, token, past)
+            tickets = r['tickets'] if r else []
             if not tickets:
                 print("No tickets found.")
             else:
                 for t in tickets:
                     print(f"ID:{t['id']} | TNo:{t['ticket_no']} | Route:{t['route']} | Seat:{t['seat_no']} | Price:₹{t['price']} | Status:{t['status']} | At:{t['booked_at']} | Travel:{t['travel_date']}")
         elif choice == "6":
-            tickets = features.get_user_tickets(user_id)
+            r = call(api.my_tickets, token)
+            tickets = r['tickets'] if r else []
             if not tickets:
                 print("No tickets to cancel.")
             else:
                 for t in tickets:
                     print(f"ID:{t['id']} | TNo:{t['ticket_no']} | Route:{t['route']} | Seat:{t['seat_no']} | Status:{t['status']}")
                 tid = int(input("Enter Ticket ID to cancel: "))
-                ok, msg = features.cancel_user_ticket(user_id, tid)
-                print(msg)
+                r = call(api.cancel, token, tid)
+                if r:
+                    print(r['message'])
         elif choice == "7":
-            print(f"Wallet balance: ₹{auth.get_wallet(user_id)}")
+            w = call(api.get_wallet, token)
+            if w:
+                print(f"Wallet balance: ₹{w['balance']}")
             sub = input("1:Add funds  2:Back  Enter: ").strip()
             if sub == "1":
                 amt = int(input("Enter amount to add: "))
-                ok, msg = auth.add_funds(user_id, amt)
-                print(msg)
+                r = call(api.add_funds, token, amt)
+                if r:
+                    print(r['message'])
         elif choice == "8":
             old = input("Old password: ")
             new = input("New password: ")
-            ok, msg = auth.change_password(user_id, old, new)
-            print(msg)
+            r = call(api.change_password, token, old, new)
+            if r:
+                print(r['message'])
         elif choice == "9":
             print("Logged out.")
             break
@@ -139,8 +188,24 @@ def user_dashboard(user_id: int):
             print("Invalid choice.")
 
 
-def show_buses():
-    buses = features.list_buses()
+def save_tickets(infos, bundle: str = None, name: str = None):
+    """Renders ticket files in the background; prints where they went once done."""
+    def report(kind):
+        def done(future):
+            try:
+                res = future.result()
+                for path in res.get("files") or [res["bundle"]]:
+                    print(f"\nSaved ticket {kind}: {path}")
+            except Exception as e:
+                print(f"\n{kind.upper()} not created: {e}")
+        return done
+    if bundle is None:
+        ticket_docs.render(infos, fmt="text").add_done_callback(report("text"))
+    ticket_docs.render(infos, bundle=bundle or ("pdf" if len(infos) > 1 else None), name=name).add_done_callback(report("pdf"))
+
+def show_buses(travel_date: str = None):
+    r = call(api.list_buses, travel_date)
+    buses = r['buses'] if r else []
     if not buses:
         print("No buses available.")
         return
@@ -150,7 +215,7 @@ def show_buses():
 
 
 
-def admin_dashboard(admin_user_id: int):
+def admin_dashboard(token: str):
     while True:
         print("\n===== ADMIN DASHBOARD =====")
         print("1. Add Bus")
@@ -160,17 +225,22 @@ def admin_dashboard(admin_user_id: int):
         print("5. View All Tickets")
         print("6. View All Users")
         print("7. View Stats")
-        print("8. Logout")
+        print("8. Import Fleet (CSV/JSON)")
+        print("9. Print Manifest (PDF)")
+        print("10. Performance Metrics")
+        print("11. Logout")
         choice = input("Enter choice: ").strip()
         if choice == "1":
             route = input("Route: ").strip()
+            code = input("Bus code (blank none): ").strip() or None
             desc = input("Description (short): ").strip()
             seats = int(input("Total seats: ").strip())
             price = int(input("Price per ticket: ").strip())
             dep = input("Departure time (HH:MM) leave blank: ").strip() or None
             arr = input("Arrival time (HH:MM) leave blank: ").strip() or None
-            ok, msg = features.add_bus(route, seats, price, departure_time=dep, arrival_time=arr, description=desc)
-            print(msg)
+            r = call(api.add_bus, token, route, seats, price, dep, arr, desc, code)
+            if r:
+                print(r['message'])
         elif choice == "2":
             show_buses()
             bid = int(input("Bus ID to update: "))
@@ -181,40 +251,119 @@ def admin_dashboard(admin_user_id: int):
             tot = int(tot_raw) if tot_raw else None
             dep = input("New departure time (blank no-change): ").strip() or None
             arr = input("New arrival time (blank no-change): ").strip() or None
-            ok, msg = features.update_bus(bid, route=new_route, price=new_price, total_seats=tot, departure_time=dep, arrival_time=arr)
-            print(msg)
+            r = call(api.update_bus, token, bid, new_route, new_price, tot, dep, arr)
+            if r:
+                print(r['message'])
         elif choice == "3":
             show_buses()
             bid = int(input("Bus ID to delete: "))
-            ok, msg = features.delete_bus(bid)
-            print(msg)
+            r = call(api.delete_bus, token, bid)
+            if r:
+                print(r['message'])
         elif choice == "4":
             show_buses()
         elif choice == "5":
-            tickets = features.view_all_tickets()
-            if not tickets:
-                print("No tickets.")
-            else:
+            status = input("Status ACTIVE/CANCELLED (blank all): ").strip().upper() or None
+            bus_raw = input("Bus ID (blank all): ").strip()
+            bus_id = int(bus_raw) if bus_raw else None
+            date_from = input("Booked from YYYY-MM-DD (blank skip): ").strip() or None
+            date_to = input("Booked before YYYY-MM-DD (blank skip): ").strip() or None
+            cursor = None
+            while True:
+                r = call(api.admin_tickets, token, cursor, PAGE_SIZE, status, bus_id, date_from, date_to)
+                if not r:
+                    break
+                tickets, cursor = r['tickets'], r['next_cursor']
+                if not tickets:
+                    print("No tickets.")
                 for t in tickets:
                     print(f"ID:{t['id']} | TNo:{t['ticket_no']} | User:{t['username']} | Route:{t['route']} | Seat:{t['seat_no']} | Price:₹{t['price_paid']} | Status:{t['status']} | At:{t['booked_at']}")
+                if cursor is None or input("n: next page, Enter: back ").strip().lower() != "n":
+                    break
         elif choice == "6":
-            users = features.view_all_users()
-            for u in users:
-                role = "Admin" if u['is_admin'] else "User"
-                print(f"ID:{u['id']} | {u['username']} | Role:{role} | Wallet:₹{u['wallet']} | Created:{u['created_at']}")
+            cursor = None
+            while True:
+                r = call(api.admin_users, token, cursor, PAGE_SIZE)
+                if not r:
+                    break
+                users, cursor = r['users'], r['next_cursor']
+                for u in users:
+                    role = "Admin" if u['is_admin'] else "User"
+                    print(f"ID:{u['id']} | {u['username']} | Role:{role} | Wallet:₹{u['wallet']} | Created:{u['created_at']}")
+                if cursor is None or input("n: next page, Enter: back ").strip().lower() != "n":
+                    break
         elif choice == "7":
-            s = features.admin_stats()
+            s = call(api.admin_stats, token)
+            if not s:
+                continue
             print("=== STATS ===")
             print(f"Total users: {s['total_users']}")
             print(f"Total buses: {s['total_buses']}")
             print(f"Total active tickets: {s['total_tickets']}")
             print(f"Total revenue (active): ₹{s['revenue']}")
             print(f"Top route: {s['top_route']}")
+            for name, c in s['cache'].items():
+                print(f"Cache {name}: {c['hits']} hits / {c['misses']} misses ({c['hit_ratio']:.0%}), {c['size']}/{c['maxsize']} entries")
         elif choice == "8":
+            path = input("File (.csv, .json or .jsonl): ").strip()
+            dry = input("Validate only? (y/n): ").strip().lower() == "y"
+            try:
+                rows = fleet.load_rows(path)
+            except (OSError, ValueError) as e:
+                print(f"Cannot read {path}: {e}")
+                continue
+            r = call(api.import_fleet, token, rows, dry)
+            if r:
+                for e in r['errors']:
+                    print(f"Row {e['row']} ({e['bus_code']}): {e['error']}")
+                done = f"valid: {r['valid']}" if dry else f"inserted: {r['inserted']}, updated: {r['updated']}"
+                print(f"{r['rows']} rows, {done}, errors: {len(r['errors'])}")
+        elif choice == "9":
+            bid = int(input("Bus ID: "))
+            tdate = input("Travel date (YYYY-MM-DD) leave blank for none: ").strip() or None
+            r = call(api.admin_manifest, token, bid, tdate)
+            if r and r['tickets']:
+                print(f"{len(r['tickets'])} tickets; rendering manifest in the background.")
+                save_tickets(r['tickets'], bundle="pdf", name=f"manifest_bus{bid}_{tdate or 'undated'}")
+            elif r:
+                print("No active tickets for that service.")
+        elif choice == "10":
+            m = call(api.admin_metrics, token)
+            if not m:
+                continue
+            print("=== PERFORMANCE (this process) ===")
+            if not m['operations']:
+                print("No operations recorded yet.")
+            for o in m['operations']:
+                print(f"{o['op']:24} calls:{o['calls']:>6} errors:{o['errors']:>4} avg:{o['avg_ms']:>8.2f} ms "
+                      f"p95:{o['p95_ms']:>8.2f} ms max:{o['max_ms']:>8.2f} ms sql/op:{o['avg_statements']:>5}")
+            for name, value in sorted(m['counters'].items()):
+                print(f"{name}: {value}")
+            for rep in m['replicas']:
+                state = f"lag {rep['lag_s']}s" if rep['up'] and rep['lag_s'] is not None else (rep['error'] or "no heartbeat yet")
+                print(f"Replica {rep['replica']}: {state}")
+            path = input("Write Prometheus file to (blank skip): ").strip()
+            if path:
+                try:
+                    metrics.write_file(path)
+                    print(f"Metrics written to {path}")
+                except OSError as e:
+                    print(f"Cannot write {path}: {e}")
+        elif choice == "11":
             print("Admin logged out.")
             break
         else:
             print("Invalid choice.")
 
 if __name__ == "__main__":
-    main_menu()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Bus ticket system")
+    parser.add_argument("--batch", metavar="FILE", help="run JSON-lines commands from FILE ('-' for stdin) instead of the menus")
+    parser.add_argument("--workers", type=int, default=8, help="parallel commands in batch mode")
+    parser.add_argument("--output", metavar="FILE", help="write batch results to FILE instead of stdout")
+    args = parser.parse_args()
+    init_db()
+    if args.batch:
+        import batch
+        sys.exit(batch.main(args.batch, args.workers, args.output))
+    main_menu()
@@ -0,0 +1,278 @@
+# metrics.py
+"""
+In-process instrumentation: operation latency, SQL statements, connections.
+
+- @timed("create_ticket") records the latency of each call, the SQL round-trips
+  it made and whether it raised.
+- InstrumentedCursor / InstrumentedSSCursor (db_config makes every connection
+  use them) count and time each statement, count lock-wait (1205) and deadlock
+  (1213) errors and feed the slow-query log.
+- db_config counts physical connections opened/closed, pool checkouts and
+  pool wait time.
+
+render() returns everything in Prometheus text format: server.py serves it at
+GET /metrics, write_file() dumps it for a node-exporter textfile collector.
+summary() is the digest shown in the admin dashboard.
+
+Slow-query log: set BUS_SLOW_QUERY_MS (threshold in ms) and optionally
+BUS_SLOW_QUERY_LOG (file, default stderr). Entries carry the statement with its
+bound parameters, so the log contains user data; keep it private.
+
+All state is per process.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import pymysql
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SLOW_QUERY_MS = float(os.environ["BUS_SLOW_QUERY_MS"]) if os.environ.get("BUS_SLOW_QUERY_MS") else None
+SLOW_QUERY_LOG = os.environ.get("BUS_SLOW_QUERY_LOG")
+
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+
+_lock = threading.Lock()
+_local = threading.local()      # .ops: stack of per-call statement counters; .recorders: see recording()
+_counters = {}                  # (name, labels) -> value
+_histograms = {}                # (name, labels) -> _Histogram
+_gauges = {}                    # name -> callable
+_HELP = {
+    "bus_op_duration_seconds": "Latency of service operations.",
+    "bus_op_statements": "SQL round-trips per service operation.",
+    "bus_op_errors_total": "Service operations that raised.",
+    "bus_sql_duration_seconds": "Latency of individual SQL statements.",
+    "bus_sql_errors_total": "SQL statements that failed, by MySQL error code.",
+    "bus_db_lock_wait_timeouts_total": "Statements that hit innodb_lock_wait_timeout (1205).",
+    "bus_db_deadlocks_total": "Statements chosen as deadlock victims (1213).",
+    "bus_txn_retries_total": "Transactions retried by run_transaction.",
+    "bus_db_connections_opened_total": "Physical DB connections opened.",
+    "bus_db_connections_closed_total": "Physical DB connections closed.",
+    "bus_db_pool_checkouts_total": "Connections handed out by the pool.",
+    "bus_db_pool_acquire_seconds": "Time spent waiting for a pooled connection.",
+    "bus_db_pool_timeouts_total": "Callers that gave up waiting for a pooled connection.",
+    "bus_db_reads_total": "Replica-eligible reads, by where they ran (replica or primary fallback).",
+}
+
+_slow_log = logging.getLogger("bus.slow_query")
+if SLOW_QUERY_MS is not None and not _slow_log.handlers:
+    _handler = logging.FileHandler(SLOW_QUERY_LOG, encoding="utf-8") if SLOW_QUERY_LOG else logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    _slow_log.addHandler(_handler)
+    _slow_log.setLevel(logging.INFO)
+    _slow_log.propagate = False
+
+
+class _Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+
+# ------------- recording -------------
+def _key(name: str, labels: dict):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = _Histogram(buckets)
+        h.observe(value)
+
+def gauge(name: str, fn, help_text: str = None):
+    """Registers a callable sampled at export time."""
+    _gauges[name] = fn
+    if help_text:
+        _HELP[name] = help_text
+
+def timed(op: str):
+    """Decorator recording latency, SQL round-trips and errors of each call under `op`."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            stack = _local.__dict__.setdefault("ops", [])
+            counter = [0]
+            stack.append(counter)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                inc("bus_op_errors_total", op=op)
+                raise
+            finally:
+                observe("bus_op_duration_seconds", time.perf_counter() - started, op=op)
+                observe("bus_op_statements", counter[0], STATEMENT_BUCKETS, op=op)
+                stack.pop()
+        return wrapper
+    return decorate
+
+@contextmanager
+def recording():
+    """Collects (query, args) of every statement this thread runs inside the block (query_plans.py)."""
+    log = []
+    stack = _local.__dict__.setdefault("recorders", [])
+    stack.append(log)
+    try:
+        yield log
+    finally:
+        stack.remove(log)
+
+def _statement(cursor, query, args, seconds: float, error=None):
+    for counter in getattr(_local, "ops", ()):
+        counter[0] += 1
+    for log in getattr(_local, "recorders", ()):
+        log.append((query, args))
+    observe("bus_sql_duration_seconds", seconds)
+    if error is not None:
+        code = error.args[0] if error.args and isinstance(error.args[0], int) else "other"
+        inc("bus_sql_errors_total", code=str(code))
+        if code == ER_LOCK_WAIT_TIMEOUT:
+            inc("bus_db_lock_wait_timeouts_total")
+        elif code == ER_LOCK_DEADLOCK:
+            inc("bus_db_deadlocks_total")
+    if SLOW_QUERY_MS is not None and seconds * 1000 >= SLOW_QUERY_MS:
+        try:
+            sql = cursor.mogrify(query, args)
+        except Exception:
+            sql = f"{query} -- args: {args!r}"
+        _slow_log.info("%.1f ms%s: %s", seconds * 1000, f" [error {error.args[0]}]" if error is not None else "",
+                       " ".join(str(sql).split()))
+
+
+class InstrumentedMixin:
+    """Times and counts execute(); mixed into every cursor class the backends hand out."""
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            result = super().execute(query, args)
+        except pymysql.err.MySQLError as e:
+            _statement(self, query, args, time.perf_counter() - started, e)
+            raise
+        _statement(self, query, args, time.perf_counter() - started)
+        return result
+
+
+class InstrumentedCursor(InstrumentedMixin, pymysql.cursors.DictCursor):
+    pass
+
+
+class InstrumentedSSCursor(InstrumentedMixin, pymysql.cursors.SSDictCursor):
+    pass
+
+
+# ------------- export -------------
+def _labels(labels, extra=()) -> str:
+    items = list(labels) + list(extra)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}" if items else ""
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: (h.buckets, list(h.counts), h.sum, h.count) for k, h in _histograms.items()}
+    lines, seen = [], set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in _HELP:
+                lines.append(f"# HELP {name} {_HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, c in zip(list(buckets) + ["+Inf"], counts):
+            cumulative += c
+            lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {total}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+    for name, fn in sorted(_gauges.items()):
+        try:
+            value = fn()
+        except Exception:
+            continue
+        header(name, "gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+def write_file(path: str):
+    """Atomically writes render() to `path` (for a textfile collector)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+def summary() -> dict:
+    """{"operations": [{op, calls, errors, avg_ms, p95_ms, max_ms, avg_statements}], "counters": {...}}"""
+    with _lock:
+        ops = []
+        for (name, labels), h in _histograms.items():
+            if name != "bus_op_duration_seconds":
+                continue
+            op = dict(labels)["op"]
+            st = _histograms.get(_key("bus_op_statements", {"op": op}))
+            ops.append({"op": op, "calls": h.count,
+                        "errors": _counters.get(_key("bus_op_errors_total", {"op": op}), 0),
+                        "avg_ms": round(h.sum / h.count * 1000, 2) if h.count else 0.0,
+                        "p95_ms": round(h.quantile(0.95) * 1000, 2), "max_ms": round(h.max * 1000, 2),
+                        "avg_statements": round(st.sum / st.count, 1) if st and st.count else 0.0})
+        counters = {}
+        for (name, labels), value in _counters.items():
+            if name != "bus_op_errors_total":
+                counters[name + _labels(labels)] = value
+        sql = _histograms.get(_key("bus_sql_duration_seconds", {}))
+        if sql:
+            counters["bus_sql_statements_total"] = sql.count
+    ops.sort(key=lambda o: o["avg_ms"] * o["calls"], reverse=True)
+    for name, fn in _gauges.items():
+        try:
+            counters[name] = fn()
+        except Exception:
+            pass
+    return {"operations": ops, "counters": counters}
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
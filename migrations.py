@@ -0,0 +1,622 @@
+# migrations.py
+"""
+Versioned, forward-only schema migrations.
+
+Each entry in MIGRATIONS is (version, description, steps). A step is either a SQL
+string or a callable taking a cursor. Steps must be idempotent (IF NOT EXISTS,
+or check information_schema first): MySQL commits DDL implicitly, so a migration
+that fails half-way is simply re-run on the next start.
+
+To change the schema, append a new entry with the next version number.
+Never edit a migration that has already shipped.
+
+SQLite (BUS_DB_BACKEND=sqlite): a new SQLite database is created from
+SQLITE_SCHEMA, the schema as of SQLITE_SCHEMA_VERSION, instead of replaying
+the MySQL migrations up to that version. Later migrations run on both
+backends, so they must stick to the helpers below (which know both) or give a
+step per backend as {"mysql": ..., "sqlite": ...} (a missing key skips it).
+On SQLite all pending migrations run in one transaction (SQLite DDL is
+transactional), whose write lock also keeps a second process from migrating
+at the same time.
+"""
+import re
+
+import pymysql
+
+from db_config import get_conn, DB_NAME, DB_BACKEND
+import routes
+import seat_bitmap
+import ticket_ids
+
+MIGRATE_LOCK = f"{DB_NAME}.migrate"
+MIGRATE_LOCK_TIMEOUT = 60
+
+ER_BAD_DB_ERROR = 1049
+ER_NO_SUCH_TABLE = 1146
+
+
+# ------------- helpers for idempotent steps -------------
+def column_exists(cur, table: str, column: str) -> bool:
+    if DB_BACKEND == "sqlite":
+        cur.execute("SELECT 1 FROM pragma_table_info(%s) WHERE name = %s", (table, column))
+        return cur.fetchone() is not None
+    cur.execute("""
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cur.fetchone() is not None
+
+def index_exists(cur, table: str, index: str) -> bool:
+    if DB_BACKEND == "sqlite":
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s", (table, index))
+        return cur.fetchone() is not None
+    cur.execute("""
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        LIMIT 1
+    """, (table, index))
+    return cur.fetchone() is not None
+
+def add_column(table: str, column: str, definition: str):
+    def step(cur):
+        if not column_exists(cur, table, column):
+            # SQLite always appends columns: drop MySQL's AFTER <column>
+            ddl = re.sub(r"\s+AFTER\s+\w+\s*$", "", definition) if DB_BACKEND == "sqlite" else definition
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return step
+
+def drop_column(table: str, column: str):
+    def step(cur):
+        if column_exists(cur, table, column):
+            cur.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+    return step
+
+def add_index(table: str, index: str, columns: str, unique: bool = False):
+    def step(cur):
+        if not index_exists(cur, table, index):
+            kind = "UNIQUE INDEX" if unique else "INDEX"
+            if DB_BACKEND == "sqlite":
+                cur.execute(f"CREATE {kind} {index} ON {table} ({columns})")
+            else:
+                cur.execute(f"ALTER TABLE {table} ADD {kind} {index} ({columns})")
+    return step
+
+
+# ------------- data backfills -------------
+def _backfill_seat_inventory(cur):
+    cur.execute("""
+        SELECT t.bus_id, IFNULL(t.travel_date, %s) AS travel_date, t.seat_no, b.total_seats
+        FROM tickets t JOIN buses b ON b.id = t.bus_id
+        WHERE t.status = 'ACTIVE'
+    """, (seat_bitmap.UNDATED,))
+    seats = {}
+    totals = {}
+    for r in cur.fetchall():
+        key = (r['bus_id'], str(r['travel_date']))
+        seats.setdefault(key, []).append(r['seat_no'])
+        totals[key] = r['total_seats']
+    rows = [(bus_id, d, seat_bitmap.from_seats(s, totals[(bus_id, d)])) for (bus_id, d), s in seats.items()]
+    if rows:
+        cur.executemany("""
+            INSERT INTO seat_inventory (bus_id, travel_date, occupancy) VALUES (%s,%s,%s)
+            ON DUPLICATE KEY UPDATE occupancy = VALUES(occupancy)
+        """, rows)
+
+
+def _backfill_seats_booked(cur):
+    cur.execute("SELECT bus_id, travel_date, occupancy FROM seat_inventory")
+    rows = [(seat_bitmap.booked_count(r['occupancy']), r['bus_id'], r['travel_date']) for r in cur.fetchall()]
+    if rows:
+        cur.executemany("UPDATE seat_inventory SET seats_booked=%s WHERE bus_id=%s AND travel_date=%s", rows)
+
+
+def _backfill_wallet_ledger(cur):
+    if not column_exists(cur, "users", "wallet"):
+        return
+    # opening balance per user, taken from the old users.wallet column (once)
+    cur.execute("""
+        INSERT INTO wallet_ledger (user_id, amount, kind, note, compacted)
+        SELECT u.id, u.wallet, 'OPENING', 'migrated from users.wallet', 1 FROM users u
+        WHERE u.wallet <> 0
+          AND NOT EXISTS (SELECT 1 FROM wallet_ledger l WHERE l.user_id = u.id AND l.kind = 'OPENING')
+    """)
+    cur.execute("""
+        INSERT INTO wallet_balances (user_id, balance)
+        SELECT id, wallet FROM users
+        ON DUPLICATE KEY UPDATE balance = VALUES(balance)
+    """)
+
+
+# stats.py as of migration 8; later changes to stats.py must not change what it does
+_STATS_COUNTERS_V8 = ("active_tickets", "buses", "revenue", "users")
+_STATS_SHARDS_V8 = 16
+
+def _seed_stats(cur):
+    cur.executemany("INSERT IGNORE INTO stats_counters (name, shard, value) VALUES (%s,%s,0)",
+                    [(name, shard) for name in _STATS_COUNTERS_V8 for shard in range(_STATS_SHARDS_V8)])
+
+
+def _backfill_stats(cur):
+    _seed_stats(cur)
+    cur.execute("UPDATE stats_counters SET value = 0")
+    for name, sql in (("users", "SELECT COUNT(*) FROM users"),
+                      ("buses", "SELECT COUNT(*) FROM buses"),
+                      ("active_tickets", "SELECT COUNT(*) FROM tickets WHERE status='ACTIVE'"),
+                      ("revenue", "SELECT IFNULL(SUM(price_paid), 0) FROM tickets WHERE status='ACTIVE'")):
+        cur.execute(f"UPDATE stats_counters SET value = ({sql}) WHERE name=%s AND shard=0", (name,))
+    cur.execute("DELETE FROM route_stats")
+    cur.execute("""
+        INSERT INTO route_stats (route, shard, active_tickets)
+        SELECT b.route, 0, COUNT(*) FROM tickets t JOIN buses b ON t.bus_id=b.id
+        WHERE t.status='ACTIVE' GROUP BY b.route
+    """)
+
+
+def _backfill_route_cities(cur):
+    cur.execute("SELECT id, route FROM buses WHERE origin IS NULL")
+    rows = [routes.parse_route(r['route']) + (r['id'],) for r in cur.fetchall()]
+    if rows:
+        cur.executemany("UPDATE buses SET origin=%s, destination=%s WHERE id=%s", rows)
+
+
+# ------------- migrations -------------
+MIGRATIONS = [
+    (1, "initial schema", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(150) NOT NULL UNIQUE,
+            password_hash VARCHAR(256) NOT NULL,
+            salt VARCHAR(64) NOT NULL,
+            is_admin TINYINT DEFAULT 0,
+            wallet BIGINT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS buses (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            route VARCHAR(255) NOT NULL,
+            route_description TEXT NULL,
+            total_seats INT NOT NULL,
+            seats_available INT NOT NULL,
+            price INT DEFAULT 100,
+            departure_time TIME NULL,
+            arrival_time TIME NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS tickets (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            ticket_no VARCHAR(64) NOT NULL UNIQUE,
+            user_id INT NOT NULL,
+            bus_id INT NOT NULL,
+            seat_no INT NOT NULL,
+            price_paid INT NOT NULL,
+            status ENUM('ACTIVE','CANCELLED') DEFAULT 'ACTIVE',
+            booked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            travel_date DATE NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (bus_id) REFERENCES buses(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ticket_history (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            ticket_id INT NOT NULL,
+            action VARCHAR(50) NOT NULL,
+            note TEXT,
+            performed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (ticket_id) REFERENCES tickets(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB;
+        """,
+    ]),
+    (2, "composite indexes for hot ticket queries", [
+        # seat-taken check, booked_seats: WHERE bus_id=? AND status='ACTIVE' [AND seat_no=?]
+        add_index("tickets", "idx_tickets_bus_status_seat", "bus_id, status, seat_no"),
+        # get_user_tickets: WHERE user_id=? ORDER BY booked_at DESC
+        add_index("tickets", "idx_tickets_user_booked", "user_id, booked_at"),
+        # admin_stats: status='ACTIVE' counts/sums and per-route grouping (covering)
+        add_index("tickets", "idx_tickets_status_bus", "status, bus_id, price_paid"),
+        # view_all_tickets: ORDER BY booked_at DESC
+        add_index("tickets", "idx_tickets_booked", "booked_at"),
+    ]),
+    (3, "seat occupancy bitmaps per bus and travel date", [
+        """
+        CREATE TABLE IF NOT EXISTS seat_inventory (
+            bus_id INT NOT NULL,
+            travel_date DATE NOT NULL,           -- seat_bitmap.UNDATED for undated tickets
+            occupancy VARBINARY(255) NOT NULL,   -- see seat_bitmap.py
+            PRIMARY KEY (bus_id, travel_date),
+            FOREIGN KEY (bus_id) REFERENCES buses(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB;
+        """,
+        _backfill_seat_inventory,
+    ]),
+    (4, "at most one active ticket per bus, travel date and seat", [
+        # NULL once cancelled, so cancelled tickets never collide
+        add_column("tickets", "active_travel_date",
+                   f"DATE AS (IF(status = 'ACTIVE', IFNULL(travel_date, '{seat_bitmap.UNDATED}'), NULL)) STORED"),
+        add_index("tickets", "uq_tickets_active_seat", "bus_id, active_travel_date, seat_no", unique=True),
+    ]),
+    (5, "per-travel-date availability in seat_inventory", [
+        add_column("seat_inventory", "seats_booked", "INT NOT NULL DEFAULT 0"),
+        _backfill_seats_booked,
+        # availability is now total_seats - seat_inventory.seats_booked for the date
+        drop_column("buses", "seats_available"),
+    ]),
+    (6, "per-user password hash parameters", [
+        # every hash stored before this migration used pbkdf2_sha256 with 150k iterations
+        add_column("users", "hash_algo", "VARCHAR(32) NOT NULL DEFAULT 'pbkdf2_sha256'"),
+        add_column("users", "hash_iterations", "INT NOT NULL DEFAULT 150000"),
+    ]),
+    (7, "append-only wallet ledger replaces users.wallet", [
+        """
+        CREATE TABLE IF NOT EXISTS wallet_ledger (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            amount BIGINT NOT NULL,              -- credit > 0, debit < 0
+            kind VARCHAR(20) NOT NULL,           -- OPENING, TOPUP, TICKET, REFUND
+            ref_type VARCHAR(20) NULL,
+            ref_id BIGINT NULL,
+            note VARCHAR(255) NULL,
+            compacted TINYINT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_ledger_pending (user_id, compacted, amount),
+            INDEX idx_ledger_ref (ref_type, ref_id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS wallet_balances (
+            user_id INT PRIMARY KEY,
+            balance BIGINT NOT NULL DEFAULT 0,   -- sum of compacted ledger entries
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB;
+        """,
+        _backfill_wallet_ledger,
+        drop_column("users", "wallet"),
+    ]),
+    (8, "incrementally maintained admin stats", [
+        """
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name VARCHAR(64) NOT NULL,
+            shard TINYINT NOT NULL,
+            value BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, shard)
+        ) ENGINE=InnoDB;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS route_stats (
+            route VARCHAR(255) NOT NULL,
+            shard TINYINT NOT NULL,
+            active_tickets BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (route, shard)
+        ) ENGINE=InnoDB;
+        """,
+        _backfill_stats,
+    ]),
+    (9, "keyset pagination indexes for admin listings", [
+        # InnoDB appends the primary key to secondary indexes, so each of these
+        # is effectively (..., booked_at, id): the keyset order of the listings
+        add_index("tickets", "idx_tickets_status_booked", "status, booked_at"),
+        add_index("tickets", "idx_tickets_bus_booked", "bus_id, booked_at"),
+    ]),
+    (10, "indexed origin and destination cities", [
+        add_column("buses", "origin", f"VARCHAR({routes.CITY_MAX_LEN}) NULL AFTER route"),
+        add_column("buses", "destination", f"VARCHAR({routes.CITY_MAX_LEN}) NULL AFTER origin"),
+        _backfill_route_cities,
+        # search_buses: origin/destination equality + departure window; also origin prefix autocomplete
+        add_index("buses", "idx_buses_od_departure", "origin, destination, departure_time"),
+        # destination-only searches and destination prefix autocomplete
+        add_index("buses", "idx_buses_destination_departure", "destination, departure_time"),
+    ]),
+    (11, "bus codes: natural key for fleet imports", [
+        add_column("buses", "bus_code", "VARCHAR(32) NULL AFTER id"),
+        "UPDATE buses SET bus_code = CONCAT('BUS', id) WHERE bus_code IS NULL",
+        add_index("buses", "uq_buses_code", "bus_code", unique=True),
+    ]),
+    (12, "replication heartbeat for replica lag checks", [
+        # written on the primary by db_config while replicas are configured
+        """
+        CREATE TABLE IF NOT EXISTS replication_heartbeat (
+            id TINYINT PRIMARY KEY,
+            beat_ms BIGINT NOT NULL   -- primary clock, epoch milliseconds
+        ) ENGINE=InnoDB;
+        """,
+        "INSERT IGNORE INTO replication_heartbeat (id, beat_ms) VALUES (1, 0)",
+    ]),
+    (13, "node leases for time-ordered ticket numbers", [
+        # one row per Snowflake node id; ticket_ids leases a free one per process
+        """
+        CREATE TABLE IF NOT EXISTS id_nodes (
+            node_id SMALLINT PRIMARY KEY,
+            owner VARCHAR(64) NOT NULL DEFAULT '',
+            lease_until BIGINT NOT NULL DEFAULT 0   -- epoch ms; free once passed
+        ) ENGINE=InnoDB;
+        """,
+        "INSERT IGNORE INTO id_nodes (node_id) VALUES " + ",".join(f"({i})" for i in range(ticket_ids.MAX_NODES)),
+    ]),
+    (14, "archive tables for tickets past their travel date", [
+        # archive.py picks tickets by travel date
+        add_index("tickets", "idx_tickets_travel_date", "travel_date"),
+        # copies of tickets / ticket_history keyed by the original ids; no foreign
+        # keys, so audit rows outlive deleted users and buses (route is kept)
+        {"mysql": """
+            CREATE TABLE IF NOT EXISTS tickets_archive (
+                id INT PRIMARY KEY,
+                ticket_no VARCHAR(64) NOT NULL UNIQUE,
+                user_id INT NOT NULL,
+                bus_id INT NOT NULL,
+                route VARCHAR(255) NOT NULL,
+                seat_no INT NOT NULL,
+                price_paid INT NOT NULL,
+                status ENUM('ACTIVE','CANCELLED') NOT NULL,
+                booked_at TIMESTAMP NULL,
+                travel_date DATE NOT NULL,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB;
+            """,
+         "sqlite": """
+            CREATE TABLE IF NOT EXISTS tickets_archive (
+                id INTEGER PRIMARY KEY,
+                ticket_no VARCHAR(64) NOT NULL UNIQUE COLLATE NOCASE,
+                user_id INTEGER NOT NULL,
+                bus_id INTEGER NOT NULL,
+                route VARCHAR(255) NOT NULL COLLATE NOCASE,
+                seat_no INTEGER NOT NULL,
+                price_paid INTEGER NOT NULL,
+                status VARCHAR(10) NOT NULL,
+                booked_at TIMESTAMP NULL,
+                travel_date DATE NOT NULL,
+                archived_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+            )
+            """},
+        """
+        CREATE TABLE IF NOT EXISTS ticket_history_archive (
+            id INT PRIMARY KEY,
+            ticket_id INT NOT NULL,
+            action VARCHAR(50) NOT NULL,
+            note TEXT,
+            performed_at TIMESTAMP NULL
+        ) ENGINE=InnoDB;
+        """,
+        # get_user_tickets(include_archived=True); purge by travel date
+        add_index("tickets_archive", "idx_archive_user_booked", "user_id, booked_at"),
+        add_index("tickets_archive", "idx_archive_travel_date", "travel_date"),
+        add_index("ticket_history_archive", "idx_history_archive_ticket", "ticket_id"),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ------------- SQLite baseline -------------
+# The MySQL schema after migration SQLITE_SCHEMA_VERSION. Text columns that
+# MySQL compares case-insensitively (utf8mb4_unicode_ci) and that are searched
+# or unique are NOCASE; tables keyed by a composite primary key are clustered
+# on it (WITHOUT ROWID), like InnoDB. MySQL indexes foreign keys implicitly;
+# here the one not covered by another index is created explicitly.
+SQLITE_SCHEMA_VERSION = 11
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username VARCHAR(150) NOT NULL UNIQUE COLLATE NOCASE,
+        password_hash VARCHAR(256) NOT NULL,
+        salt VARCHAR(64) NOT NULL,
+        is_admin INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        hash_algo VARCHAR(32) NOT NULL DEFAULT 'pbkdf2_sha256',
+        hash_iterations INTEGER NOT NULL DEFAULT 150000
+    )
+    """,
+    f"""
+    CREATE TABLE buses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        bus_code VARCHAR(32) NULL COLLATE NOCASE,
+        route VARCHAR(255) NOT NULL COLLATE NOCASE,
+        origin VARCHAR({routes.CITY_MAX_LEN}) NULL COLLATE NOCASE,
+        destination VARCHAR({routes.CITY_MAX_LEN}) NULL COLLATE NOCASE,
+        route_description TEXT NULL,
+        total_seats INTEGER NOT NULL,
+        price INTEGER DEFAULT 100,
+        departure_time TIME NULL,
+        arrival_time TIME NULL,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    "CREATE UNIQUE INDEX uq_buses_code ON buses (bus_code)",
+    "CREATE INDEX idx_buses_od_departure ON buses (origin, destination, departure_time)",
+    "CREATE INDEX idx_buses_destination_departure ON buses (destination, departure_time)",
+    f"""
+    CREATE TABLE tickets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_no VARCHAR(64) NOT NULL UNIQUE COLLATE NOCASE,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        bus_id INTEGER NOT NULL REFERENCES buses(id) ON DELETE CASCADE,
+        seat_no INTEGER NOT NULL,
+        price_paid INTEGER NOT NULL,
+        status VARCHAR(10) DEFAULT 'ACTIVE' CHECK (status IN ('ACTIVE', 'CANCELLED')),
+        booked_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        travel_date DATE NULL,
+        active_travel_date DATE GENERATED ALWAYS AS
+            (CASE WHEN status = 'ACTIVE' THEN IFNULL(travel_date, '{seat_bitmap.UNDATED}') END) STORED
+    )
+    """,
+    "CREATE INDEX idx_tickets_bus_status_seat ON tickets (bus_id, status, seat_no)",
+    "CREATE INDEX idx_tickets_user_booked ON tickets (user_id, booked_at)",
+    "CREATE INDEX idx_tickets_status_bus ON tickets (status, bus_id, price_paid)",
+    "CREATE INDEX idx_tickets_booked ON tickets (booked_at)",
+    "CREATE UNIQUE INDEX uq_tickets_active_seat ON tickets (bus_id, active_travel_date, seat_no)",
+    "CREATE INDEX idx_tickets_status_booked ON tickets (status, booked_at)",
+    "CREATE INDEX idx_tickets_bus_booked ON tickets (bus_id, booked_at)",
+    """
+    CREATE TABLE ticket_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id INTEGER NOT NULL REFERENCES tickets(id) ON DELETE CASCADE,
+        action VARCHAR(50) NOT NULL,
+        note TEXT,
+        performed_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    "CREATE INDEX idx_history_ticket ON ticket_history (ticket_id)",
+    """
+    CREATE TABLE seat_inventory (
+        bus_id INTEGER NOT NULL REFERENCES buses(id) ON DELETE CASCADE,
+        travel_date DATE NOT NULL,
+        occupancy BLOB NOT NULL,
+        seats_booked INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (bus_id, travel_date)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE wallet_ledger (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        amount INTEGER NOT NULL,
+        kind VARCHAR(20) NOT NULL,
+        ref_type VARCHAR(20) NULL,
+        ref_id INTEGER NULL,
+        note VARCHAR(255) NULL,
+        compacted INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    "CREATE INDEX idx_ledger_pending ON wallet_ledger (user_id, compacted, amount)",
+    "CREATE INDEX idx_ledger_ref ON wallet_ledger (ref_type, ref_id)",
+    """
+    CREATE TABLE wallet_balances (
+        user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+        balance INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    # MySQL's ON UPDATE CURRENT_TIMESTAMP
+    """
+    CREATE TRIGGER wallet_balances_updated AFTER UPDATE OF balance ON wallet_balances
+    BEGIN
+        UPDATE wallet_balances SET updated_at = datetime('now', 'localtime') WHERE user_id = NEW.user_id;
+    END
+    """,
+    """
+    CREATE TABLE stats_counters (
+        name VARCHAR(64) NOT NULL,
+        shard INTEGER NOT NULL,
+        value INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (name, shard)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE route_stats (
+        route VARCHAR(255) NOT NULL COLLATE NOCASE,
+        shard INTEGER NOT NULL,
+        active_tickets INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (route, shard)
+    ) WITHOUT ROWID
+    """,
+    _seed_stats,
+]
+
+
+# ------------- runner -------------
+def _create_database():
+    conn = get_conn(use_db=False)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME} DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;")
+        conn.commit()
+    finally:
+        conn.close()
+
+def _current_version(cur) -> int:
+    try:
+        cur.execute("SELECT MAX(version) AS v FROM schema_version")
+    except pymysql.err.ProgrammingError as e:
+        if e.args[0] == ER_NO_SUCH_TABLE:
+            return 0
+        raise
+    r = cur.fetchone()
+    return r['v'] or 0
+
+def current_version() -> int:
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            return _current_version(cur)
+    finally:
+        conn.close()
+
+def _run_steps(cur, steps):
+    for step in steps:
+        if isinstance(step, dict):
+            step = step.get(DB_BACKEND)
+        if step is None:
+            continue
+        if callable(step):
+            step(cur)
+        else:
+            cur.execute(step)
+
+def migrate():
+    """
+    Applies pending migrations. Returns the list of versions applied
+    (empty when the schema was already current).
+    """
+    try:
+        conn = get_conn()
+    except pymysql.err.OperationalError as e:
+        if e.args[0] != ER_BAD_DB_ERROR:
+            raise
+        _create_database()
+        conn = get_conn()
+
+    applied = []
+    sqlite = DB_BACKEND == "sqlite"
+    try:
+        with conn.cursor() as cur:
+            # fast path: one round-trip when nothing is pending
+            if _current_version(cur) >= LATEST_VERSION:
+                return applied
+
+            # several workers may start at once; only one migrates
+            if sqlite:
+                conn.rollback()   # drop the read snapshot: the next statement takes the write lock
+            else:
+                cur.execute("SELECT GET_LOCK(%s, %s) AS got", (MIGRATE_LOCK, MIGRATE_LOCK_TIMEOUT))
+                if not cur.fetchone()['got']:
+                    raise RuntimeError("Timed out waiting for another process to finish migrating.")
+            try:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INT PRIMARY KEY,
+                        description VARCHAR(255) NOT NULL,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    ) ENGINE=InnoDB;
+                """)
+                done = _current_version(cur)
+                if sqlite and done == 0:
+                    _run_steps(cur, SQLITE_SCHEMA)
+                    cur.executemany("INSERT INTO schema_version (version, description) VALUES (%s,%s)",
+                                    [(v, d) for v, d, _ in MIGRATIONS if v <= SQLITE_SCHEMA_VERSION])
+                    applied += [v for v, _, _ in MIGRATIONS if v <= SQLITE_SCHEMA_VERSION]
+                    done = SQLITE_SCHEMA_VERSION
+                    print(f"Created SQLite schema (version {done})")
+                for version, description, steps in MIGRATIONS:
+                    if version <= done:
+                        continue
+                    _run_steps(cur, steps)
+                    cur.execute("INSERT INTO schema_version (version, description) VALUES (%s,%s)", (version, description))
+                    if not sqlite:
+                        conn.commit()
+                    applied.append(version)
+                    print(f"Applied migration {version}: {description}")
+                conn.commit()
+            finally:
+                if not sqlite:
+                    cur.execute("SELECT RELEASE_LOCK(%s)", (MIGRATE_LOCK,))
+    finally:
+        conn.close()
+    return applied
@@ -0,0 +1,188 @@
+# query_plans.py
+"""
+EXPLAIN-based regression check for the hot queries in features.py.
+
+Run `python query_plans.py` against a database with realistic volumes. It runs
+WORKLOAD, the hot read and booking paths called for real (on a scratch bus and
+user it creates and deletes again), records every statement they execute
+through the instrumented cursor (metrics.recording()) and prints the plan of
+each SELECT, UPDATE and DELETE among them. It exits non-zero if any falls back
+to a full table scan (type ALL) or a full index scan (type index). The SQL is
+the SQL the code runs, so there is no copy here to keep up to date; a new hot
+path needs a WORKLOAD step.
+tests/test_query_plans.py runs the same check under pytest.
+
+On SQLite the rows of EXPLAIN QUERY PLAN are mapped onto the same fields:
+SEARCH is an index lookup (type ref), SCAN of a table is type ALL and SCAN
+of an index is type index.
+"""
+import datetime
+import re
+import sys
+
+from db_config import get_conn, DB_BACKEND
+import catalogue
+import features
+import login_register
+import metrics
+import sessions
+import stress_booking
+import ticket_ids
+
+FULL_SCAN_TYPES = ("ALL", "index")
+EXPLAINED = ("SELECT", "UPDATE", "DELETE")
+
+
+def _book(ctx):
+    ok, msg, info = features.create_ticket(ctx["user_id"], ctx["bus_id"], 0, ctx["date"])
+    assert ok, msg
+    ctx["ticket_no"] = info["ticket_no"]
+
+def _book_group(ctx):
+    ok, msg, _ = features.create_tickets_bulk(ctx["user_id"], ctx["bus_id"], 2, ctx["date"])
+    assert ok, msg
+
+def _find(ctx):
+    features.find_ticket(ctx["ticket_no"])
+    features.find_ticket(ticket_ids.encode(0))   # no live ticket: falls back to the archive
+
+def _resize_and_rename(ctx):
+    features.update_bus(ctx["bus_id"], total_seats=stress_booking.SEATS)   # highest_booked_seats
+    features.update_bus(ctx["bus_id"], route="Stress → Plan")               # move_route_stats
+    features.update_bus(ctx["bus_id"], route="Stress → Test")
+
+def _cancel(ctx):
+    ticket = next(t for t in features.get_user_tickets(ctx["user_id"]) if t['ticket_no'] == ctx["ticket_no"])
+    ok, msg = features.cancel_user_ticket(ctx["user_id"], ticket['id'])
+    assert ok, msg
+
+def _wallet(ctx):
+    sessions.invalidate_user(ctx["user_id"])
+    login_register.get_wallet(ctx["user_id"])
+    login_register.add_funds(ctx["user_id"], 1)
+
+# step name -> fn(ctx); ctx holds the scratch bus_id, user_id and a travel date
+WORKLOAD = {
+    "get_bus": lambda ctx: features.get_bus(ctx["bus_id"], ctx["date"]),
+    "list_buses": lambda ctx: features.list_buses(ctx["date"]),
+    "search_buses": lambda ctx: features.search_buses("Stress", "Test", "00:00", "23:59", travel_date=ctx["date"]),
+    "search_buses_by_route": lambda ctx: features.search_buses_by_route("Stre", ctx["date"]),
+    "suggest_cities": lambda ctx: features.suggest_cities("Stre"),
+    "booked_seats": lambda ctx: features.booked_seats(ctx["bus_id"], ctx["date"]),
+    "create_ticket": _book,
+    "create_tickets_bulk": _book_group,
+    "get_user_tickets": lambda ctx: features.get_user_tickets(ctx["user_id"], include_archived=True),
+    "find_ticket": _find,
+    "manifest_tickets": lambda ctx: features.manifest_tickets(ctx["bus_id"], ctx["date"]),
+    "view_tickets_page": lambda ctx: features.view_tickets_page(),
+    "view_tickets_page.filtered": lambda ctx: features.view_tickets_page(status="ACTIVE", bus_id=ctx["bus_id"]),
+    "view_users_page": lambda ctx: features.view_users_page(),
+    "update_bus": _resize_and_rename,
+    "cancel_user_ticket": _cancel,
+    "login_user": lambda ctx: login_register.login_user("no such user", "x"),
+    "wallet": _wallet,
+    "admin_stats": lambda ctx: features.admin_stats(),
+}
+
+# (step name or None for any step, table) pairs allowed to scan; keep this list short and justified
+ALLOWED_SCANS = {
+    ("list_buses", "b"),                  # the whole fleet by design; cached in catalogue.py
+    ("view_tickets_page", "t"),           # newest first with no filter: walks idx_tickets_booked and stops at LIMIT
+    ("admin_stats", "stats_counters"),    # fixed-size counter tables (stats.py), not tickets
+    ("admin_stats", "route_stats"),
+    (None, "id_nodes"),                   # ticket_ids lease: MAX_NODES rows, once per NODE_LEASE_MS per process
+}
+
+
+def record_workload(workload: dict = None) -> dict:
+    """Runs each step (caches dropped first) and returns step name -> [(sql, args), ...] it executed, deduplicated."""
+    workload = WORKLOAD if workload is None else workload
+    bus_id, user_id = stress_booking._setup()
+    ctx = {"bus_id": bus_id, "user_id": user_id, "date": (datetime.date.today() + datetime.timedelta(days=1)).isoformat()}
+    statements = {}
+    try:
+        for name, step in workload.items():
+            catalogue.invalidate_all()
+            with metrics.recording() as log:
+                step(ctx)
+            seen = {}
+            for sql, args in log:
+                if sql.split(None, 1)[0].upper() in EXPLAINED:
+                    seen.setdefault(sql, args)
+            statements[name] = list(seen.items())
+    finally:
+        stress_booking._teardown(bus_id, user_id)
+    return statements
+
+
+_SQLITE_STEP = re.compile(r"(SCAN|SEARCH) (\w+)(?: AS (\w+))?(?: USING (?:COVERING )?INDEX (\w+))?")
+
+def _sqlite_plan_row(r: dict, derived) -> dict:
+    detail = r['detail']
+    m = _SQLITE_STEP.match(detail)
+    if not m:   # temp b-trees, compound queries, ...
+        return {"table": None, "type": None, "key": None, "rows": None, "Extra": detail}
+    op, table, alias, index = m.groups()
+    if op == "SCAN" and table in derived:
+        return {"table": f"<{table}>", "type": "ALL", "key": None, "rows": None, "Extra": detail}
+    if op == "SEARCH":
+        kind = "ref"
+    else:
+        kind = "index" if index or "PRIMARY KEY" in detail else "ALL"
+    return {"table": alias or table, "type": kind, "key": index, "rows": None, "Extra": detail}
+
+def explain(cur, sql: str, params=()):
+    if DB_BACKEND == "sqlite":
+        cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+        rows = cur.fetchall()
+        # subquery results, named <alias> the way MySQL names them <derivedN>
+        derived = {r['detail'].split()[-1] for r in rows if r['detail'].startswith(("MATERIALIZE ", "CO-ROUTINE "))}
+        return [_sqlite_plan_row(r, derived) for r in rows]
+    cur.execute("EXPLAIN " + sql, params)
+    return cur.fetchall()
+
+def explain_statements(statements: dict):
+    """
+    statements: name -> [(sql, args), ...]. Returns (plans, offenders): plans maps
+    name -> [(sql, EXPLAIN rows), ...], offenders is a list of (name, table, access type, sql).
+    """
+    plans = {}
+    offenders = []
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            for name, queries in statements.items():
+                plans[name] = []
+                for sql, args in queries:
+                    rows = explain(cur, sql, args)
+                    plans[name].append((sql, rows))
+                    for r in rows:
+                        table = r.get('table')
+                        if table and table.startswith("<"):
+                            continue   # a derived table or union result: reading it whole is the point
+                        if (r.get('type') in FULL_SCAN_TYPES and (name, table) not in ALLOWED_SCANS
+                                and (None, table) not in ALLOWED_SCANS):
+                            offenders.append((name, table, r.get('type'), sql))
+        conn.rollback()
+    finally:
+        conn.close()
+    return plans, offenders
+
+def check_query_plans(workload: dict = None):
+    """record_workload() then explain_statements(); returns (plans, offenders)."""
+    return explain_statements(record_workload(workload))
+
+
+if __name__ == "__main__":
+    plans, offenders = check_query_plans()
+    for name, queries in plans.items():
+        for sql, rows in queries:
+            print(f"{name}: {' '.join(sql.split())[:100]}")
+            for r in rows:
+                print(f"    table={r.get('table')} type={r.get('type')} key={r.get('key')} rows={r.get('rows')} extra={r.get('Extra')}")
+    if offenders:
+        print("\nFULL SCANS:")
+        for name, table, kind, sql in offenders:
+            print(f"  {name}: {table} ({kind}) in {' '.join(sql.split())[:100]}")
+        sys.exit(1)
+    print("\nAll hot queries use an index.")
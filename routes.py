@@ -0,0 +1,35 @@
+# routes.py
+"""
+Route strings and city names.
+
+Routes are written "Origin → Destination" (ASCII "->" is accepted too).
+buses.origin and buses.destination hold the parsed, normalized city names so
+searches can use equality and prefix predicates on indexed columns instead of
+LIKE '%term%' on the whole route string. Comparisons are case-insensitive
+through the column collation, so names are only trimmed and space-collapsed.
+"""
+import re
+
+ROUTE_SEPARATORS = ("→", "->")
+CITY_MAX_LEN = 100
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_city(name: str):
+    if name is None:
+        return None
+    name = _SPACES.sub(" ", name).strip()
+    return name[:CITY_MAX_LEN] or None
+
+def parse_route(route: str):
+    """'Bhopal → Indore' -> ('Bhopal', 'Indore'); (None, None) when there is no separator."""
+    for sep in ROUTE_SEPARATORS:
+        if route and sep in route:
+            origin, destination = route.split(sep, 1)
+            return normalize_city(origin), normalize_city(destination)
+    return None, None
+
+def escape_like(term: str) -> str:
+    """Escapes LIKE wildcards so user input only ever matches as a literal prefix."""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,85 @@
+# seat_bitmap.py
+"""
+Seat occupancy bitmaps, as stored in seat_inventory.occupancy.
+
+Bit (seat_no - 1) is set when the seat is booked; byte order is little-endian,
+so seat 1 is the lowest bit of the first byte. Up to MAX_SEATS seats per bus.
+"""
+
+MAX_SEATS = 255 * 8          # seat_inventory.occupancy is VARBINARY(255)
+UNDATED = "1000-01-01"       # inventory key for tickets booked without a travel date
+
+
+def check_total_seats(total_seats: int) -> int:
+    """Returns total_seats if a bitmap can hold that many seats; raises ValueError otherwise."""
+    if not 1 <= total_seats <= MAX_SEATS:
+        raise ValueError(f"total_seats must be between 1 and {MAX_SEATS}")
+    return total_seats
+
+
+def empty(total_seats: int) -> bytes:
+    return bytes((total_seats + 7) // 8)
+
+def _to_int(bitmap: bytes) -> int:
+    return int.from_bytes(bitmap or b"", "little")
+
+def _to_bytes(n: int, total_seats: int) -> bytes:
+    return n.to_bytes(max((total_seats + 7) // 8, (n.bit_length() + 7) // 8), "little")
+
+def is_booked(bitmap: bytes, seat_no: int) -> bool:
+    return bool(_to_int(bitmap) >> (seat_no - 1) & 1)
+
+def book(bitmap: bytes, seat_no: int, total_seats: int) -> bytes:
+    return _to_bytes(_to_int(bitmap) | (1 << (seat_no - 1)), total_seats)
+
+def release(bitmap: bytes, seat_no: int, total_seats: int) -> bytes:
+    return _to_bytes(_to_int(bitmap) & ~(1 << (seat_no - 1)), total_seats)
+
+def first_free(bitmap: bytes, total_seats: int):
+    """Lowest free seat number, or None when the bus is full."""
+    n = _to_int(bitmap)
+    seat = (~n & (n + 1)).bit_length()    # isolate lowest zero bit
+    return seat if seat <= total_seats else None
+
+def free_seats(bitmap: bytes, total_seats: int, count: int):
+    """
+    `count` free seat numbers, adjacent when such a run exists (lowest run wins),
+    otherwise the lowest free seats. None when fewer than `count` seats are free.
+    """
+    free = ~_to_int(bitmap) & ((1 << total_seats) - 1)
+    run = free
+    for i in range(1, count):
+        run &= free >> i          # bit k survives only if seats k+1..k+count are all free
+    if run:
+        start = (run & -run).bit_length()
+        return list(range(start, start + count))
+    seats = []
+    while free and len(seats) < count:
+        low = free & -free
+        seats.append(low.bit_length())
+        free ^= low
+    return seats if len(seats) == count else None
+
+def book_many(bitmap: bytes, seats, total_seats: int) -> bytes:
+    n = _to_int(bitmap)
+    for s in seats:
+        n |= 1 << (s - 1)
+    return _to_bytes(n, total_seats)
+
+def booked_count(bitmap: bytes) -> int:
+    return bin(_to_int(bitmap)).count("1")
+
+def booked_list(bitmap: bytes):
+    n = _to_int(bitmap)
+    seats = []
+    while n:
+        low = n & -n
+        seats.append(low.bit_length())
+        n ^= low
+    return seats
+
+def from_seats(seats, total_seats: int) -> bytes:
+    n = 0
+    for s in seats:
+        n |= 1 << (s - 1)
+    return _to_bytes(n, total_seats)
@@ -0,0 +1,223 @@
+# server.py
+"""
+HTTP/JSON front-end for api.py.
+
+    python server.py [--host 0.0.0.0] [--port 8080] [--workers 64]
+
+Requests are handled by a fixed pool of worker threads. At most
+SERVER_QUEUE accepted connections wait for a worker; beyond that the server
+stops accepting, so a burst waits in the kernel's listen backlog (and is
+refused once that is full) instead of piling up as open sockets. DB
+work is further bounded by the connection pool in db_config: a request that
+cannot get a connection within DB_POOL_TIMEOUT gets 503. Password hashing runs
+in hashing.py's process pool and does not occupy a connection.
+
+Authenticated calls send the token from POST /login as
+`Authorization: Bearer <token>`. Bodies and responses are JSON; errors are
+{"error": message} with a 4xx/5xx status.
+
+SIGINT/SIGTERM stop accepting connections, let in-flight requests finish and
+then close the DB pool.
+
+GET /metrics returns the process metrics (metrics.py) in Prometheus text
+format for a local scraper; like /health it needs no token.
+"""
+import argparse
+import json
+import re
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+import api
+import metrics
+from db_config import init_db, close_pool
+
+SERVER_WORKERS = 64
+SERVER_BACKLOG = 256
+SERVER_QUEUE = 16             # accepted connections waiting for a worker
+REQUEST_TIMEOUT = 30          # seconds a client may take to send its request
+MAX_BODY = 64 * 1024
+
+
+# (method, path pattern, handler(token, params) -> dict); path groups are added to params
+ROUTES = [
+    ("GET", r"/health", lambda tok, p: {"status": "ok"}),
+    ("GET", r"/metrics", lambda tok, p: metrics.render()),
+    ("POST", r"/register", lambda tok, p: api.register(p.get("username"), p.get("password"))),
+    ("POST", r"/login", lambda tok, p: api.login(p.get("username"), p.get("password"))),
+    ("POST", r"/logout", lambda tok, p: api.logout(tok)),
+    ("POST", r"/password", lambda tok, p: api.change_password(tok, p.get("old_password"), p.get("new_password"))),
+    ("GET", r"/wallet", lambda tok, p: api.get_wallet(tok)),
+    ("POST", r"/wallet/topup", lambda tok, p: api.add_funds(tok, p.get("amount"))),
+    ("GET", r"/buses", lambda tok, p: api.search(p.get("origin"), p.get("destination"), p.get("depart_after"),
+                                                 p.get("depart_before"), p.get("price_min"), p.get("price_max"),
+                                                 p.get("min_seats"), p.get("travel_date"), p.get("limit"))),
+    ("GET", r"/cities", lambda tok, p: api.suggest_cities(p.get("prefix"))),
+    ("GET", r"/buses/(?P<bus_id>\d+)/seats", lambda tok, p: api.seat_map(p["bus_id"], p.get("travel_date"))),
+    ("POST", r"/tickets", lambda tok, p: api.book(tok, p.get("bus_id"), p.get("seats"), p.get("travel_date"),
+                                                  p.get("pay_from_wallet", True))),
+    ("GET", r"/tickets", lambda tok, p: api.my_tickets(tok, p.get("archived"))),
+    ("GET", r"/tickets/(?P<ticket_no>[A-Za-z0-9-]+)", lambda tok, p: api.find_ticket(tok, p["ticket_no"])),
+    ("POST", r"/tickets/(?P<ticket_id>\d+)/cancel", lambda tok, p: api.cancel(tok, p["ticket_id"])),
+    ("GET", r"/admin/stats", lambda tok, p: api.admin_stats(tok)),
+    ("GET", r"/admin/metrics", lambda tok, p: api.admin_metrics(tok)),
+    ("POST", r"/admin/buses", lambda tok, p: api.add_bus(tok, p.get("route"), p.get("total_seats"), p.get("price", 100),
+                                                         p.get("departure_time"), p.get("arrival_time"),
+                                                         p.get("description"), p.get("bus_code"))),
+    ("POST", r"/admin/buses/import", lambda tok, p: api.import_fleet(tok, p.get("rows"), p.get("dry_run", False))),
+    ("PATCH", r"/admin/buses/(?P<bus_id>\d+)", lambda tok, p: api.update_bus(tok, p["bus_id"], p.get("route"), p.get("price"),
+                                                                            p.get("total_seats"), p.get("departure_time"),
+                                                                            p.get("arrival_time"))),
+    ("DELETE", r"/admin/buses/(?P<bus_id>\d+)", lambda tok, p: api.delete_bus(tok, p["bus_id"])),
+    ("GET", r"/admin/tickets", lambda tok, p: api.admin_tickets(tok, p.get("cursor"), p.get("limit"), p.get("status"),
+                                                                p.get("bus_id"), p.get("date_from"), p.get("date_to"))),
+    ("GET", r"/admin/buses/(?P<bus_id>\d+)/manifest", lambda tok, p: api.admin_manifest(tok, p["bus_id"], p.get("travel_date"))),
+    ("GET", r"/admin/users", lambda tok, p: api.admin_users(tok, p.get("cursor"), p.get("limit"))),
+]
+_ROUTES = [(method, re.compile(pattern + r"/?\Z"), handler) for method, pattern, handler in ROUTES]
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "BusTickets/1.0"
+    timeout = REQUEST_TIMEOUT
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def do_PATCH(self):
+        self._dispatch()
+
+    def do_DELETE(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        matched_path = False
+        for method, pattern, handler in _ROUTES:
+            m = pattern.match(url.path)
+            if not m:
+                continue
+            matched_path = True
+            if method != self.command:
+                continue
+            try:
+                params = dict(parse_qsl(url.query))
+                params.update(self._body())
+                params.update(m.groupdict())
+                self._send(200, api.call(handler, self._token(), params))
+            except api.ApiError as e:
+                self._send(e.status, {"error": e.message})
+            except Exception as e:
+                self.log_error("unhandled error on %s %s: %r", self.command, url.path, e)
+                self._send(500, {"error": "Internal error."})
+            return
+        self._send(405 if matched_path else 404, {"error": "Method not allowed." if matched_path else "Not found."})
+
+    def _token(self):
+        auth = self.headers.get("Authorization", "")
+        return auth[7:].strip() if auth.startswith("Bearer ") else None
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        if length > MAX_BODY:
+            raise api.ApiError(413, "Request body too large.")
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise api.ApiError(400, "Body must be JSON.")
+        if not isinstance(body, dict):
+            raise api.ApiError(400, "Body must be a JSON object.")
+        return body
+
+    def _send(self, status: int, payload):
+        if isinstance(payload, str):   # /metrics
+            data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            data, content_type = json.dumps(payload, default=api.jsonable).encode("utf-8"), "application/json; charset=utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTPServer that handles each connection on a fixed-size thread pool, with at
+    most workers + queue connections accepted at a time.
+    """
+    request_queue_size = SERVER_BACKLOG
+
+    def __init__(self, address, handler, workers: int = SERVER_WORKERS, queue: int = SERVER_QUEUE):
+        super().__init__(address, handler)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        self._slots = threading.BoundedSemaphore(workers + queue)
+
+    def get_request(self):
+        # a slot before accept(): with none free, new connections stay in the listen backlog
+        if not self._slots.acquire(timeout=0.05):
+            raise OSError("no free connection slot")   # serve_forever() checks for shutdown and retries
+        try:
+            return super().get_request()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def shutdown_request(self, request):
+        # called exactly once for every accepted connection, whichever way it ends
+        try:
+            super().shutdown_request(request)
+        finally:
+            self._slots.release()
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)   # let in-flight requests finish
+
+
+def serve(host: str = "127.0.0.1", port: int = 8080, workers: int = SERVER_WORKERS):
+    init_db()
+    httpd = PooledHTTPServer((host, port), Handler, workers)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it can't run on this thread
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Serving on http://{host}:{port} with {workers} workers")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        close_pool()
+        print("Server stopped.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bus ticket HTTP/JSON server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    args = parser.parse_args(sys.argv[1:])
+    serve(args.host, args.port, args.workers)
@@ -0,0 +1,89 @@
+# sessions.py
+"""
+Login sessions and the in-memory user cache.
+
+A successful login issues an opaque token (valid SESSION_TTL seconds) that a
+front-end can present on later requests instead of re-sending the password.
+User records (role, wallet snapshot) are kept in an LRU cache so authenticated
+requests don't re-query `users`. Anything that changes a user's wallet or
+password must call invalidate_user(); USER_CACHE_TTL bounds staleness when
+another process made the change.
+
+Both stores are per process.
+"""
+import secrets
+import threading
+
+from cache import TTLCache
+from db_config import get_conn
+import wallet
+
+SESSION_TTL = 8 * 3600       # seconds
+SESSION_MAX = 100_000
+USER_CACHE_SIZE = 10_000
+USER_CACHE_TTL = 60          # seconds
+
+_sessions = TTLCache(maxsize=SESSION_MAX, ttl=SESSION_TTL)   # token -> {"user_id", "role"}
+_users = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+_tokens_by_user = {}
+_lock = threading.Lock()
+
+
+# ------------- sessions -------------
+def create_session(user_id: int, role: str) -> str:
+    token = secrets.token_urlsafe(32)
+    _sessions.set(token, {"user_id": user_id, "role": role})
+    with _lock:
+        live = {t for t in _tokens_by_user.get(user_id, ()) if _sessions.get(t) is not None}
+        live.add(token)
+        _tokens_by_user[user_id] = live
+    return token
+
+def get_session(token: str):
+    """Returns {"user_id", "role"} for a live token, else None."""
+    if not token:
+        return None
+    return _sessions.get(token)
+
+def end_session(token: str):
+    s = _sessions.pop(token)
+    if s:
+        with _lock:
+            _tokens_by_user.get(s["user_id"], set()).discard(token)
+
+def end_user_sessions(user_id: int, keep: str = None):
+    """Revokes every session of a user (except `keep`), e.g. after a password change."""
+    with _lock:
+        tokens = _tokens_by_user.pop(user_id, set())
+        if keep in tokens:
+            _tokens_by_user[user_id] = {keep}
+    for t in tokens:
+        if t != keep:
+            _sessions.invalidate(t)
+
+
+# ------------- user cache -------------
+def _load_user(user_id: int):
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, username, is_admin FROM users WHERE id=%s", (user_id,))
+            r = cur.fetchone()
+            if r:
+                r['wallet'] = wallet.balance(cur, user_id)
+    finally:
+        conn.close()
+    if not r:
+        return None
+    r['role'] = "admin" if r['is_admin'] else "user"
+    return r
+
+def get_user(user_id: int):
+    """Cached user record: id, username, is_admin, role, wallet (snapshot)."""
+    return _users.get_or_load(user_id, lambda: _load_user(user_id))
+
+def invalidate_user(user_id: int):
+    _users.invalidate(user_id)
+
+def cache_stats() -> dict:
+    return {"sessions": _sessions.stats(), "users": _users.stats()}
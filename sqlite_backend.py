@@ -0,0 +1,359 @@
+# sqlite_backend.py
+"""
+Embedded SQLite storage for single-node deployments (BUS_DB_BACKEND=sqlite).
+
+    BUS_DB_BACKEND=sqlite BUS_DB_PATH=/var/lib/bus/bus.sqlite3 python server.py
+
+connect() returns a connection that looks like the pymysql one the rest of the
+code was written against:
+- cursors return rows as dicts and take MySQL SQL with %s placeholders;
+  translate() rewrites the few MySQL-only constructs in use (INSERT IGNORE,
+  ON DUPLICATE KEY UPDATE, CURDATE(), LIKE's backslash escape, table options)
+  and caches the result, so each statement text is translated once and then
+  hits sqlite3's prepared statement cache
+- errors are raised as the pymysql exceptions with the MySQL error codes the
+  callers test for (ER_DUP_ENTRY naming the unique index, 1205 when the
+  database stays locked past the busy timeout, 1146 for a missing table)
+- DATE, TIME and TIMESTAMP columns come back as date, timedelta and datetime
+
+Concurrency: WAL journal, so readers never block the writer or each other.
+There are no row locks; a transaction that starts with a write or a locking
+read (FOR UPDATE / LOCK IN SHARE MODE) takes the database write lock up front
+(BEGIN IMMEDIATE), waiting up to SQLITE_BUSY_TIMEOUT for it. A transaction
+that starts with a plain read and writes later may find that someone else
+wrote in between; that surfaces as 1205 and run_transaction retries it, as it
+does for an InnoDB deadlock. db_config keeps one connection per thread.
+
+SQLite has no session variables: SET statements are ignored.
+
+SQLite has no replication. To try the replica routing in db_config locally,
+keep a copy refreshed from the primary and list it in BUS_DB_REPLICAS:
+
+    python sqlite_backend.py bus.sqlite3 replica.sqlite3 --every 2
+"""
+import datetime
+import re
+import sqlite3
+import sys
+import time
+from functools import lru_cache
+
+import pymysql
+
+import metrics
+
+SQLITE_BUSY_TIMEOUT = 5.0        # seconds to wait for the write lock
+SQLITE_CACHED_STATEMENTS = 512   # prepared statements kept per connection
+SQLITE_CACHE_KB = 16384          # page cache per connection
+
+ER_DUP_ENTRY = 1062
+ER_BAD_NULL_ERROR = 1048
+ER_NO_REFERENCED_ROW = 1452
+ER_CHECK_CONSTRAINT_VIOLATED = 3819
+ER_PARSE_ERROR = 1064
+ER_NO_SUCH_TABLE = 1146
+ER_LOCK_WAIT_TIMEOUT = 1205
+CR_CONNECTION_ERROR = 2002
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+# ------------- value conversion -------------
+def _decode(convert):
+    def converter(raw: bytes):
+        text = raw.decode()
+        try:
+            return convert(text)
+        except ValueError:
+            return text
+    return converter
+
+def _parse_time(text: str) -> datetime.timedelta:
+    h, m, s = (text.split(":") + ["0", "0"])[:3]
+    sign = -1 if h.startswith("-") else 1
+    return sign * datetime.timedelta(hours=abs(int(h)), minutes=int(m), seconds=float(s))
+
+def _format_timedelta(value: datetime.timedelta) -> str:
+    seconds = int(value.total_seconds())
+    sign, seconds = ("-" if seconds < 0 else ""), abs(seconds)
+    return f"{sign}{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+# same text formats MySQL uses, so stored values compare and sort correctly as strings
+sqlite3.register_adapter(datetime.date, lambda v: v.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda v: v.isoformat(" ", "seconds"))
+sqlite3.register_adapter(datetime.time, lambda v: v.isoformat("seconds"))
+sqlite3.register_adapter(datetime.timedelta, _format_timedelta)
+sqlite3.register_converter("DATE", _decode(datetime.date.fromisoformat))
+sqlite3.register_converter("TIMESTAMP", _decode(datetime.datetime.fromisoformat))
+sqlite3.register_converter("DATETIME", _decode(datetime.datetime.fromisoformat))
+sqlite3.register_converter("TIME", _decode(_parse_time))
+
+
+# ------------- SQL translation -------------
+_PLACEHOLDER = re.compile(r"%([s%])")
+_LOCKING_READ = re.compile(r"\s+(?:FOR\s+UPDATE|LOCK\s+IN\s+SHARE\s+MODE)\b", re.I)
+_UPSERT = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I)
+_VALUES_REF = re.compile(r"\bVALUES\((\w+)\)", re.I)
+_LIKE = re.compile(r"\bLIKE\s+(?:\?|'(?:[^']|'')*')(?!\s+ESCAPE\b)", re.I)
+_REWRITES = (
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bCURDATE\(\)", re.I), "date('now','localtime')"),
+    (re.compile(r"\bNOW\(\)", re.I), "datetime('now','localtime')"),
+    (re.compile(r"\)\s*ENGINE\s*=\s*\w+", re.I), ")"),
+)
+_READS = ("SELECT", "WITH", "EXPLAIN")
+
+@lru_cache(maxsize=2048)
+def translate(sql: str, has_args: bool = True):
+    """
+    (sqlite_sql, mode) for a MySQL statement; mode is "read", "lock" (locking
+    read), "write", "pragma" or "skip" (nothing to run).
+    """
+    verb = (sql.split(None, 1) or [""])[0].upper()
+    if verb == "SET":
+        return None, "skip"
+    if has_args:   # pymysql only interpolates (and unescapes %%) when args are given
+        sql = _PLACEHOLDER.sub(lambda m: "?" if m.group(1) == "s" else "%", sql)
+    locking = bool(_LOCKING_READ.search(sql))
+    sql = _LOCKING_READ.sub("", sql)
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+    upsert = _UPSERT.search(sql)
+    if upsert:
+        sql = sql[:upsert.start()] + "ON CONFLICT DO UPDATE SET" + _VALUES_REF.sub(r"excluded.\1", sql[upsert.end():])
+    # MySQL's LIKE escapes with a backslash by default; SQLite's has no escape character
+    sql = _LIKE.sub(lambda m: m.group(0) + " ESCAPE '\\'", sql)
+    if verb == "PRAGMA":
+        return sql, "pragma"
+    if verb in _READS or verb.startswith("("):
+        return sql, "lock" if locking else "read"
+    return sql, "write"
+
+def _params(args):
+    if args is None:
+        return ()
+    if isinstance(args, (tuple, list)):
+        return tuple(args)
+    if isinstance(args, dict):
+        raise pymysql.err.ProgrammingError(ER_PARSE_ERROR, "named %(name)s parameters are not supported on SQLite")
+    return (args,)
+
+def _literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return "X'" + bytes(value).hex() + "'"
+    if isinstance(value, datetime.timedelta):
+        value = _format_timedelta(value)
+    elif isinstance(value, datetime.datetime):
+        value = value.isoformat(" ", "seconds")
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+# ------------- errors -------------
+_unique_keys = {}   # (table, columns) -> index name
+
+def _unique_key(raw, table: str, columns: tuple) -> str:
+    key = (table, columns)
+    if key not in _unique_keys:
+        name = "PRIMARY"
+        try:
+            for index in raw.execute(f"PRAGMA index_list({table})").fetchall():
+                if not index["unique"]:
+                    continue
+                cols = tuple(c["name"] for c in raw.execute(f"PRAGMA index_info({index['name']})").fetchall())
+                if cols == columns:
+                    name = "PRIMARY" if index["origin"] == "pk" else index["name"]
+                    break
+        except sqlite3.Error:
+            pass
+        _unique_keys[key] = name
+    return _unique_keys[key]
+
+def _mysql_error(raw, e: sqlite3.Error):
+    """The pymysql exception (with MySQL error code) callers expect for a sqlite3 error."""
+    msg = str(e)
+    primary = (getattr(e, "sqlite_errorcode", 0) or 0) & 0xFF
+    if isinstance(e, sqlite3.IntegrityError):
+        if msg.startswith("UNIQUE constraint failed: "):
+            qualified = [c.strip() for c in msg.split(": ", 1)[1].split(",")]
+            table = qualified[0].split(".")[0]
+            index = _unique_key(raw, table, tuple(c.split(".", 1)[-1] for c in qualified))
+            return pymysql.err.IntegrityError(ER_DUP_ENTRY, f"Duplicate entry for key '{table}.{index}' ({msg})")
+        if msg.startswith("NOT NULL"):
+            return pymysql.err.IntegrityError(ER_BAD_NULL_ERROR, msg)
+        if msg.startswith("FOREIGN KEY"):
+            return pymysql.err.IntegrityError(ER_NO_REFERENCED_ROW, msg)
+        return pymysql.err.IntegrityError(ER_CHECK_CONSTRAINT_VIOLATED, msg)
+    if primary in (SQLITE_BUSY, SQLITE_LOCKED) or "database is locked" in msg or "database table is locked" in msg:
+        return pymysql.err.OperationalError(ER_LOCK_WAIT_TIMEOUT, f"Lock wait timeout exceeded ({msg})")
+    if msg.startswith("no such table"):
+        return pymysql.err.ProgrammingError(ER_NO_SUCH_TABLE, msg)
+    if isinstance(e, (sqlite3.ProgrammingError, sqlite3.InterfaceError)) or (
+            isinstance(e, sqlite3.OperationalError) and ("syntax error" in msg or msg.startswith("no such"))):
+        return pymysql.err.ProgrammingError(ER_PARSE_ERROR, msg)
+    return pymysql.err.OperationalError(CR_CONNECTION_ERROR, msg)
+
+
+# ------------- connection & cursor -------------
+def _dict_row(cursor, row):
+    return dict(zip([d[0] for d in cursor.description], row))
+
+
+class Cursor:
+    """DB-API cursor with pymysql DictCursor behaviour over a sqlite3 cursor."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cur = connection._raw.cursor()
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def execute(self, query, args=None):
+        sql, mode = translate(query, args is not None)
+        if mode == "skip":
+            return 0
+        self.connection._begin(mode)
+        try:
+            self._cur.execute(sql, _params(args))
+        except sqlite3.Error as e:
+            raise _mysql_error(self.connection._raw, e) from e
+        return max(self._cur.rowcount, 0)
+
+    def executemany(self, query, args):
+        sql, mode = translate(query, True)
+        if mode == "skip":
+            return 0
+        self.connection._begin(mode)
+        try:
+            self._cur.executemany(sql, [_params(a) for a in args])
+        except sqlite3.Error as e:
+            raise _mysql_error(self.connection._raw, e) from e
+        return max(self._cur.rowcount, 0)
+
+    def mogrify(self, query, args=None) -> str:
+        if args is None:
+            return query
+        return query % tuple(_literal(a) for a in _params(args))
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cur.fetchmany(size or self._cur.arraysize)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class InstrumentedCursor(metrics.InstrumentedMixin, Cursor):
+    pass
+
+
+class Connection:
+    """pymysql-style connection (explicit commit/rollback) over sqlite3."""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    @property
+    def open(self) -> bool:
+        return self._raw is not None
+
+    def _begin(self, mode: str):
+        if mode == "pragma" or self._raw.in_transaction:
+            return
+        try:
+            self._raw.execute("BEGIN IMMEDIATE" if mode in ("lock", "write") else "BEGIN")
+        except sqlite3.Error as e:
+            raise _mysql_error(self._raw, e) from e
+
+    def cursor(self, cursorclass=None):
+        # every SQLite cursor streams, so pymysql's SSCursor needs no counterpart
+        return InstrumentedCursor(self)
+
+    def commit(self):
+        if self._raw.in_transaction:
+            try:
+                self._raw.execute("COMMIT")
+            except sqlite3.Error as e:
+                raise _mysql_error(self._raw, e) from e
+
+    def rollback(self):
+        if self._raw.in_transaction:
+            self._raw.execute("ROLLBACK")
+
+    def ping(self, reconnect=False):
+        self._raw.execute("SELECT 1").fetchone()
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            raw.close()
+
+
+def connect(path: str) -> Connection:
+    raw = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False,
+                          detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=SQLITE_CACHED_STATEMENTS)
+    raw.row_factory = _dict_row
+    try:
+        raw.execute("PRAGMA journal_mode = WAL")
+        raw.execute("PRAGMA synchronous = NORMAL")   # durable at checkpoints; a power cut may lose the last commits
+        raw.execute("PRAGMA foreign_keys = ON")
+        raw.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+        raw.execute("PRAGMA temp_store = MEMORY")
+    except sqlite3.Error as e:
+        raw.close()
+        raise _mysql_error(raw, e) from e
+    return Connection(raw)
+
+
+def snapshot(source: str, target: str):
+    """Copies the committed state of `source` into `target` (online backup API)."""
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Refresh a copy of a SQLite database, like a lagging replica.")
+    ap.add_argument("source")
+    ap.add_argument("target")
+    ap.add_argument("--every", type=float, default=0, help="repeat every N seconds (default: copy once)")
+    a = ap.parse_args()
+    while True:
+        snapshot(a.source, a.target)
+        if not a.every:
+            sys.exit(0)
+        time.sleep(a.every)
@@ -0,0 +1,149 @@
+# stats.py
+"""
+Incrementally maintained counters for the admin dashboard.
+
+stats_counters holds the global counters (users, buses, active tickets,
+revenue) and route_stats the active tickets per route. Every counter is split
+over STATS_SHARDS rows so that concurrent bookings update different rows
+instead of queueing on one. Writers call bump()/bump_route() inside their own
+transaction, as late as possible, so a counter changes exactly when the data
+it counts does. read() sums a few dozen rows per counter (plus a few per
+route); its cost does not depend on how many users or tickets exist.
+
+reconcile() recomputes everything from the base tables, reports drift and
+corrects it.
+"""
+import random
+import sys
+
+from db_config import get_conn, get_read_conn
+
+STATS_SHARDS = 16
+COUNTERS = ("active_tickets", "buses", "revenue", "users")   # sorted: also the lock order
+
+
+def bump(cur, **deltas):
+    """bump(cur, active_tickets=1, revenue=250); zero deltas are skipped."""
+    shard = random.randrange(STATS_SHARDS)
+    for name in sorted(deltas):
+        if deltas[name]:
+            cur.execute("UPDATE stats_counters SET value = value + %s WHERE name=%s AND shard=%s",
+                        (deltas[name], name, shard))
+
+def bump_route(cur, route: str, delta: int, shard: int = None):
+    if delta:
+        cur.execute("""
+            INSERT INTO route_stats (route, shard, active_tickets) VALUES (%s,%s,%s)
+            ON DUPLICATE KEY UPDATE active_tickets = active_tickets + VALUES(active_tickets)
+        """, (route, random.randrange(STATS_SHARDS) if shard is None else shard, delta))
+
+def _read(cur) -> dict:
+    cur.execute("SELECT name, SUM(value) AS v FROM stats_counters GROUP BY name")
+    values = {name: 0 for name in COUNTERS}
+    values.update({r['name']: int(r['v']) for r in cur.fetchall()})
+    cur.execute("""
+        SELECT route, SUM(active_tickets) AS cnt FROM route_stats
+        GROUP BY route HAVING cnt > 0 ORDER BY cnt DESC LIMIT 1
+    """)
+    top = cur.fetchone()
+    values['top_route'] = top['route'] if top else None
+    return values
+
+def read() -> dict:
+    """Current counters; may lag the primary by DB_REPLICA_MAX_LAG (read from a replica)."""
+    conn = get_read_conn()
+    try:
+        with conn.cursor() as cur:
+            return _read(cur)
+    finally:
+        conn.close()
+
+
+# ------------- rebuild / reconcile -------------
+def _actual(cur) -> dict:
+    cur.execute("SELECT COUNT(*) AS n FROM users")
+    users = cur.fetchone()['n']
+    cur.execute("SELECT COUNT(*) AS n FROM buses")
+    buses = cur.fetchone()['n']
+    cur.execute("SELECT COUNT(*) AS n, IFNULL(SUM(price_paid), 0) AS revenue FROM tickets WHERE status='ACTIVE'")
+    r = cur.fetchone()
+    cur.execute("""
+        SELECT b.route, COUNT(*) AS cnt
+        FROM tickets t JOIN buses b ON t.bus_id=b.id
+        WHERE t.status='ACTIVE'
+        GROUP BY b.route
+    """)
+    routes = {x['route']: x['cnt'] for x in cur.fetchall()}
+    # archived tickets still count (archive.py moves them without touching the counters)
+    import archive   # archive imports this module
+    archived, archived_revenue, archived_routes = archive.counts(cur)
+    for route, cnt in archived_routes.items():
+        routes[route] = routes.get(route, 0) + cnt
+    return {"users": users, "buses": buses, "active_tickets": r['n'] + archived,
+            "revenue": int(r['revenue']) + archived_revenue}, routes
+
+def seed_shards(cur):
+    cur.executemany("INSERT IGNORE INTO stats_counters (name, shard, value) VALUES (%s,%s,0)",
+                    [(name, shard) for name in COUNTERS for shard in range(STATS_SHARDS)])
+
+def rebuild(cur):
+    """Overwrites all counters with freshly computed values (no concurrent writers expected)."""
+    seed_shards(cur)
+    actual, routes = _actual(cur)
+    cur.execute("UPDATE stats_counters SET value = 0")
+    cur.executemany("UPDATE stats_counters SET value=%s WHERE name=%s AND shard=0",
+                    [(actual[name], name) for name in COUNTERS])
+    cur.execute("DELETE FROM route_stats")
+    if routes:
+        cur.executemany("INSERT INTO route_stats (route, shard, active_tickets) VALUES (%s,0,%s)", list(routes.items()))
+
+def reconcile(fix: bool = True) -> dict:
+    """
+    Recomputes all counters from the base tables and returns the drift found
+    ({counter or "route:<name>": counted - actual}). With fix=True the drift is
+    corrected by applying the difference, so bumps committed meanwhile are kept.
+    """
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            # one transaction: counters and base tables are read from the same snapshot
+            seed_shards(cur)
+            conn.commit()
+            actual, routes = _actual(cur)
+            cur.execute("SELECT name, SUM(value) AS v FROM stats_counters GROUP BY name")
+            counted = {r['name']: int(r['v']) for r in cur.fetchall()}
+            cur.execute("SELECT route, SUM(active_tickets) AS cnt FROM route_stats GROUP BY route")
+            counted_routes = {r['route']: int(r['cnt']) for r in cur.fetchall()}
+
+            drift = {}
+            for name in COUNTERS:
+                d = counted.get(name, 0) - actual[name]
+                if d:
+                    drift[name] = d
+            for route in set(routes) | set(counted_routes):
+                d = counted_routes.get(route, 0) - routes.get(route, 0)
+                if d:
+                    drift["route:" + route] = d
+
+            if fix and drift:
+                for key, d in drift.items():
+                    if key.startswith("route:"):
+                        bump_route(cur, key[len("route:"):], -d, shard=0)
+                    else:
+                        cur.execute("UPDATE stats_counters SET value = value - %s WHERE name=%s AND shard=0", (d, key))
+                cur.execute("DELETE FROM route_stats WHERE active_tickets = 0")
+                conn.commit()
+    finally:
+        conn.close()
+    return drift
+
+
+if __name__ == "__main__":
+    fix = "--check" not in sys.argv[1:]
+    drift = reconcile(fix=fix)
+    if not drift:
+        print("Stats counters are consistent.")
+    else:
+        for key, d in sorted(drift.items()):
+            print(f"{key}: off by {d:+d}")
+        print("Corrected." if fix else "Not corrected (--check).")
@@ -0,0 +1,150 @@
+# stress_booking.py
+"""
+Concurrency check for the booking path.
+
+Creates a throwaway bus and user, lets many threads race for its seats
+(auto-assigned and explicitly chosen, with random cancellations), then checks
+that no seat was sold twice and that the counters still agree:
+
+    python stress_booking.py [threads] [attempts_per_thread]
+
+Exits non-zero if any invariant is violated. Do not run against production.
+tests/test_stress_booking.py runs it under pytest.
+"""
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db_config import get_conn, hash_password
+import features
+import seat_bitmap
+import wallet
+import stats
+
+SEATS = 40
+DATES = [None, "2030-01-01", "2030-01-02"]
+
+
+def _setup():
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO buses (route, total_seats, price) VALUES (%s,%s,%s)",
+                        ("Stress → Test", SEATS, 1))
+            bus_id = cur.lastrowid
+            pwd_hash, salt = hash_password("stress")
+            cur.execute("INSERT INTO users (username, password_hash, salt) VALUES (%s,%s,%s)",
+                        (f"stress_{bus_id}_{int(time.time())}", pwd_hash, salt))
+            user_id = cur.lastrowid
+            wallet.credit(cur, user_id, 10 ** 9, wallet.TOPUP)
+            stats.bump(cur, users=1, buses=1)
+        conn.commit()
+        return bus_id, user_id
+    finally:
+        conn.close()
+
+def _teardown(bus_id, user_id):
+    features.delete_bus(bus_id)   # also takes the bus's tickets out of the stats
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE id=%s", (user_id,))
+            stats.bump(cur, users=-1)
+        conn.commit()
+    finally:
+        conn.close()
+
+def check_invariants(bus_id, user_id=None):
+    """Returns a list of human-readable violations (empty when consistent)."""
+    problems = []
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT seat_no, travel_date, COUNT(*) AS cnt FROM tickets
+                WHERE bus_id=%s AND status='ACTIVE'
+                GROUP BY seat_no, travel_date HAVING COUNT(*) > 1
+            """, (bus_id,))
+            for r in cur.fetchall():
+                problems.append(f"seat {r['seat_no']} ({r['travel_date']}) sold {r['cnt']} times")
+            cur.execute("""
+                SELECT IFNULL(travel_date, %s) AS d, COUNT(*) AS cnt FROM tickets
+                WHERE bus_id=%s AND status='ACTIVE' GROUP BY d
+            """, (seat_bitmap.UNDATED, bus_id))
+            active = {str(r['d']): r['cnt'] for r in cur.fetchall()}
+            cur.execute("SELECT travel_date, occupancy, seats_booked FROM seat_inventory WHERE bus_id=%s", (bus_id,))
+            inventory = cur.fetchall()
+            for d in set(active) - {str(r['travel_date']) for r in inventory}:
+                problems.append(f"{d}: {active[d]} tickets are active but there is no seat_inventory row")
+            for r in inventory:
+                d = str(r['travel_date'])
+                n = active.get(d, 0)
+                if r['seats_booked'] > SEATS:
+                    problems.append(f"{d}: seats_booked={r['seats_booked']} exceeds {SEATS} seats")
+                if r['seats_booked'] != n:
+                    problems.append(f"{d}: seats_booked={r['seats_booked']} but {n} tickets are active")
+                if seat_bitmap.booked_count(r['occupancy']) != n:
+                    problems.append(f"{d}: bitmap marks {seat_bitmap.booked_count(r['occupancy'])} seats but {n} tickets are active")
+            if user_id is not None:
+                cur.execute("SELECT IFNULL(SUM(price_paid), 0) AS spent FROM tickets WHERE user_id=%s AND status='ACTIVE'", (user_id,))
+                expected = 10 ** 9 - int(cur.fetchone()['spent'])
+                if wallet.balance(cur, user_id) != expected:
+                    problems.append(f"wallet balance {wallet.balance(cur, user_id)} != expected {expected}")
+    finally:
+        conn.close()
+    if user_id is not None and not wallet.audit(user_id)['ok']:
+        problems.append(f"wallet snapshot disagrees with ledger: {wallet.audit(user_id)}")
+    return problems
+
+def run(threads: int = 32, attempts: int = 50):
+    """Returns (problems, results): check_invariants() output and the outcome counts."""
+    bus_id, user_id = _setup()
+    results = {"booked": 0, "rejected": 0, "cancelled": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def worker(_):
+        for _ in range(attempts):
+            seat = random.choice([0, random.randint(1, SEATS)])
+            ok, msg, info = features.create_ticket(user_id, bus_id, seat, travel_date=random.choice(DATES), pay_from_wallet=True)
+            with lock:
+                if ok:
+                    results["booked"] += 1
+                elif msg.startswith("Error"):
+                    results["errors"] += 1
+                else:
+                    results["rejected"] += 1
+            if ok and random.random() < 0.3:
+                tickets = [t for t in features.get_user_tickets(user_id) if t['status'] == 'ACTIVE']
+                if tickets:
+                    ok, _ = features.cancel_user_ticket(user_id, random.choice(tickets)['id'])
+                    if ok:
+                        with lock:
+                            results["cancelled"] += 1
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, range(threads)))
+        elapsed = time.perf_counter() - started
+        problems = check_invariants(bus_id, user_id)
+    finally:
+        _teardown(bus_id, user_id)
+
+    total = threads * attempts
+    print(f"{total} booking attempts from {threads} threads in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    print(f"booked={results['booked']} rejected={results['rejected']} cancelled={results['cancelled']} errors={results['errors']}")
+    return problems, results
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    attempts = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    problems, _ = run(threads, attempts)
+    if problems:
+        print("INVARIANTS VIOLATED:")
+        for p in problems:
+            print("  " + p)
+        sys.exit(1)
+    print("No double bookings; counters consistent.")
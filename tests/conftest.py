@@ -0,0 +1,46 @@
+# conftest.py
+"""
+The tests run against a real database, never a mock.
+
+BUS_DB_BACKEND picks it like it does for the application. When it is unset,
+a reachable MySQL server (BUS_DB_HOST etc.) is used with a scratch database,
+BUS_DB_NAME defaulting to bus_system_test; without one, the tests fall back
+to a fresh SQLite file. Settings are read when db_config is first imported,
+so they are fixed here, before any test module imports it.
+"""
+import os
+import sys
+import tempfile
+
+import pymysql
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _mysql_reachable() -> bool:
+    try:
+        pymysql.connect(host=os.environ.get("BUS_DB_HOST", "localhost"), port=int(os.environ.get("BUS_DB_PORT", 3306)),
+                        user=os.environ.get("BUS_DB_USER", "root"), password=os.environ.get("BUS_DB_PASS", "1234"),
+                        connect_timeout=2).close()
+        return True
+    except pymysql.err.MySQLError:
+        return False
+
+
+if "BUS_DB_BACKEND" not in os.environ:
+    if _mysql_reachable():
+        os.environ["BUS_DB_BACKEND"] = "mysql"
+        os.environ.setdefault("BUS_DB_NAME", "bus_system_test")
+    else:
+        os.environ["BUS_DB_BACKEND"] = "sqlite"
+        os.environ["BUS_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bus_tests_"), "bus.sqlite3")
+
+
+@pytest.fixture(scope="session")
+def db():
+    """Schema at the latest migration; yields db_config."""
+    import db_config
+    db_config.init_db()
+    yield db_config
+    db_config.close_pool()
@@ -0,0 +1,47 @@
+# test_archive.py
+"""Archived tickets stay findable and listed with include_archived."""
+import datetime
+
+import archive
+import features
+import stats
+import stress_booking
+from db_config import get_conn
+
+
+def test_user_with_only_archived_tickets(db):
+    bus_id, user_id = stress_booking._setup()
+    try:
+        future = (datetime.date.today() + datetime.timedelta(days=3)).isoformat()
+        past = (datetime.date.today() - datetime.timedelta(days=3)).isoformat()
+        ok, msg, _ = features.create_tickets_bulk(user_id, bus_id, 2, future)
+        assert ok, msg
+        conn = get_conn()
+        try:
+            with conn.cursor() as cur:
+                # the trip has happened: no live ticket is left once it is archived
+                cur.execute("UPDATE tickets SET travel_date=%s WHERE bus_id=%s", (past, bus_id))
+                cur.execute("UPDATE seat_inventory SET travel_date=%s WHERE bus_id=%s", (past, bus_id))
+            conn.commit()
+        finally:
+            conn.close()
+        ticket_nos = sorted(t['ticket_no'] for t in features.get_user_tickets(user_id))
+        assert archive.archive_tickets(days=0, pause=0)["tickets"] >= 2
+
+        assert features.get_user_tickets(user_id) == []
+        archived = features.get_user_tickets(user_id, include_archived=True)
+        assert sorted(t['ticket_no'] for t in archived) == ticket_nos
+        found = features.find_ticket(ticket_nos[0].lower())
+        assert found['ticket_no'] == ticket_nos[0] and found['archived_at'] is not None
+    finally:
+        stress_booking._teardown(bus_id, user_id)
+        conn = get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM ticket_history_archive WHERE ticket_id IN "
+                            "(SELECT id FROM tickets_archive WHERE bus_id=%s)", (bus_id,))
+                cur.execute("DELETE FROM tickets_archive WHERE bus_id=%s", (bus_id,))
+            conn.commit()
+        finally:
+            conn.close()
+        stats.reconcile()   # the counters still held the archived tickets
@@ -0,0 +1,40 @@
+# test_batch.py
+"""Batch session names are bound to login lines in input order."""
+import io
+import json
+import time
+
+import api
+import batch
+import login_register
+
+
+def _run(commands, workers=4):
+    out = io.StringIO()
+    summary = batch.run_batch([json.dumps(c) for c in commands], out, workers)
+    results = {r["line"]: r for r in map(json.loads, out.getvalue().splitlines())}
+    return summary, results
+
+
+def test_sessions_resolve_to_the_earlier_login_line(db):
+    stamp = int(time.time() * 1000)
+    first, second = f"batch_a_{stamp}", f"batch_b_{stamp}"
+    summary, results = _run([
+        {"op": "register", "args": {"username": first, "password": "pw-123456"}},
+        {"op": "register", "args": {"username": second, "password": "pw-123456"}},
+    ])
+    assert summary["failed"] == 0, results
+    summary, results = _run([
+        {"op": "add_funds", "session": "s", "args": {"amount": 5}},                    # before its login
+        {"op": "login", "session": "s", "args": {"username": first, "password": "pw-123456"}},
+        {"op": "add_funds", "session": "s", "args": {"amount": 7}},
+        {"op": "login", "session": "s", "args": {"username": second, "password": "pw-123456"}},
+        {"op": "add_funds", "session": "s", "args": {"amount": 11}},
+    ])
+    assert summary["commands"] == 5
+    assert results[1]["status"] == 400 and "Unknown session" in results[1]["error"]
+    assert results[4]["status"] == 400 and "already logged in on line 2" in results[4]["error"]
+    assert results[2]["ok"] and results[3]["ok"] and results[5]["ok"]
+    first_id = results[2]["result"]["user_id"]
+    second_id = api.login(second, "pw-123456")["user_id"]
+    assert login_register.get_wallet(first_id) - login_register.get_wallet(second_id) == 18   # both top-ups, first user only
@@ -0,0 +1,24 @@
+# test_booking.py
+"""Group booking input checks."""
+import pytest
+
+import api
+import features
+import stress_booking
+
+
+@pytest.mark.parametrize("seats", [True, False, [True], [2, False]])
+def test_bulk_booking_rejects_booleans(db, seats):
+    bus_id, user_id = stress_booking._setup()
+    try:
+        ok, msg, infos = features.create_tickets_bulk(user_id, bus_id, seats)
+        assert not ok and infos is None, msg
+        assert features.get_user_tickets(user_id) == []
+    finally:
+        stress_booking._teardown(bus_id, user_id)
+
+
+def test_api_count_must_be_a_number():
+    with pytest.raises(api.ApiError) as e:
+        api._int(True, "count")
+    assert e.value.status == 400
@@ -0,0 +1,32 @@
+# test_bus_seats.py
+"""Buses are limited to the seats an occupancy bitmap can hold."""
+import features
+import fleet
+import pytest
+import seat_bitmap
+import stress_booking
+
+
+@pytest.mark.parametrize("seats", [0, -3, seat_bitmap.MAX_SEATS + 1])
+def test_add_bus_rejects_seat_counts_out_of_range(db, seats):
+    ok, msg = features.add_bus("Seat → Check", seats)
+    assert not ok and "total_seats must be between 1 and" in msg
+
+
+def test_update_bus_rejects_seat_counts_out_of_range(db):
+    bus_id, user_id = stress_booking._setup()
+    try:
+        for seats in (0, seat_bitmap.MAX_SEATS + 1):
+            ok, msg = features.update_bus(bus_id, total_seats=seats)
+            assert not ok and "total_seats must be between 1 and" in msg
+        assert features.update_bus(bus_id, total_seats=seat_bitmap.MAX_SEATS)[0]
+        # the bitmap of a full-size bus fits the column
+        ok, msg, _ = features.create_ticket(user_id, bus_id, seat_bitmap.MAX_SEATS)
+        assert ok, msg
+    finally:
+        stress_booking._teardown(bus_id, user_id)
+
+
+def test_fleet_rows_share_the_limit():
+    with pytest.raises(ValueError, match="between 1 and"):
+        fleet.validate_row({"bus_code": "X1", "route": "A → B", "total_seats": seat_bitmap.MAX_SEATS + 1, "price": 1})
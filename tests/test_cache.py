@@ -0,0 +1,49 @@
+# test_cache.py
+"""A cache load that raced with an invalidation is not stored."""
+from cache import TTLCache
+import login_register
+import sessions
+import stress_booking
+
+
+def test_invalidate_during_load_drops_the_result():
+    cache = TTLCache()
+
+    def load():
+        cache.invalidate("k")   # the data changed while this load was reading it
+        return "old"
+
+    assert cache.get_or_load("k", load) == "old"
+    assert cache.get("k") is None
+    assert cache.get_or_load("k", lambda: "new") == "new"
+    assert cache.get("k") == "new"
+
+
+def test_clear_during_load_drops_the_result():
+    cache = TTLCache()
+
+    def load():
+        cache.clear()
+        return "old"
+
+    cache.get_or_load("k", load)
+    assert cache.get("k") is None
+
+
+def test_wallet_top_up_during_user_load(db, monkeypatch):
+    bus_id, user_id = stress_booking._setup()
+    try:
+        sessions.invalidate_user(user_id)
+        load_user = sessions._load_user
+
+        def racing_load(uid):
+            record = load_user(uid)              # reads the balance before the top-up commits
+            login_register.add_funds(uid, 5)     # commits, then invalidates the user
+            return record
+
+        monkeypatch.setattr(sessions, "_load_user", racing_load)
+        stale = sessions.get_user(user_id)
+        monkeypatch.undo()
+        assert login_register.get_wallet(user_id) == stale["wallet"] + 5
+    finally:
+        stress_booking._teardown(bus_id, user_id)
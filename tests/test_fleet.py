@@ -0,0 +1,38 @@
+# test_fleet.py
+"""Fleet import matches bus codes the way the database compares them."""
+import time
+
+import features
+import fleet
+import stats
+from db_config import get_conn
+
+
+def _row(code, route):
+    return {"bus_code": code, "route": route, "total_seats": 40, "price": 300}
+
+
+def test_code_differing_only_by_case_updates_the_bus(db):
+    code = f"fl{int(time.time() * 1000) % 10 ** 9}"
+    first = fleet.import_fleet([_row(code.upper(), "Casea → Caseb")])
+    assert (first["inserted"], first["updated"], first["errors"]) == (1, 0, [])
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM buses WHERE bus_code=%s", (code.upper(),))
+            bus_id = cur.fetchone()['id']
+    finally:
+        conn.close()
+    try:
+        second = fleet.import_fleet([_row(code, "Casea → Casec")])
+        assert (second["inserted"], second["updated"], second["errors"]) == (0, 1, [])
+        assert features.get_bus(bus_id)['route'] == "Casea → Casec"
+        assert stats.reconcile(fix=False) == {}
+    finally:
+        features.delete_bus(bus_id)
+
+
+def test_same_code_twice_in_one_file_is_rejected(db):
+    report = fleet.import_fleet([_row("DUPCASE1", "Casea → Caseb"), _row("dupcase1", "Casea → Caseb")], dry_run=True)
+    assert report["valid"] == 1
+    assert [e["row"] for e in report["errors"]] == [2]
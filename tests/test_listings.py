@@ -0,0 +1,49 @@
+# test_listings.py
+"""Streaming admin listings: complete when read to the end, cheap when abandoned."""
+import pymysql
+import pytest
+
+import features
+import metrics
+import stress_booking
+
+
+def _closed() -> int:
+    return metrics.summary()["counters"].get("bus_db_connections_closed_total", 0)
+
+
+@pytest.fixture
+def bus_with_tickets(db):
+    bus_id, user_id = stress_booking._setup()
+    ok, msg, _ = features.create_tickets_bulk(user_id, bus_id, 6, pay_from_wallet=False)
+    assert ok, msg
+    yield bus_id
+    stress_booking._teardown(bus_id, user_id)
+
+
+def test_stream_read_to_the_end_returns_its_connection(bus_with_tickets):
+    before = _closed()
+    rows = list(features.iter_all_tickets(bus_id=bus_with_tickets, batch_size=4))
+    assert len(rows) == 6
+    assert [r['id'] for r in rows] == sorted((r['id'] for r in rows), reverse=True)
+    assert _closed() == before
+
+
+def test_abandoned_stream_discards_its_connection_without_draining(bus_with_tickets, monkeypatch):
+    drained = []
+    monkeypatch.setattr(pymysql.cursors.SSCursor, "close", lambda cur: drained.append(cur))
+    before = _closed()
+    stream = features.iter_all_tickets(bus_id=bus_with_tickets, batch_size=2)
+    assert len([next(stream) for _ in range(3)]) == 3
+    stream.close()
+    assert drained == []              # the rest of the result set was never read
+    assert _closed() == before + 1    # the connection was dropped, not pooled mid-result
+    rows, _ = features.view_tickets_page(limit=1, bus_id=bus_with_tickets)   # the pool still works
+    assert len(rows) == 1
+
+
+def test_view_all_tickets_streams(bus_with_tickets):
+    stream = features.view_all_tickets()
+    assert not isinstance(stream, list)
+    assert next(stream)['id']
+    stream.close()
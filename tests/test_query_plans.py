@@ -0,0 +1,32 @@
+# test_query_plans.py
+"""Fails when a statement run by a hot path (query_plans.WORKLOAD) stops using an index."""
+import pytest
+
+import query_plans
+
+
+@pytest.fixture(scope="module")
+def plans(db):
+    # some volume, so MySQL's optimizer has a reason to prefer the indexes
+    import datagen
+    datagen.generate(users=300, buses=40, tickets=4000, past_days=30, future_days=30, workers=2, log=lambda *a: None)
+    return query_plans.check_query_plans()
+
+
+@pytest.mark.parametrize("name", list(query_plans.WORKLOAD))
+def test_hot_path_uses_indexes(plans, name):
+    rows, offenders = plans
+    assert rows[name], f"{name} ran no statement to explain"
+    scans = [(table, kind, sql) for step, table, kind, sql in offenders if step == name]
+    assert not scans, f"{name} scans {scans}"
+
+
+def test_full_scan_is_reported(db):
+    _, offenders = query_plans.explain_statements({"unindexed": [("SELECT id FROM tickets WHERE price_paid > %s", (0,))]})
+    assert [(name, table) for name, table, _, _ in offenders] == [("unindexed", "tickets")]
+
+
+def test_recorded_sql_is_what_the_code_runs(plans):
+    rows, _ = plans
+    assert any("LOCK IN SHARE MODE" in sql for sql, _ in rows["create_ticket"])
+    assert any("tickets_archive" in sql for sql, _ in rows["find_ticket"])
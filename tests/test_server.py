@@ -0,0 +1,54 @@
+# test_server.py
+"""PooledHTTPServer accepts at most workers + queue connections at a time."""
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import server
+
+
+class _Blocking(BaseHTTPRequestHandler):
+    release = threading.Event()
+
+    def do_GET(self):
+        self.release.wait(5)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_excess_connections_stay_in_the_listen_backlog():
+    httpd = server.PooledHTTPServer(("127.0.0.1", 0), _Blocking, workers=2, queue=1)
+    accepted = []
+    get_request = httpd.get_request
+
+    def counting_get_request():
+        request = get_request()   # raises OSError while no slot is free
+        accepted.append(request)
+        return request
+
+    httpd.get_request = counting_get_request
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    clients = []
+    try:
+        for _ in range(6):
+            c = socket.create_connection(httpd.server_address, timeout=5)
+            c.sendall(b"GET / HTTP/1.0\r\n\r\n")
+            clients.append(c)
+        time.sleep(0.5)
+        assert len(accepted) == 3   # 2 with workers + 1 queued; the other 3 wait in the kernel
+        _Blocking.release.set()
+        for c in clients:   # every client is answered once slots free up
+            assert c.recv(64).startswith(b"HTTP/1.0 204")
+    finally:
+        _Blocking.release.set()
+        for c in clients:
+            c.close()
+        httpd.shutdown()
+        httpd.server_close()
+        thread.join(5)
+    assert len(accepted) == 6
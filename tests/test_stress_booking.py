@@ -0,0 +1,34 @@
+# test_stress_booking.py
+"""Many threads racing for the seats of one bus: no seat sold twice, every counter exact."""
+import stats
+import stress_booking
+
+
+def test_concurrent_bookings_keep_invariants(db):
+    problems, results = stress_booking.run(threads=16, attempts=25)
+    assert problems == []
+    assert results["errors"] == 0
+    # enough contention to mean something: more attempts than seats, many turned away
+    assert results["booked"] >= stress_booking.SEATS
+    assert results["rejected"] > 0
+    assert stats.reconcile(fix=False) == {}
+
+
+def test_check_invariants_catches_a_ticket_written_around_the_booking_path(db):
+    bus_id, user_id = stress_booking._setup()
+    try:
+        conn = db.get_conn()
+        try:
+            with conn.cursor() as cur:
+                # no seat_inventory update, no wallet debit
+                cur.execute("INSERT INTO tickets (ticket_no, user_id, bus_id, seat_no, price_paid, travel_date) "
+                            "VALUES (%s,%s,%s,%s,%s,%s)", (f"X{bus_id}", user_id, bus_id, 1, 5, "2030-01-01"))
+            conn.commit()
+        finally:
+            conn.close()
+        problems = stress_booking.check_invariants(bus_id, user_id)
+        assert any("no seat_inventory row" in p for p in problems)
+        assert any(p.startswith("wallet balance") for p in problems)
+    finally:
+        stress_booking._teardown(bus_id, user_id)
+        stats.reconcile()   # the stray ticket never reached the counters
@@ -0,0 +1,221 @@
+# ticket_docs.py
+"""
+Ticket documents (text and PDF), rendered in batches off the request path.
+
+    future = ticket_docs.render(infos)                       # one file per ticket
+    future = ticket_docs.render(infos, bundle="pdf")         # one multi-page PDF
+    future = ticket_docs.render(infos, fmt="text", bundle="zip")
+
+render() queues the batch on a shared process pool and returns a Future
+resolving to {"files": [path, ...]} or {"bundle": path}. Large batches are
+split across workers; bundles are assembled in the calling process from
+documents rendered in memory by the workers. Each worker imports reportlab and
+registers the ticket font once and reuses them for every ticket it renders.
+Like hashing.py, a thread pool is used when processes cannot be started.
+
+render_now() renders synchronously in the calling process.
+"""
+import atexit
+import io
+import os
+import threading
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+RENDER_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+RENDER_CHUNK = 50            # tickets per worker task
+TICKETS_FOLDER = "saved_tickets"
+# a TTF with the ₹ glyph (Helvetica has none); the first one found is used
+TICKET_FONT_PATHS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+)
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _lock:
+            if _executor is None or _executor_pid != pid:
+                try:
+                    _executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+                except (OSError, NotImplementedError):
+                    _executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+                _executor_pid = pid
+    return _executor
+
+
+def shutdown():
+    if _executor is not None and _executor_pid == os.getpid():
+        _executor.shutdown(wait=True)   # finish queued documents
+
+
+atexit.register(shutdown)
+
+
+# ------------- templates -------------
+_FIELDS = (
+    ("Ticket No", "ticket_no", ""),
+    ("User ID", "user_id", ""),
+    ("Bus ID", "bus_id", ""),
+    ("Seat No", "seat_no", ""),
+    ("Price", "price", "₹"),
+    ("Travel Date", "travel_date", ""),
+)
+
+def ticket_lines(info: dict, issued_at: str):
+    return [f"{label}: {prefix}{info.get(key)}" for label, key, prefix in _FIELDS] + [f"Issued At: {issued_at}"]
+
+def ticket_text(info: dict, issued_at: str) -> str:
+    return "\n".join(["------ BUS TICKET ------"] + ticket_lines(info, issued_at) + ["------------------------"])
+
+@lru_cache(maxsize=1)
+def _pdf_kit():
+    """(canvas module, page size, regular font, bold font), imported and registered once per process."""
+    try:
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import A5
+    except Exception as e:
+        raise RuntimeError(f"reportlab not installed: {e}")
+    regular, bold = "Helvetica", "Helvetica-Bold"
+    for path in TICKET_FONT_PATHS:
+        if os.path.exists(path):
+            try:
+                from reportlab.pdfbase import pdfmetrics
+                from reportlab.pdfbase.ttfonts import TTFont
+                pdfmetrics.registerFont(TTFont("TicketSans", path))
+                regular = bold = "TicketSans"
+                break
+            except Exception:
+                pass
+    return canvas, A5, regular, bold
+
+def _draw_page(c, info: dict, issued_at: str):
+    _, (width, height), regular, bold = _pdf_kit()
+    c.setFont(bold, 14)
+    c.drawCentredString(width / 2, height - 40, "BUS TICKET")
+    c.setFont(regular, 10)
+    y = height - 70
+    for line in ticket_lines(info, issued_at):
+        c.drawString(40, y, line)
+        y -= 16
+    c.line(30, y - 6, width - 30, y - 6)
+
+def _pdf(infos, issued_at: str, target) -> None:
+    canvas, pagesize, _, _ = _pdf_kit()
+    c = canvas.Canvas(target, pagesize=pagesize)
+    for info in infos:
+        _draw_page(c, info, issued_at)
+        c.showPage()
+    c.save()
+
+
+# ------------- worker tasks (top level so they pickle) -------------
+def _ext(fmt: str) -> str:
+    return "pdf" if fmt == "pdf" else "txt"
+
+def _render_files(infos, folder: str, fmt: str, issued_at: str):
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for info in infos:
+        path = os.path.join(folder, f"ticket_{info.get('ticket_no')}.{_ext(fmt)}")
+        if fmt == "pdf":
+            _pdf([info], issued_at, path)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(ticket_text(info, issued_at))
+        paths.append(path)
+    return paths
+
+def _render_blobs(infos, fmt: str, issued_at: str):
+    """[(filename, bytes)] for a zip archive."""
+    blobs = []
+    for info in infos:
+        name = f"ticket_{info.get('ticket_no')}.{_ext(fmt)}"
+        if fmt == "pdf":
+            buf = io.BytesIO()
+            _pdf([info], issued_at, buf)
+            blobs.append((name, buf.getvalue()))
+        else:
+            blobs.append((name, ticket_text(info, issued_at).encode("utf-8")))
+    return blobs
+
+def _render_multipage(infos, path: str, issued_at: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _pdf(infos, issued_at, path)
+    return path
+
+
+# ------------- public API -------------
+def _chunks(items, size: int):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _gather(futures, combine) -> Future:
+    """A Future resolving to combine([results]) once every future is done, or to the first error."""
+    out = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] or out.done():
+                return
+        try:
+            out.set_result(combine([f.result() for f in futures]))
+        except Exception as e:
+            out.set_exception(e)
+
+    if not futures:
+        out.set_result(combine([]))
+    for f in futures:
+        f.add_done_callback(done)
+    return out
+
+def _plan(infos, folder, fmt, bundle, name):
+    """([(task, args), ...], combine) for a batch; tasks are independent and may run anywhere."""
+    if fmt not in ("pdf", "text") or bundle not in (None, "pdf", "zip"):
+        raise ValueError("fmt must be 'pdf' or 'text'; bundle None, 'pdf' or 'zip'")
+    infos = list(infos)
+    folder = folder or os.path.join(os.getcwd(), TICKETS_FOLDER)
+    now = datetime.now()
+    issued_at = now.strftime("%Y-%m-%d %H:%M:%S")
+    if bundle is None:
+        tasks = [(_render_files, (chunk, folder, fmt, issued_at)) for chunk in _chunks(infos, RENDER_CHUNK)]
+        return tasks, lambda parts: {"files": [p for part in parts for p in part]}
+    path = os.path.join(folder, f"{name or 'tickets_' + now.strftime('%Y%m%d_%H%M%S_%f')}.{'pdf' if bundle == 'pdf' else 'zip'}")
+    if bundle == "pdf":
+        return [(_render_multipage, (infos, path, issued_at))], lambda parts: {"bundle": parts[0]}
+
+    def write_zip(parts):
+        os.makedirs(folder, exist_ok=True)
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+            for part in parts:
+                for filename, data in part:
+                    z.writestr(filename, data)
+        return {"bundle": path}
+    return [(_render_blobs, (chunk, fmt, issued_at)) for chunk in _chunks(infos, RENDER_CHUNK)], write_zip
+
+def render(infos, folder: str = None, fmt: str = "pdf", bundle: str = None, name: str = None) -> Future:
+    """
+    Queues a batch of ticket_info dicts for rendering.
+    fmt: "pdf" or "text". bundle: None (one file per ticket), "pdf" (one
+    multi-page PDF; fmt is ignored) or "zip" (one archive of fmt files).
+    name: bundle file name without extension (default tickets_<timestamp>).
+    """
+    tasks, combine = _plan(infos, folder, fmt, bundle, name)
+    executor = _get_executor()
+    return _gather([executor.submit(task, *args) for task, args in tasks], combine)
+
+def render_now(infos, folder: str = None, fmt: str = "pdf", bundle: str = None, name: str = None) -> dict:
+    """Renders in the calling process; for a ticket or two, cheaper than a round-trip to the pool."""
+    tasks, combine = _plan(infos, folder, fmt, bundle, name)
+    return combine([task(*args) for task, args in tasks])
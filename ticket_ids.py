@@ -0,0 +1,159 @@
+# ticket_ids.py
+"""
+Time-ordered ticket numbers (Snowflake-style).
+
+A ticket id is a 63-bit integer:
+
+    41 bits  milliseconds since EPOCH_MS (good until 2093)
+    10 bits  node id, leased from the id_nodes table (0..1023)
+    12 bits  sequence within the millisecond (4096 ids/ms per node)
+
+and the ticket number is "T" + the id in 13 Crockford base32 digits, e.g.
+T0A8T0F5WW1M00. The digits are fixed width, so ticket numbers sort the same
+as the ids: new tickets append to the right edge of the ticket_no index
+instead of landing at random pages, and `WHERE ticket_no > %s ORDER BY
+ticket_no` pages through tickets in booking order. Crockford's alphabet has
+no I, L, O or U; decode() also accepts lowercase and the usual misreadings.
+
+Uniqueness across processes and hosts: each process leases a node id for
+NODE_LEASE_MS and only issues ids stamped before its lease runs out; a lease
+is taken over only after it expired (plus NODE_LEASE_GRACE_MS for clock
+skew), and the new owner starts numbering after the old lease's end. The
+clock going backwards never repeats an id: the last timestamp is reused.
+
+Leasing and renewing talk to the database, so take numbers before opening
+the transaction that uses them (next_ticket_nos()), not inside it.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from db_config import run_transaction
+
+EPOCH_MS = 1_704_067_200_000          # 2024-01-01T00:00:00Z
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODES = 1 << NODE_BITS
+NODE_LEASE_MS = 60_000                # renewed when less than half is left
+NODE_LEASE_GRACE_MS = 5_000           # clock skew tolerated between hosts
+PREFIX = "T"
+DIGITS = 13
+
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_VALUES = {c: i for i, c in enumerate(_ALPHABET)}
+_VALUES.update({c.lower(): i for c, i in list(_VALUES.items())})
+_VALUES.update({"O": 0, "o": 0, "I": 1, "i": 1, "L": 1, "l": 1})
+_SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+
+
+# ------------- encoding -------------
+def encode(ticket_id: int) -> str:
+    digits = []
+    for _ in range(DIGITS):
+        ticket_id, d = divmod(ticket_id, 32)
+        digits.append(_ALPHABET[d])
+    return PREFIX + "".join(reversed(digits))
+
+def decode(ticket_no: str):
+    """The id behind a ticket number typed by a person, or None if it isn't one."""
+    s = ticket_no.strip().replace("-", "")
+    if s[:1].upper() == PREFIX:
+        s = s[1:]
+    if len(s) != DIGITS:
+        return None
+    value = 0
+    for c in s:
+        if c not in _VALUES:
+            return None
+        value = value * 32 + _VALUES[c]
+    return value
+
+def normalize(ticket_no: str):
+    """Canonical spelling of a ticket number (for lookups), or None if it isn't one."""
+    ticket_id = decode(ticket_no)
+    return encode(ticket_id) if ticket_id is not None else None
+
+def issued_at(ticket_no: str):
+    """UTC datetime the ticket number was issued, or None if it isn't one."""
+    ticket_id = decode(ticket_no)
+    if ticket_id is None:
+        return None
+    ms = (ticket_id >> (NODE_BITS + SEQUENCE_BITS)) + EPOCH_MS
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+# ------------- node lease -------------
+def _claim_txn(cur, owner: str, node_id, now_ms: int):
+    # our own node if we still hold it, else the one that expired longest ago
+    cur.execute("""SELECT node_id, lease_until FROM id_nodes
+                   WHERE node_id=%s AND owner=%s OR lease_until < %s
+                   ORDER BY node_id=%s DESC, lease_until LIMIT 1 FOR UPDATE""",
+                (node_id, owner, now_ms - NODE_LEASE_GRACE_MS, node_id))
+    r = cur.fetchone()
+    if not r:
+        raise RuntimeError(f"All {MAX_NODES} ticket id nodes are leased.")
+    lease_until = now_ms + NODE_LEASE_MS
+    cur.execute("UPDATE id_nodes SET owner=%s, lease_until=%s WHERE node_id=%s", (owner, lease_until, r['node_id']))
+    return True, r['node_id'], r['lease_until'], lease_until
+
+
+class _Generator:
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()[:30]}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+        self.node_id = None
+        self.lease_until = 0
+        self.last_ms = 0
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def _lease(self, now_ms: int):
+        _, node_id, previous_until, self.lease_until = run_transaction(
+            lambda cur: _claim_txn(cur, self.owner, self.node_id, now_ms))
+        if node_id != self.node_id:
+            # a node taken over: its previous owner stamped nothing after previous_until
+            self.node_id, self.last_ms, self.sequence = node_id, previous_until - EPOCH_MS, _SEQUENCE_MASK
+
+    def next_ids(self, n: int) -> list:
+        with self.lock:
+            ids = []
+            while len(ids) < n:
+                now_ms = int(time.time() * 1000)
+                if self.node_id is None or now_ms + NODE_LEASE_MS // 2 > self.lease_until:
+                    self._lease(now_ms)
+                ms = max(now_ms - EPOCH_MS, self.last_ms)
+                if ms == self.last_ms:
+                    self.sequence = (self.sequence + 1) & _SEQUENCE_MASK
+                    if self.sequence == 0:
+                        ms += 1   # 4096 ids this millisecond: borrow the next one
+                else:
+                    self.sequence = 0
+                self.last_ms = ms
+                ids.append((ms << (NODE_BITS + SEQUENCE_BITS)) | (self.node_id << SEQUENCE_BITS) | self.sequence)
+            return ids
+
+
+_generator = None
+_generator_pid = None
+_generator_lock = threading.Lock()
+
+
+def _get_generator() -> _Generator:
+    global _generator, _generator_pid
+    pid = os.getpid()
+    if _generator is None or _generator_pid != pid:
+        with _generator_lock:
+            if _generator is None or _generator_pid != pid:
+                # a forked child must not share its parent's node
+                _generator, _generator_pid = _Generator(), pid
+    return _generator
+
+def next_ticket_nos(n: int) -> list:
+    """n new ticket numbers, ascending."""
+    return [encode(i) for i in _get_generator().next_ids(n)] if n > 0 else []
+
+def next_ticket_no() -> str:
+    return next_ticket_nos(1)[0]
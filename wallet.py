@@ -0,0 +1,155 @@
+# wallet.py
+"""
+Append-only wallet ledger.
+
+Every balance change is an immutable row in wallet_ledger (positive = credit,
+negative = debit), keyed by what caused it (ticket, refund, top-up).
+wallet_balances holds a per-user snapshot: the sum of all entries marked
+compacted. A user's balance is snapshot + SUM(uncompacted entries).
+
+- credit() is a plain INSERT: no row locks on users or wallet_balances.
+- debit() locks the user's wallet_balances row, so debits for one user are
+  serialized and can never overdraw. It takes no locks on wallet_ledger:
+  ledger inserts (any user's) never wait for it.
+- compact() folds uncompacted entries into the snapshot so reads stay cheap.
+
+The functions taking `cur` run inside the caller's transaction.
+
+debit() and compact() read the pending entries with a plain (consistent)
+read after taking the row lock. On MySQL (REPEATABLE READ) that read must be
+the transaction's first non-locking read, so its snapshot is taken while the
+lock is held and includes every debit and compaction committed before; read
+anything else the transaction needs before them with a locking read. A
+credit committed meanwhile may be missed, which only understates the balance.
+"""
+import sys
+
+from db_config import get_conn, run_transaction
+
+WALLET_COMPACT_AFTER = 50     # debit() compacts inline once a user has this many pending entries
+
+# ledger entry kinds
+OPENING = "OPENING"
+TOPUP = "TOPUP"
+TICKET = "TICKET"
+REFUND = "REFUND"
+
+
+def _pending(cur, user_id: int):
+    cur.execute("""
+        SELECT IFNULL(SUM(amount), 0) AS total, COUNT(*) AS cnt
+        FROM wallet_ledger WHERE user_id=%s AND compacted=0
+    """, (user_id,))
+    r = cur.fetchone()
+    return int(r['total']), r['cnt']
+
+def _lock_snapshot(cur, user_id: int) -> int:
+    cur.execute("SELECT balance FROM wallet_balances WHERE user_id=%s FOR UPDATE", (user_id,))
+    r = cur.fetchone()
+    if r:
+        return int(r['balance'])
+    cur.execute("INSERT IGNORE INTO wallet_balances (user_id, balance) VALUES (%s, 0)", (user_id,))
+    cur.execute("SELECT balance FROM wallet_balances WHERE user_id=%s FOR UPDATE", (user_id,))
+    return int(cur.fetchone()['balance'])
+
+def balance(cur, user_id: int) -> int:
+    cur.execute("SELECT balance FROM wallet_balances WHERE user_id=%s", (user_id,))
+    r = cur.fetchone()
+    pending, _ = _pending(cur, user_id)
+    return (int(r['balance']) if r else 0) + pending
+
+def credit(cur, user_id: int, amount: int, kind: str, ref_type: str = None, ref_id: int = None, note: str = None):
+    cur.execute("""
+        INSERT INTO wallet_ledger (user_id, amount, kind, ref_type, ref_id, note)
+        VALUES (%s,%s,%s,%s,%s,%s)
+    """, (user_id, amount, kind, ref_type, ref_id, note))
+
+def debit(cur, user_id: int, entries, kind: str = TICKET, ref_type: str = "ticket"):
+    """
+    Debits one entry per (ref_id, amount) in `entries`, all-or-nothing.
+    Returns (ok, balance_before).
+    """
+    snapshot = _lock_snapshot(cur, user_id)
+    pending, pending_cnt = _pending(cur, user_id)   # under the row lock, see the module docstring
+    available = snapshot + pending
+    total = sum(amount for _, amount in entries)
+    if available < total:
+        return False, available
+    cur.executemany("""
+        INSERT INTO wallet_ledger (user_id, amount, kind, ref_type, ref_id)
+        VALUES (%s,%s,%s,%s,%s)
+    """, [(user_id, -amount, kind, ref_type, ref_id) for ref_id, amount in entries])
+    if pending_cnt + len(entries) >= WALLET_COMPACT_AFTER:
+        _compact_locked(cur, user_id, snapshot)
+    return True, available
+
+def _compact_locked(cur, user_id: int, snapshot: int):
+    # caller holds the wallet_balances row lock; marks exactly the entries it summed,
+    # by primary key, so a credit inserted meanwhile stays pending and nothing is range-locked
+    cur.execute("SELECT id, amount FROM wallet_ledger WHERE user_id=%s AND compacted=0", (user_id,))
+    rows = cur.fetchall()
+    if not rows:
+        return
+    cur.execute("UPDATE wallet_balances SET balance=%s WHERE user_id=%s",
+                (snapshot + sum(int(r['amount']) for r in rows), user_id))
+    cur.execute(f"UPDATE wallet_ledger SET compacted=1 WHERE id IN ({','.join(['%s'] * len(rows))})",
+                [r['id'] for r in rows])
+
+def compact(cur, user_id: int):
+    _compact_locked(cur, user_id, _lock_snapshot(cur, user_id))
+
+
+# ------------- maintenance -------------
+def compact_wallets(batch_size: int = 500) -> int:
+    """Folds pending ledger entries of every user into the snapshots. Returns users compacted."""
+    done = 0
+    last_user = 0
+    while True:
+        conn = get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT DISTINCT user_id FROM wallet_ledger
+                    WHERE compacted=0 AND user_id > %s ORDER BY user_id LIMIT %s
+                """, (last_user, batch_size))
+                users = [r['user_id'] for r in cur.fetchall()]
+        finally:
+            conn.close()
+        if not users:
+            return done
+        for user_id in users:
+            # one short transaction per user keeps lock hold times small
+            run_transaction(lambda cur: (True, compact(cur, user_id)))
+            done += 1
+        last_user = users[-1]
+
+def audit(user_id: int) -> dict:
+    """Snapshot-based balance next to a full re-sum of the ledger; they must agree."""
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            fast = balance(cur, user_id)
+            cur.execute("SELECT IFNULL(SUM(amount), 0) AS total FROM wallet_ledger WHERE user_id=%s", (user_id,))
+            full = int(cur.fetchone()['total'])
+    finally:
+        conn.close()
+    return {"user_id": user_id, "balance": fast, "ledger_total": full, "ok": fast == full}
+
+def history(user_id: int, limit: int = 50):
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, amount, kind, ref_type, ref_id, note, created_at FROM wallet_ledger
+                WHERE user_id=%s ORDER BY id DESC LIMIT %s
+            """, (user_id, limit))
+            return cur.fetchall()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["compact"]:
+        print(f"Compacted {compact_wallets()} wallets.")
+    else:
+        print("usage: python wallet.py compact")